@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+###########################################################################
+# Ajuste de modelos de chaves (IGBT/MOSFET) e diodos a partir de pontos   #
+# digitalizados de datasheets, e catálogo de componentes ajustados.       #
+#                                                                         #
+# Entrada: CSV com uma linha por ponto e as colunas                       #
+#   dispositivo : nome do componente                                      #
+#   tipo        : "Q" (chave) ou "D" (diodo)                              #
+#   curva       : "conducao"    (valor = queda de tensão em V)            #
+#                 "chaveamento" (valor = Eon + Eoff em mJ; chaves)        #
+#                 "recuperacao" (valor = carga Qrr em nC; diodos)         #
+#   corrente    : corrente do ponto (A)                                   #
+#   valor       : ver "curva"                                             #
+#   forma       : (opcional) forma da curva de condução, "quadratica"     #
+#                 (ConducaoQuadratica, padrão) ou "log" (ConducaoLog)     #
+#                                                                         #
+# Os ajustes são feitos por mínimos quadrados, todos os componentes de    #
+# mesma forma de uma vez (matrizes completadas com linhas nulas e         #
+# decomposição QR em pilha), e resultam nas mesmas curvas compiladas de   #
+# calculo_perdas (ConducaoQuadratica, ConducaoLog, ChaveamentoPolinomial) #
+# e na carga de recuperação Qrr. Cada ajuste é guardado em disco pelo     #
+# hash SHA-256 dos pontos e das opções, e não é refeito para os mesmos    #
+# dados.                                                                  #
+#                                                                         #
+# O catálogo (Catalogo) é gravado em JSON e, ao ser lido, empilha os      #
+# parâmetros de todos os componentes em vetores coluna, de forma que as   #
+# perdas de todos são avaliadas em uma única chamada (Catalogo.avalia).   #
+#                                                                         #
+# Uso: python ajuste_dispositivos.py pontos.csv catalogo.json             #
+#                                    [--cache diretorio]                  #
+###########################################################################
+
+# Habilita resultado real da divisão (e não apenas parte inteira)
+from __future__ import division
+
+import argparse
+import collections
+import csv
+import hashlib
+import json
+import os
+import sys
+
+import numpy
+
+import calculo_perdas
+
+# Versão dos ajustes. Deve ser alterada sempre que uma mudança no código
+# alterar os ajustes, para invalidar os ajustes guardados em cache.
+VERSAO_AJUSTE = "1"
+
+TIPOS = ("Q", "D")
+CURVAS = ("conducao", "chaveamento", "recuperacao")
+FORMAS = ("quadratica", "log")
+
+# Grau dos polinômios ajustados: queda de tensão em log10(i) (forma
+# "log", como a do UF5408) e energia de comutação na corrente (sem termo
+# constante, pois a energia é nula com corrente nula).
+GRAU_LOG = 4
+GRAU_CHAVEAMENTO = 2
+
+###########################################################################
+# LEITURA DOS PONTOS                                                      #
+###########################################################################
+def lePontos(caminho):
+    """
+    Lê o CSV de pontos. Retorna dicionário ordenado {dispositivo:
+    {"tipo", "forma", "conducao", "chaveamento", "recuperacao"}}, com
+    cada curva como lista de pares (corrente, valor).
+    """
+    pontos = collections.OrderedDict()
+    with open(caminho) as arquivo:
+        for linha, campos in enumerate(csv.DictReader(arquivo), 2):
+            nome = campos["dispositivo"].strip()
+            tipo = campos["tipo"].strip().upper()
+            curva = campos["curva"].strip().lower()
+            forma = (campos.get("forma") or "").strip().lower()
+            if tipo not in TIPOS or curva not in CURVAS or \
+               forma not in ("",) + FORMAS:
+                raise ValueError("Linha %d de %s: tipo, curva ou forma "
+                                 "inválidos" % (linha, caminho))
+            dados = pontos.setdefault(nome, {
+                "tipo": tipo, "forma": "quadratica", "conducao": [],
+                "chaveamento": [], "recuperacao": []})
+            if dados["tipo"] != tipo:
+                raise ValueError("Linha %d de %s: tipo diferente do já lido "
+                                 "para %s" % (linha, caminho, nome))
+            if forma:
+                dados["forma"] = forma
+            dados[curva].append((float(campos["corrente"]),
+                                 float(campos["valor"])))
+    return pontos
+
+def hashPontos(dados):
+    """Hash (texto hexadecimal) dos pontos e opções de um componente"""
+    texto = json.dumps({"versao": VERSAO_AJUSTE,
+                        "grau_log": GRAU_LOG,
+                        "grau_chaveamento": GRAU_CHAVEAMENTO,
+                        "tipo": dados["tipo"], "forma": dados["forma"],
+                        "curvas": [sorted(dados[c]) for c in CURVAS]},
+                       sort_keys=True)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+###########################################################################
+# AJUSTES                                                                 #
+###########################################################################
+def minimosQuadrados(matrizes, alvos):
+    """
+    Resolve de uma vez os problemas de mínimos quadrados A p = y de
+    vários componentes: "matrizes" (componentes, pontos, parâmetros) e
+    "alvos" (componentes, pontos), completados com zeros até o maior
+    número de pontos (linhas nulas não alteram a solução). Retorna
+    matriz (componentes, parâmetros).
+    """
+    Q, R = numpy.linalg.qr(matrizes)
+    projecao = numpy.einsum("kmp,km->kp", Q, alvos)
+    return numpy.linalg.solve(R, projecao[..., None])[..., 0]
+
+def _completa(curvas, colunas, minimo, nomes, curva):
+    """
+    Monta matrizes e alvos de minimosQuadrados a partir das listas de
+    pontos "curvas"; "colunas(x)" retorna as colunas da matriz e o alvo
+    """
+    for nome, pontos in zip(nomes, curvas):
+        if len(set(p[0] for p in pontos)) < minimo:
+            raise ValueError("%s: são necessários ao menos %d pontos de %s"
+                             % (nome, minimo, curva))
+    m = max(len(p) for p in curvas)
+    matrizes, alvos = [], []
+    for pontos in curvas:
+        x, y = numpy.array(pontos, dtype=float).T
+        A, alvo = colunas(x, y)
+        falta = m - len(x)
+        matrizes.append(numpy.vstack([A, numpy.zeros((falta, A.shape[1]))]))
+        alvos.append(numpy.concatenate([alvo, numpy.zeros(falta)]))
+    return numpy.array(matrizes), numpy.array(alvos)
+
+def _limite(pontos):
+    """Menor corrente dos pontos de condução e a queda de tensão nela"""
+    return min(pontos)
+
+def ajustaConducao(curvas, forma, nomes):
+    """
+    Ajusta as curvas de condução (listas de pares (i, V)) da "forma"
+    dada. Retorna lista de dicionários de parâmetros (ver Dispositivo).
+    Forma "quadratica": i = a*V**2 + b*V + c, como ConducaoQuadratica;
+    forma "log": V = polinômio de grau GRAU_LOG em log10(i).
+    Abaixo da menor corrente medida, a queda é a do ponto medido.
+    """
+    if forma == "quadratica":
+        colunas = lambda i, v: (numpy.column_stack([v**2, v,
+                                                    numpy.ones_like(v)]), i)
+        p = minimosQuadrados(*_completa(curvas, colunas, 3, nomes,
+                                        "conducao"))
+        return [{"forma": forma, "a": a, "b": b, "c": c,
+                 "i_min": _limite(pts)[0], "v_min": _limite(pts)[1]}
+                for (a, b, c), pts in zip(p.tolist(), curvas)]
+    elif forma == "log":
+        colunas = lambda i, v: (numpy.log10(i)[:, None] **
+                                numpy.arange(GRAU_LOG, -1, -1), v)
+        p = minimosQuadrados(*_completa(curvas, colunas, GRAU_LOG + 1,
+                                        nomes, "conducao"))
+        return [{"forma": forma, "coeficientes": coef,
+                 "i_min": _limite(pts)[0], "v_min": _limite(pts)[1]}
+                for coef, pts in zip(p.tolist(), curvas)]
+    raise ValueError("Forma de condução desconhecida: " + str(forma))
+
+def ajustaChaveamento(curvas, nomes):
+    """
+    Ajusta as curvas de energia de comutação (listas de pares (i, mJ))
+    por polinômios de grau GRAU_CHAVEAMENTO sem termo constante. Retorna
+    lista de coeficientes (do maior para o menor grau).
+    """
+    colunas = lambda i, E: (i[:, None] **
+                            numpy.arange(GRAU_CHAVEAMENTO, 0, -1), E)
+    p = minimosQuadrados(*_completa(curvas, colunas, GRAU_CHAVEAMENTO,
+                                    nomes, "chaveamento"))
+    return [coef + [0.0] for coef in p.tolist()]
+
+def ajusta(pontos, cache=None):
+    """
+    Ajusta os componentes de "pontos" (ver lePontos). Com "cache"
+    (diretório), cada ajuste é lido de <cache>/<hash>.json se existir e
+    gravado nele caso contrário. Retorna lista de Dispositivo, na ordem
+    de "pontos".
+    """
+    hashes = collections.OrderedDict((n, hashPontos(d))
+                                     for n, d in pontos.items())
+    ajustes = {}
+    if cache is not None:
+        for nome, h in hashes.items():
+            caminho = os.path.join(cache, h + ".json")
+            if os.path.exists(caminho):
+                with open(caminho) as arquivo:
+                    ajustes[nome] = json.load(arquivo)
+    faltam = [n for n in pontos if n not in ajustes]
+
+    # Ajustes em lote: condução por forma, comutação das chaves e
+    # recuperação dos diodos (média dos pontos).
+    for forma in FORMAS:
+        nomes = [n for n in faltam if pontos[n]["forma"] == forma]
+        if nomes:
+            conducao = ajustaConducao([pontos[n]["conducao"] for n in nomes],
+                                      forma, nomes)
+            for n, c in zip(nomes, conducao):
+                ajustes[n] = {"tipo": pontos[n]["tipo"], "conducao": c}
+    chaves = [n for n in faltam if pontos[n]["tipo"] == "Q"]
+    if chaves:
+        coeficientes = ajustaChaveamento(
+            [pontos[n]["chaveamento"] for n in chaves], chaves)
+        for n, coef in zip(chaves, coeficientes):
+            ajustes[n]["chaveamento"] = coef
+            ajustes[n]["i_max"] = max(p[0] for p in pontos[n]["chaveamento"])
+    for n in faltam:
+        if pontos[n]["tipo"] == "D":
+            qrr = [p[1] for p in pontos[n]["recuperacao"]]
+            if not qrr:
+                raise ValueError(n + ": é necessário ao menos um ponto "
+                                 "de recuperacao")
+            ajustes[n]["Qrr"] = numpy.mean(qrr) * 1e-9 # nC -> C
+
+    if cache is not None and faltam:
+        if not os.path.isdir(cache):
+            os.makedirs(cache)
+        for n in faltam:
+            with open(os.path.join(cache, hashes[n] + ".json"), "w") as f:
+                json.dump(ajustes[n], f, sort_keys=True)
+    return [Dispositivo.deDicionario(dict(ajustes[n], nome=n,
+                                          hash=hashes[n]))
+            for n in pontos]
+
+###########################################################################
+# MODELOS AJUSTADOS                                                       #
+###########################################################################
+def _curvaConducao(p):
+    """Curva de calculo_perdas a partir dos parâmetros de condução"""
+    if p["forma"] == "quadratica":
+        return calculo_perdas.ConducaoQuadratica(p["a"], p["b"], p["c"],
+                                                 p["i_min"], p["v_min"])
+    return calculo_perdas.ConducaoLog(p["coeficientes"], p["i_min"],
+                                      p["v_min"])
+
+class Dispositivo(object):
+    """
+    Componente ajustado.
+    tipo        : "Q" (chave) ou "D" (diodo)
+    conducao    : parâmetros da curva de condução ("forma" e os
+                  argumentos de ConducaoQuadratica ou ConducaoLog)
+    chaveamento : coeficientes de ChaveamentoPolinomial (chaves)
+    i_max       : maior corrente dos pontos de comutação (chaves)
+    Qrr         : carga de recuperação reversa em C (diodos)
+    hash        : hash dos pontos ajustados (ver hashPontos)
+    """
+    __slots__ = ("nome", "tipo", "conducao", "chaveamento", "i_max", "Qrr",
+                 "hash")
+
+    def __init__(self, nome, tipo, conducao, chaveamento=None, i_max=None,
+                 Qrr=None, hash=None):
+        self.nome = nome
+        self.tipo = tipo
+        self.conducao = conducao
+        self.chaveamento = chaveamento
+        self.i_max = i_max
+        self.Qrr = Qrr
+        self.hash = hash
+
+    @classmethod
+    def deDicionario(cls, dados):
+        return cls(**dict((n, dados.get(n)) for n in cls.__slots__))
+
+    def comoDicionario(self):
+        return dict((n, getattr(self, n)) for n in self.__slots__)
+
+    def curvaConducao(self):
+        """Curva de condução (ConducaoQuadratica ou ConducaoLog)"""
+        return _curvaConducao(self.conducao)
+
+    def curvaChaveamento(self):
+        """Curva de comutação (ChaveamentoPolinomial) de uma chave"""
+        return calculo_perdas.ChaveamentoPolinomial(self.chaveamento)
+
+    def __repr__(self):
+        return "Dispositivo(%r, tipo=%r)" % (self.nome, self.tipo)
+
+def modeloPerdas(chave, diodo, diodo_ponte=None):
+    """
+    ModeloPerdas de calculo_perdas com a "chave" e o "diodo" (antiparalelo
+    e anti-série) e o "diodo_ponte" (padrão: "diodo") ajustados
+    """
+    diodo_ponte = diodo if diodo_ponte is None else diodo_ponte
+    # A comutação do diodo da ponte é vblock*trr*irr/2: com trr = 2*Qrr
+    # e irr = 1, vale vblock*Qrr, como a do diodo.
+    return calculo_perdas.ModeloPerdas(
+        conducaoQ=chave.curvaConducao(),
+        chaveamentoQ=chave.curvaChaveamento(),
+        conducaoD=diodo.curvaConducao(), Qrr=diodo.Qrr,
+        conducaoDPonte=diodo_ponte.curvaConducao(),
+        trr=2*diodo_ponte.Qrr, irr=1)
+
+###########################################################################
+# CATÁLOGO                                                                #
+###########################################################################
+def pesosCiclos(grupos, config=None, tabela=None):
+    """
+    Pesos de cada ciclo de chaveamento de um ponto de operação para
+    grupos de itens da tabela ({nome: vetor com a multiplicidade de cada
+    item de tabela.dispositivos}): soma, com a multiplicidade, do tempo ativo (condução) e da
+    indicação de comutação dos itens. A perda de um componente que
+    ocupa os itens do grupo é perda_conducao . peso_conducao +
+    perda_comutacao . peso_comutacao. Retorna (pesos, iabs, vblock,
+    potencia_saida, cfg), com pesos = {nome: (peso_conducao,
+    peso_comutacao)}.
+    """
+    cfg = calculo_perdas.Configuracao() if config is None else config
+    tabela = calculo_perdas.TABELA_7NIVEIS if tabela is None else tabela
+    geo = calculo_perdas.Geometria(cfg)
+    angulo = calculo_perdas.angulosCiclos(geo.mf)
+    intervalo = calculo_perdas.classificaIntervalo(angulo, geo.theta)
+    vref, d, vblock = calculo_perdas.modulacao(cfg, angulo, intervalo)
+    i = calculo_perdas.corrente(cfg, angulo)
+    estado = tabela.estado(intervalo, i >= 0)
+    ativo = tabela.tempoAtivo(estado, d)
+    comuta = numpy.take(tabela.comuta, estado, axis=1)
+    pesos = dict((nome, (numpy.dot(m, ativo), numpy.dot(m, comuta)))
+                 for nome, m in grupos.items())
+    return (pesos, abs(i), abs(vblock), calculo_perdas.media(vref*i), cfg)
+
+def pesosPapeis(config=None, tabela=None):
+    """
+    Pesos (ver pesosCiclos) de cada papel (variante, tipo de
+    TIPOS_PERDA): itens desse tipo, com a multiplicidade da variante
+    (ver calculo_perdas.multiplicidades). Retorna (pesos, iabs, vblock,
+    cfg).
+    """
+    tabela = calculo_perdas.TABELA_7NIVEIS if tabela is None else tabela
+    grupos = dict(((variante, tipo), m * (tabela.tipo == t))
+                  for variante, m in calculo_perdas.multiplicidades(
+                      tabela.dispositivos).items()
+                  for t, tipo in enumerate(calculo_perdas.TIPOS_PERDA))
+    pesos, iabs, vblock, _, cfg = pesosCiclos(grupos, config, tabela)
+    return pesos, iabs, vblock, cfg
+
+class Catalogo(object):
+    """
+    Conjunto de Dispositivo com parâmetros empilhados em vetores coluna
+    (um elemento por componente), avaliados de uma só vez.
+    """
+    def __init__(self, dispositivos):
+        self.dispositivos = tuple(dispositivos)
+        self.nomes = tuple(d.nome for d in self.dispositivos)
+        tipos = numpy.array([d.tipo for d in self.dispositivos])
+        self.chaves = numpy.flatnonzero(tipos == "Q")
+        self.diodos = numpy.flatnonzero(tipos == "D")
+
+        # Curvas de condução empilhadas, uma por forma.
+        self._conducao = []
+        for forma in FORMAS:
+            indices = numpy.array([k for k, d in enumerate(self.dispositivos)
+                                   if d.conducao["forma"] == forma],
+                                  dtype=numpy.intp)
+            if len(indices) == 0:
+                continue
+            p = [self.dispositivos[k].conducao for k in indices]
+            coluna = lambda nome: numpy.array([q[nome] for q in p])[:, None]
+            if forma == "quadratica":
+                curva = calculo_perdas.ConducaoQuadratica(
+                    coluna("a"), coluna("b"), coluna("c"), coluna("i_min"),
+                    coluna("v_min"))
+            else:
+                # Coeficientes completados com zeros até o maior grau.
+                g = max(len(q["coeficientes"]) for q in p)
+                coef = numpy.array([[0.0]*(g - len(q["coeficientes"])) +
+                                    list(q["coeficientes"]) for q in p])
+                curva = calculo_perdas.ConducaoLog(
+                    list(coef.T[:, :, None]), coluna("i_min"),
+                    coluna("v_min"))
+            self._conducao.append((indices, curva))
+
+        # Comutação: polinômio das chaves e carga Qrr dos diodos.
+        g = max([len(self.dispositivos[k].chaveamento)
+                 for k in self.chaves] or [1])
+        coef = numpy.zeros((len(self.chaves), g))
+        for linha, k in enumerate(self.chaves):
+            c = self.dispositivos[k].chaveamento
+            coef[linha, g - len(c):] = c
+        self._chaveamento = calculo_perdas.ChaveamentoPolinomial(
+            list(coef.T[:, :, None]))
+        self._Qrr = numpy.array([self.dispositivos[k].Qrr
+                                 for k in self.diodos])[:, None]
+
+    @classmethod
+    def carrega(cls, caminho):
+        """Lê catálogo gravado por grava"""
+        with open(caminho) as arquivo:
+            dados = json.load(arquivo)
+        return cls(Dispositivo.deDicionario(d) for d in dados["dispositivos"])
+
+    def grava(self, caminho):
+        with open(caminho, "w") as arquivo:
+            json.dump({"versao": VERSAO_AJUSTE,
+                       "dispositivos": [d.comoDicionario()
+                                        for d in self.dispositivos]},
+                      arquivo, indent=1, sort_keys=True)
+
+    def perdas(self, iabs, vblock, fp):
+        """
+        Retorna (condução, comutação), matrizes (componentes x ciclos)
+        com as perdas em J de cada componente em cada ciclo
+        """
+        iabs = numpy.asarray(iabs, dtype=float)
+        forma = (len(self.dispositivos),) + iabs.shape
+        conducao = numpy.empty(forma)
+        comutacao = numpy.empty(forma)
+        for indices, curva in self._conducao:
+            conducao[indices] = curva(iabs, fp)
+        comutacao[self.chaves] = self._chaveamento(iabs)
+        comutacao[self.diodos] = vblock * self._Qrr
+        return conducao, comutacao
+
+    def avalia(self, config=None, tabela=None):
+        """
+        Perdas (W) de cada componente em cada papel de um ponto de
+        operação, ocupando todas as posições desse papel: retorna
+        {variante: {tipo: vetor}}, com variante "ponte" ou "2ch" e tipo
+        de TIPOS_PERDA ("Q": chaves; "D" e "DP": diodos antiparalelos e
+        da ponte). Componentes que não podem ocupar o papel têm NaN. A
+        perda total de uma variante é a soma dos papéis.
+        """
+        pesos, iabs, vblock, cfg = pesosPapeis(config, tabela)
+        conducao, comutacao = self.perdas(iabs, vblock, cfg.fp)
+        papeis = {"Q": self.chaves, "D": self.diodos, "DP": self.diodos}
+        resultado = {}
+        for (variante, tipo), (pc, ps) in pesos.items():
+            perdas = numpy.full(len(self.dispositivos), numpy.nan)
+            k = papeis[tipo]
+            perdas[k] = (numpy.dot(conducao[k], pc) +
+                         numpy.dot(comutacao[k], ps)) * cfg.fr
+            resultado.setdefault(variante, {})[tipo] = perdas
+        return resultado
+
+###########################################################################
+# LINHA DE COMANDO                                                        #
+###########################################################################
+def principal(argumentos=None):
+    parser = argparse.ArgumentParser(
+        description="Ajusta modelos de componentes a pontos de datasheet")
+    parser.add_argument("pontos", help="CSV com os pontos digitalizados")
+    parser.add_argument("catalogo", help="arquivo JSON do catálogo gerado")
+    parser.add_argument("--cache", help="diretório de ajustes já feitos")
+    args = parser.parse_args(argumentos)
+    dispositivos = ajusta(lePontos(args.pontos), args.cache)
+    Catalogo(dispositivos).grava(args.catalogo)
+    print("%d componentes gravados em %s" % (len(dispositivos),
+                                             args.catalogo))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(principal())
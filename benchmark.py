@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+###########################################################################
+# Medição de desempenho do cálculo de perdas da topologia sete níveis     #
+# (calculo_perdas.py).                                                    #
+#                                                                         #
+# Casos medidos:                                                          #
+#   mf        : calcular_perdas em cada modo, para fp de 10 kHz a 10 MHz  #
+#               (custo em função do número de ciclos de chaveamento)      #
+#   funcoes   : funções de perda dos componentes e funções auxiliares     #
+#               (interpolar, forma de onda), isoladamente                 #
+#   varredura : pontos por segundo de varredura.varrer e calcular_lote    #
+#   importacao: tempo de importação dos módulos em um processo novo e     #
+#               módulos pesados (scipy, numba...) carregados por ela      #
+# Cada caso registra o menor tempo entre as repetições e o pico de        #
+# memória alocada (tracemalloc, quando disponível).                       #
+#                                                                         #
+# Os resultados são gravados em JSON. Com uma referência (JSON gravado    #
+# antes de uma alteração), são apontados os casos mais lentos que a       #
+# tolerância e os pontos em que perdasW_bidir_ponte ou perdasW_bidir_2ch  #
+# mudaram. Módulos pesados carregados na importação são sempre apontados. #
+#                                                                         #
+# Uso: python benchmark.py [-s saida.json] [-r referencia.json] [--rapido]#
+###########################################################################
+
+# Habilita resultado real da divisão (e não apenas parte inteira)
+from __future__ import division
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+import numpy
+
+import calculo_perdas
+import varredura
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2: pico de memória não é medido.
+    tracemalloc = None
+
+# Frequências de chaveamento do caso "mf" (Hz).
+FREQUENCIAS = (10e3, 30e3, 100e3, 300e3, 1e6, 3e6, 10e6)
+FREQUENCIAS_RAPIDO = (10e3, 100e3, 1e6, 10e6)
+MODOS = ("ciclos", "analitico")
+
+# Módulos cujo tempo de importação é medido.
+MODULOS_IMPORTACAO = ("calculo_perdas", "varredura", "processa_arquivo")
+
+# Módulos pesados, opcionais, que só devem ser carregados quando uma
+# função que os usa é chamada (e nunca na importação).
+MODULOS_PESADOS = ("scipy", "matplotlib", "numba", "pandas", "pyarrow")
+
+# Saídas comparadas com a referência.
+SAIDAS = ("perdasW_bidir_ponte", "perdasW_bidir_2ch")
+
+###########################################################################
+# MEDIÇÃO                                                                 #
+###########################################################################
+def cronometra(funcao, repeticoes=5, tempo_minimo=0.2):
+    """
+    Retorna o menor tempo (s) de uma chamada de funcao() entre
+    "repeticoes" medições. Cada medição repete a chamada até somar
+    "tempo_minimo" segundos, para que funções rápidas não sejam
+    dominadas pela resolução do relógio.
+    """
+    relogio = timeit.default_timer
+    chamadas = 1
+    while True:
+        inicio = relogio()
+        for _ in range(chamadas):
+            funcao()
+        decorrido = relogio() - inicio
+        if decorrido >= tempo_minimo / repeticoes or chamadas >= 10**6:
+            break
+        chamadas *= 2 if decorrido == 0 else \
+            max(2, int(tempo_minimo / repeticoes / decorrido) + 1)
+    tempos = [decorrido / chamadas]
+    for _ in range(repeticoes - 1):
+        inicio = relogio()
+        for _ in range(chamadas):
+            funcao()
+        tempos.append((relogio() - inicio) / chamadas)
+    return min(tempos)
+
+def memoriaPico(funcao):
+    """
+    Retorna (resultado de funcao(), pico de memória alocada em bytes
+    durante a chamada); o pico é None sem tracemalloc.
+    """
+    if tracemalloc is None:
+        return funcao(), None
+    ativo = tracemalloc.is_tracing()
+    if not ativo:
+        tracemalloc.start()
+    elif hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    inicial = tracemalloc.get_traced_memory()[0]
+    try:
+        resultado = funcao()
+        pico = tracemalloc.get_traced_memory()[1] - inicial
+    finally:
+        if not ativo:
+            tracemalloc.stop()
+    return resultado, max(pico, 0)
+
+def mede(funcao, repeticoes=5, tempo_minimo=0.2):
+    """
+    Mede funcao(): retorna (resultado, dicionário com "tempo_s" e
+    "memoria_pico_bytes"). O pico de memória é medido em uma chamada
+    separada, pois tracemalloc torna o cálculo mais lento.
+    """
+    resultado, pico = memoriaPico(funcao)
+    return resultado, {"tempo_s": cronometra(funcao, repeticoes,
+                                             tempo_minimo),
+                       "memoria_pico_bytes": pico}
+
+###########################################################################
+# CASOS                                                                   #
+###########################################################################
+def casoMf(frequencias=FREQUENCIAS, modos=MODOS, repeticoes=5,
+           tempo_minimo=0.2):
+    """
+    calcular_perdas no ponto padrão para cada fp e modo. Retorna
+    dicionário indexado por "mf/<modo>/<fp>" com tempo, memória, mf e
+    as SAIDAS calculadas.
+    """
+    casos = {}
+    for modo in modos:
+        for fp in frequencias:
+            cfg = calculo_perdas.Configuracao(fp=fp)
+            r, medida = mede(lambda: calculo_perdas.calcular_perdas(cfg,
+                                                                    modo),
+                             repeticoes, tempo_minimo)
+            medida["mf"] = r.mf
+            for s in SAIDAS:
+                medida[s] = float(getattr(r, s))
+            casos["mf/%s/%g" % (modo, fp)] = medida
+    return casos
+
+def casoFuncoes(n=100000, repeticoes=5, tempo_minimo=0.2):
+    """
+    Funções de perda e auxiliares para um vetor de "n" correntes (0 a
+    40 A) e tensões de bloqueio. Retorna dicionário indexado por
+    "funcoes/<nome>" com tempo por chamada e por elemento.
+    """
+    c = calculo_perdas
+    i = numpy.linspace(0, 40, n)
+    vblock = numpy.linspace(0, 100, n)
+    angulo = numpy.linspace(0, 2*numpy.pi, n, endpoint=False)
+    # Tabela de chaveamento da chave, interpolada por interpolar.
+    x, y = list(c.chaveamentoQ.x), list(c.chaveamentoQ.y)
+    funcoes = (
+        ("perdaConducaoQ",         lambda: c.perdaConducaoQ(i, c.fp)),
+        ("perdaChaveamentoQ",      lambda: c.perdaChaveamentoQ(i)),
+        ("perdaConducaoD",         lambda: c.perdaConducaoD(i, c.fp)),
+        ("perdaChaveamentoD",      lambda: c.perdaChaveamentoD(i, vblock)),
+        ("perdaConducaoDPonte",    lambda: c.perdaConducaoDPonte(i, c.fp)),
+        ("perdaChaveamentoDPonte", lambda: c.perdaChaveamentoDPonte(i,
+                                                                    vblock)),
+        ("interpolar",             lambda: c.interpolar(i, x, y)),
+        ("interpolar_escalar",     lambda: c.interpolar(12.5, x, y)),
+        ("formaDeOndaCorrente",    lambda: c.formaDeOndaCorrente(
+                                       angulo, c.I_def, c.fat_crista)))
+    casos = {}
+    for nome, funcao in funcoes:
+        _, medida = mede(funcao, repeticoes, tempo_minimo)
+        elementos = 1 if nome.endswith("_escalar") else n
+        medida["elementos"] = elementos
+        medida["ns_por_elemento"] = medida["tempo_s"] / elementos * 1e9
+        casos["funcoes/" + nome] = medida
+    return casos
+
+def casoVarredura(Ief=None, I_def=None, fp=21.6e3, tamanho_bloco=64,
+                  repeticoes=3, tempo_minimo=0.5):
+    """
+    Varredura de Ief x I_def em um processo (varredura.varrer, gravando
+    em diretório temporário) e o mesmo conjunto por calcular_lote.
+    Retorna dicionário indexado por "varredura/<nome>" com tempo, pontos
+    e pontos por segundo.
+    """
+    Ief = numpy.linspace(1, 12, 16) if Ief is None else Ief
+    I_def = numpy.linspace(-0.8, 0.8, 16) if I_def is None else I_def
+    eixos = {"Ief": list(Ief), "I_def": list(I_def), "fp": [fp]}
+    pontos = varredura.tamanhoGrade(**eixos)
+
+    def varre():
+        destino = tempfile.mkdtemp(prefix="benchmark_")
+        try:
+            return varredura.varrer(eixos, destino, tamanho_bloco,
+                                    processos=1)
+        finally:
+            shutil.rmtree(destino)
+
+    a, b = numpy.meshgrid(Ief, I_def, indexing="ij")
+    cfg = calculo_perdas.Configuracao(fp=fp)
+    def lote():
+        return calculo_perdas.calcular_lote(cfg, a.ravel(), b.ravel())
+
+    casos = {}
+    for nome, funcao in (("varrer", varre), ("calcular_lote", lote)):
+        _, medida = mede(funcao, repeticoes, tempo_minimo)
+        medida["pontos"] = pontos
+        medida["pontos_por_s"] = pontos / medida["tempo_s"]
+        casos["varredura/" + nome] = medida
+    return casos
+
+def casoImportacao(modulos=MODULOS_IMPORTACAO, repeticoes=5):
+    """
+    Importa cada módulo em um processo novo, com numpy já importado
+    (custo próprio do módulo), e registra o menor tempo entre as
+    repetições e os MODULOS_PESADOS carregados. Retorna dicionário
+    indexado por "importacao/<modulo>".
+    """
+    codigo = ("import json, sys, timeit, numpy\n"
+              "inicio = timeit.default_timer()\n"
+              "import %s\n"
+              "tempo = timeit.default_timer() - inicio\n"
+              "print(json.dumps([tempo, [m for m in %r "
+              "if m in sys.modules]]))")
+    diretorio = os.path.dirname(os.path.abspath(__file__))
+    casos = {}
+    for modulo in modulos:
+        tempos = []
+        for _ in range(repeticoes):
+            saida = subprocess.check_output(
+                [sys.executable, "-c", codigo % (modulo, MODULOS_PESADOS)],
+                cwd=diretorio)
+            tempo, pesados = json.loads(saida.decode("utf-8"))
+            tempos.append(tempo)
+        casos["importacao/" + modulo] = {"tempo_s": min(tempos),
+                                         "memoria_pico_bytes": None,
+                                         "modulos_pesados": pesados}
+    return casos
+
+def executa(rapido=False):
+    """
+    Executa todos os casos. Com "rapido", usa menos frequências e
+    repetições (para conferência, não para comparação fina).
+    Retorna dicionário com "ambiente" e "casos".
+    """
+    repeticoes, tempo_minimo = (2, 0.05) if rapido else (5, 0.2)
+    casos = {}
+    casos.update(casoMf(FREQUENCIAS_RAPIDO if rapido else FREQUENCIAS,
+                        MODOS, repeticoes, tempo_minimo))
+    casos.update(casoFuncoes(repeticoes=repeticoes,
+                             tempo_minimo=tempo_minimo))
+    casos.update(casoVarredura(repeticoes=repeticoes,
+                               tempo_minimo=tempo_minimo))
+    casos.update(casoImportacao(repeticoes=repeticoes))
+    return {"ambiente": {"python": platform.python_version(),
+                         "numpy": numpy.__version__,
+                         "plataforma": platform.platform(),
+                         "versao_motor": calculo_perdas.VERSAO_MOTOR},
+            "casos": casos}
+
+###########################################################################
+# COMPARAÇÃO COM A REFERÊNCIA                                             #
+###########################################################################
+def compara(atual, referencia, tolerancia_tempo=0.3,
+            tolerancia_numerica=1e-9):
+    """
+    Compara resultados de executa com a "referencia". Retorna lista de
+    textos, um por regressão:
+    - caso cujo tempo passou de (1 + tolerancia_tempo) vezes o da
+      referência;
+    - caso cujas SAIDAS diferem da referência mais que
+      "tolerancia_numerica" (relativa).
+    Casos ausentes em uma das duas execuções são ignorados.
+    """
+    regressoes = []
+    for nome in sorted(set(atual["casos"]) & set(referencia["casos"])):
+        a, r = atual["casos"][nome], referencia["casos"][nome]
+        razao = a["tempo_s"] / r["tempo_s"]
+        if razao > 1 + tolerancia_tempo:
+            regressoes.append("%s: tempo %.3g s -> %.3g s (%.2fx)"
+                              % (nome, r["tempo_s"], a["tempo_s"], razao))
+        for s in SAIDAS:
+            if s not in a or s not in r:
+                continue
+            erro = abs(a[s] - r[s]) / max(abs(r[s]), 1e-300)
+            if not erro <= tolerancia_numerica:
+                regressoes.append("%s: %s %r -> %r (erro relativo %.3g)"
+                                  % (nome, s, r[s], a[s], erro))
+    return regressoes
+
+def verificaImportacao(atual):
+    """
+    Retorna lista de textos, um por caso de importação que carregou
+    algum dos MODULOS_PESADOS (não depende de referência).
+    """
+    return ["%s: carrega %s" % (nome, ", ".join(c["modulos_pesados"]))
+            for nome, c in sorted(atual["casos"].items())
+            if c.get("modulos_pesados")]
+
+def imprime(atual, referencia=None):
+    """Imprime tabela com tempos, memória e razão sobre a referência"""
+    casos = atual["casos"]
+    print("%-36s %12s %12s %14s %8s" % ("caso", "tempo (ms)", "memória (kB)",
+                                        "pontos/s", "x ref."))
+    for nome in sorted(casos):
+        c = casos[nome]
+        memoria = "-" if c["memoria_pico_bytes"] is None \
+                  else "%.0f" % (c["memoria_pico_bytes"] / 1024)
+        taxa = "%.0f" % c["pontos_por_s"] if "pontos_por_s" in c else "-"
+        razao = "-"
+        if referencia is not None and nome in referencia["casos"]:
+            razao = "%.2f" % (c["tempo_s"] /
+                              referencia["casos"][nome]["tempo_s"])
+        print("%-36s %12.4f %12s %14s %8s" % (nome, c["tempo_s"]*1e3,
+                                              memoria, taxa, razao))
+
+def principal(argumentos=None):
+    parser = argparse.ArgumentParser(
+        description="Mede o desempenho do cálculo de perdas")
+    parser.add_argument("-s", "--saida",
+                        help="arquivo JSON onde gravar os resultados")
+    parser.add_argument("-r", "--referencia",
+                        help="arquivo JSON de uma execução anterior")
+    parser.add_argument("--rapido", action="store_true",
+                        help="menos casos e repetições")
+    parser.add_argument("--tolerancia-tempo", type=float, default=0.3,
+                        help="aumento relativo de tempo tolerado")
+    parser.add_argument("--tolerancia-numerica", type=float, default=1e-9,
+                        help="diferença relativa tolerada nas perdas")
+    args = parser.parse_args(argumentos)
+
+    referencia = None
+    if args.referencia:
+        with open(args.referencia) as arquivo:
+            referencia = json.load(arquivo)
+    atual = executa(args.rapido)
+    imprime(atual, referencia)
+    if args.saida:
+        with open(args.saida, "w") as arquivo:
+            json.dump(atual, arquivo, indent=1, sort_keys=True)
+    regressoes = verificaImportacao(atual)
+    if referencia is not None:
+        regressoes += compara(atual, referencia, args.tolerancia_tempo,
+                              args.tolerancia_numerica)
+    for texto in regressoes:
+        print("REGRESSÃO " + texto)
+    return 1 if regressoes else 0
+
+if __name__ == "__main__":
+    sys.exit(principal())
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+###########################################################################
+# Cache em disco dos resultados de calculo_perdas.calcular_perdas.        #
+#                                                                         #
+# Cada ponto de operação é identificado pelo hash SHA-256 de uma          #
+# representação canônica de todas as entradas: variáveis numéricas de     #
+# Configuracao, forma de onda da corrente (parametrosForma do fat_crista  #
+# da configuração), modo de cálculo, parâmetros das curvas de perda       #
+# (parametrosModelo), tabela de estados e versão do cálculo               #
+# (VERSAO_MOTOR). Qualquer mudança em uma delas gera outra chave.         #
+#                                                                         #
+# Os resultados são guardados em um banco SQLite, que pode ser usado ao   #
+# mesmo tempo por vários processos, como um vetor compacto de perdas e    #
+# correntes por dispositivo e valores totais. Quando o banco passa de     #
+# "tamanho_maximo" bytes, os resultados lidos há mais tempo são           #
+# descartados.                                                            #
+###########################################################################
+
+# Habilita resultado real da divisão (e não apenas parte inteira)
+from __future__ import division
+
+import collections
+import hashlib
+import json
+import sqlite3
+import time
+
+import numpy
+
+import calculo_perdas
+
+###########################################################################
+# CHAVE DOS PONTOS DE OPERAÇÃO                                            #
+###########################################################################
+def textoModelo(tabela, modelo=None):
+    """
+    Representação canônica (texto JSON) do ModeloPerdas "modelo" (padrão:
+    curvas de calculo_perdas), da TabelaEstados "tabela" e de
+    VERSAO_MOTOR, usada nas chaves do cache e nas assinaturas de
+    varredura
+    """
+    parametros = calculo_perdas.parametrosModelo() if modelo is None \
+                 else modelo.parametros()
+    return json.dumps({"versao": calculo_perdas.VERSAO_MOTOR,
+                       "modelo": parametros,
+                       "dispositivos": list(tabela.dispositivos),
+                       "constante": tabela.constante.tolist(),
+                       "coef_d": tabela.coef_d.tolist(),
+                       "comuta": tabela.comuta.tolist(),
+                       "tipo": tabela.tipo.tolist()},
+                      sort_keys=True)
+
+def textoForma(fatorDeCrista):
+    """Representação canônica (texto JSON) da forma de onda da corrente"""
+    return json.dumps(calculo_perdas.parametrosForma(fatorDeCrista),
+                      sort_keys=True)
+
+def chave(cfg, modo="ciclos", tabela=None, modelo=None, texto_modelo=None,
+          texto_forma=None):
+    """
+    Retorna o hash (texto hexadecimal) que identifica o cálculo de "cfg"
+    no modo "modo", com a TabelaEstados "tabela" e o ModeloPerdas
+    "modelo". "texto_modelo" e "texto_forma" são as representações de
+    textoModelo e textoForma (de cfg.fat_crista), que podem ser
+    passadas para não serem recalculadas a cada ponto.
+    """
+    if texto_modelo is None:
+        texto_modelo = textoModelo(calculo_perdas.TABELA_7NIVEIS
+                                   if tabela is None else tabela, modelo)
+    if texto_forma is None:
+        texto_forma = textoForma(cfg.fat_crista)
+    # repr de float é exato, de forma que valores iguais geram o mesmo
+    # texto; inteiros são convertidos para que 100 e 100.0 coincidam.
+    entradas = ",".join(repr(float(getattr(cfg, n)))
+                        for n in calculo_perdas.ENTRADAS)
+    texto = modo + "|" + entradas + "|" + texto_forma + "|" + texto_modelo
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+###########################################################################
+# FORMATO COMPACTO DO RESULTADO                                           #
+###########################################################################
+# Valores escalares de Resultado guardados, após os vetores por
+# dispositivo (perdas, correntes, correntes_rms e erro_estimado).
+ESCALARES = ("ma", "mf", "tt0", "tt1", "tt2", "tt3", "tt4", "tt5", "tt6",
+             "tt7", "tt8", "chA", "chB", "chC", "chD", "chE", "chF",
+             "potencia_saida", "perdasW_bidir_ponte", "perdasW_bidir_2ch",
+             "rend_ponte", "rend_2ch")
+VETORES = ("perdas", "correntes", "correntes_rms", "erro_estimado")
+
+def compacta(r, tabela=None):
+    """
+    Converte Resultado calculado com a TabelaEstados "tabela" (padrão:
+    TABELA_7NIVEIS) em bytes (vetor de float64)
+    """
+    n = (calculo_perdas.TABELA_7NIVEIS if tabela is None
+         else tabela).dispositivos
+    vetores = [[numpy.nan]*len(n) if getattr(r, v) is None
+               else [getattr(r, v)[d] for d in n] for v in VETORES]
+    valores = sum(vetores, []) + [getattr(r, e) for e in ESCALARES]
+    return numpy.array(valores, dtype=numpy.float64).tobytes()
+
+def expande(dados, cfg, tabela=None):
+    """
+    Reconstrói o Resultado de "cfg" a partir de bytes de compacta, com
+    os itens da TabelaEstados "tabela" (padrão: TABELA_7NIVEIS)
+    """
+    n = (calculo_perdas.TABELA_7NIVEIS if tabela is None
+         else tabela).dispositivos
+    valores = numpy.frombuffer(dados, dtype=numpy.float64)
+    campos = {}
+    for k, v in enumerate(VETORES):
+        vetor = valores[k*len(n):(k + 1)*len(n)]
+        campos[v] = None if v == "erro_estimado" and \
+                    numpy.all(numpy.isnan(vetor)) \
+                    else dict(zip(n, (float(x) for x in vetor)))
+    for k, e in enumerate(ESCALARES):
+        campos[e] = float(valores[len(VETORES)*len(n) + k])
+    return calculo_perdas.Resultado(
+        config=cfg, avisos=calculo_perdas.validaEntradas(cfg, []),
+        **campos)
+
+###########################################################################
+# CACHE                                                                   #
+###########################################################################
+class CacheResultados(object):
+    """
+    Cache de Resultados no banco SQLite "caminho", criado se não existir.
+    "acertos" e "faltas" contam as consultas feitas por este objeto; as
+    totais, de todos os processos, estão em estatisticas().
+    """
+    # Número de representações de formas de onda guardadas (ver chave).
+    tamanho_formas = 64
+
+    def __init__(self, caminho, tamanho_maximo=256*2**20, espera=60.0):
+        self.caminho = caminho
+        self.tamanho_maximo = tamanho_maximo
+        self.acertos = 0
+        self.faltas = 0
+        self._modelos = {}
+        self._formas = collections.OrderedDict()
+        # isolation_level=None: transações controladas explicitamente.
+        self.conexao = sqlite3.connect(caminho, timeout=espera,
+                                       isolation_level=None)
+        self.conexao.execute("PRAGMA journal_mode=WAL")
+        self.conexao.execute(
+            "CREATE TABLE IF NOT EXISTS resultados ("
+            " chave TEXT PRIMARY KEY, dados BLOB, acesso REAL)")
+        self.conexao.execute(
+            "CREATE INDEX IF NOT EXISTS resultados_acesso"
+            " ON resultados (acesso)")
+        self.conexao.execute(
+            "CREATE TABLE IF NOT EXISTS estatisticas ("
+            " nome TEXT PRIMARY KEY, valor INTEGER)")
+        self.conexao.execute(
+            "INSERT OR IGNORE INTO estatisticas VALUES"
+            " ('acertos', 0), ('faltas', 0)")
+
+    def chave(self, cfg, modo="ciclos", tabela=None, modelo=None):
+        """
+        Hash do ponto (ver chave), com a representação do modelo
+        memorizada por tabela e modelo e a da forma de onda por
+        fat_crista (números por valor, FormaDeOnda por identidade; apenas
+        as "tamanho_formas" usadas por último)
+        """
+        tabela = calculo_perdas.TABELA_7NIVEIS if tabela is None else tabela
+        k = (id(tabela), id(modelo))
+        if k not in self._modelos:
+            # Os objetos são mantidos para que seus ids não sejam reusados.
+            self._modelos[k] = (tabela, modelo,
+                                textoModelo(tabela, modelo))
+        forma = cfg.fat_crista
+        # Reinsere a forma para marcá-la como usada mais recentemente.
+        texto_forma = self._formas.pop(forma, None)
+        if texto_forma is None:
+            texto_forma = textoForma(forma)
+        self._formas[forma] = texto_forma
+        while len(self._formas) > self.tamanho_formas:
+            self._formas.popitem(last=False)
+        return chave(cfg, modo, texto_modelo=self._modelos[k][2],
+                     texto_forma=texto_forma)
+
+    def calcular_varios(self, configs, modo="ciclos", tabela=None,
+                        modelo=None):
+        """
+        Retorna lista de Resultados de "configs", lidos do cache ou
+        calculados por calcular_perdas e guardados. Todas as consultas
+        de uma chamada são feitas em uma única transação.
+        """
+        configs = list(configs)
+        chaves = [self.chave(c, modo, tabela, modelo) for c in configs]
+        encontrados = {}
+        # Consulta em grupos, dentro do limite de parâmetros do SQLite.
+        for inicio in range(0, len(chaves), 500):
+            grupo = chaves[inicio:inicio + 500]
+            linhas = self.conexao.execute(
+                "SELECT chave, dados FROM resultados WHERE chave IN (%s)"
+                % ",".join("?"*len(grupo)), grupo).fetchall()
+            encontrados.update(linhas)
+
+        resultados, novos = [], {}
+        for cfg, k in zip(configs, chaves):
+            if k in encontrados:
+                resultados.append(expande(encontrados[k], cfg, tabela))
+            else:
+                r = calculo_perdas.calcular_perdas(cfg, modo, tabela, modelo)
+                novos[k] = compacta(r, tabela)
+                resultados.append(r)
+        acertos = sum(1 for k in chaves if k in encontrados)
+        self._registra(encontrados, novos, acertos, len(chaves) - acertos)
+        return resultados
+
+    def calcular_perdas(self, config=None, modo="ciclos", tabela=None,
+                        modelo=None):
+        """Como calculo_perdas.calcular_perdas, usando o cache"""
+        cfg = calculo_perdas.Configuracao() if config is None else config
+        return self.calcular_varios([cfg], modo, tabela, modelo)[0]
+
+    def _registra(self, lidos, novos, acertos, faltas):
+        """Atualiza acessos, grava novos resultados e descarta antigos"""
+        self.acertos += acertos
+        self.faltas += faltas
+        agora = time.time()
+        with self._transacao():
+            self.conexao.executemany(
+                "UPDATE resultados SET acesso = ? WHERE chave = ?",
+                [(agora, k) for k in lidos])
+            self.conexao.executemany(
+                "INSERT OR REPLACE INTO resultados VALUES (?, ?, ?)",
+                [(k, sqlite3.Binary(d), agora) for k, d in novos.items()])
+            self.conexao.executemany(
+                "UPDATE estatisticas SET valor = valor + ? WHERE nome = ?",
+                [(acertos, "acertos"), (faltas, "faltas")])
+            if novos:
+                self._descarta()
+
+    def _transacao(self):
+        return _Transacao(self.conexao)
+
+    def _descarta(self):
+        """Remove os resultados lidos há mais tempo além do tamanho máximo"""
+        n, tamanho = self.conexao.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(dados)), 0)"
+            " FROM resultados").fetchone()
+        if tamanho <= self.tamanho_maximo or not n:
+            return
+        excesso = int(n * (1 - self.tamanho_maximo/tamanho)) + 1
+        self.conexao.execute(
+            "DELETE FROM resultados WHERE chave IN (SELECT chave FROM"
+            " resultados ORDER BY acesso LIMIT ?)", (excesso,))
+
+    def estatisticas(self):
+        """
+        Retorna dicionário com acertos e faltas totais (de todos os
+        processos), número de resultados e bytes guardados.
+        """
+        totais = dict(self.conexao.execute(
+            "SELECT nome, valor FROM estatisticas").fetchall())
+        n, tamanho = self.conexao.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(dados)), 0)"
+            " FROM resultados").fetchone()
+        return {"acertos": totais["acertos"], "faltas": totais["faltas"],
+                "resultados": n, "bytes": tamanho}
+
+    def limpa(self):
+        """Remove todos os resultados e zera as estatísticas"""
+        with self._transacao():
+            self.conexao.execute("DELETE FROM resultados")
+            self.conexao.execute("UPDATE estatisticas SET valor = 0")
+
+    def fecha(self):
+        self.conexao.close()
+
+class _Transacao(object):
+    """Transação exclusiva de escrita (BEGIN IMMEDIATE ... COMMIT)"""
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    def __enter__(self):
+        self.conexao.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, tipo, valor, rastro):
+        self.conexao.execute("COMMIT" if tipo is None else "ROLLBACK")
@@ -16,10 +16,17 @@
 from __future__ import division
 
 # Importa funções matemáticas utilizadas
-from math import sin, pi, asin, sqrt, floor, ceil, log10
+from math import pi, asin, sqrt, floor, ceil, exp, lgamma
 
-# Importa interpolacao de valor em lista
-import scipy.interpolate
+# Importa leitura e cópia de tabelas de estados e memória de formas
+# de onda
+import collections
+import copy
+import json
+
+# Importa operações vetoriais, usadas para calcular todos os ciclos de
+# chaveamento de uma só vez.
+import numpy
 
 ###########################################################################
 # VARIÁVEIS DEFINIDAS PELO USUÁRIO                                        #
@@ -46,78 +53,239 @@ fr = 60      # Hz
 # Frequência da portadora/chaveamento
 fp = 21600   # Hz
 
+###########################################################################
+# MODELOS COMPILADOS DAS CURVAS DE PERDA                                  #
+# Cada curva é montada uma única vez, com seus coeficientes constantes    #
+# já calculados, e avaliada depois sobre vetores inteiros de corrente.    #
+###########################################################################
+class ConducaoQuadratica(object):
+    """
+    Queda de tensão em condução obtida pela inversão do ajuste quadrático
+    i = a*Vceon**2 + b*Vceon + c. Abaixo de "i_min" a queda é "v_min".
+    """
+    def __init__(self, a, b, c, i_min, v_min):
+        self.a = a
+        self.b = b
+        self.c = c
+        self.i_min = i_min
+        self.v_min = v_min
+        # Termos da fórmula de Bhaskara que não dependem da corrente.
+        self._menos_b = -b
+        self._b2 = b**2
+        self._4a = 4*a
+        self._2a = 2*a
+
+    def parametros(self):
+        """Parâmetros que definem a curva (usados na chave de caches)"""
+        return {"a": self.a, "b": self.b, "c": self.c,
+                "i_min": self.i_min, "v_min": self.v_min}
+
+    def tensao(self, i):
+        """retorna Vce(on) em V para um vetor de correntes"""
+        # Raiz limitada a zero, pois abaixo de i_min o ajuste não é utilizado.
+        raiz = numpy.sqrt(numpy.maximum(self._b2 - self._4a*(self.c-i), 0))
+        return numpy.where(i<self.i_min, self.v_min,
+                           (self._menos_b+raiz)/self._2a)
+
+    def __call__(self, i, fp):
+        """retorna perda em J para um vetor de correntes"""
+        W = self.tensao(i)*i # W
+        t = 1/fp # s
+        return W*t # J = W*t
+
+class ConducaoLog(object):
+    """
+    Queda de tensão em condução ajustada por polinômio em log10(i),
+    com coeficientes do maior para o menor grau. Abaixo de "i_min" a
+    queda é "v_min".
+    """
+    def __init__(self, coeficientes, i_min, v_min):
+        self.coeficientes = tuple(coeficientes)
+        self.i_min = i_min
+        self.v_min = v_min
+        grau = len(self.coeficientes) - 1
+        self._termos = [(c, grau - n) for n, c in enumerate(self.coeficientes)]
+
+    def parametros(self):
+        """Parâmetros que definem a curva (usados na chave de caches)"""
+        return {"coeficientes": list(self.coeficientes),
+                "i_min": self.i_min, "v_min": self.v_min}
+
+    def tensao(self, i):
+        """retorna Vce(on) em V para um vetor de correntes"""
+        # Logaritmo limitado a i_min, pois abaixo disso o ajuste não é usado.
+        logi = numpy.log10(numpy.maximum(i, self.i_min))
+        Vceon = 0
+        for c, n in self._termos:
+            Vceon = Vceon + c*logi**n
+        return numpy.where(i<self.i_min, self.v_min, Vceon)
+
+    def __call__(self, i, fp):
+        """retorna perda em J para um vetor de correntes"""
+        W = self.tensao(i)*i # W
+        t = 1/fp # s
+        return W*t # J = W*t
+
+class ChaveamentoTabela(object):
+    """
+    Energia de comutação (Eon + Eoff) interpolada linearmente em uma
+    tabela de pontos (A, mJ) e multiplicada por um fator de correção.
+    """
+    def __init__(self, x, y, correcao=1):
+        self.x = numpy.array(x, dtype=float)
+        self.y = numpy.array(y, dtype=float)
+        self.correcao = correcao
+
+    def parametros(self):
+        """Parâmetros que definem a curva (usados na chave de caches)"""
+        return {"x": self.x.tolist(), "y": self.y.tolist(),
+                "correcao": self.correcao}
+
+    def energia(self, i):
+        """retorna Eon+Eoff em mJ para um vetor de correntes"""
+        if numpy.any(i < self.x[0]) or numpy.any(i > self.x[-1]):
+            # Mesmo comportamento de scipy.interpolate.interp1d
+            raise ValueError("Corrente fora da faixa da tabela de "
+                             "chaveamento: %s a %s A" % (self.x[0], self.x[-1]))
+        return numpy.interp(i, self.x, self.y)
+
+    def __call__(self, i):
+        """retorna perda em J para um vetor de correntes"""
+        return self.energia(i)/1000 * self.correcao # Joule
+
+class ChaveamentoPolinomial(object):
+    """
+    Energia de comutação (Eon + Eoff) em mJ dada por polinômio na
+    corrente, com coeficientes do maior para o menor grau, multiplicada
+    por um fator de correção. Coeficientes podem ser vetores coluna,
+    para avaliar vários componentes de uma vez.
+    """
+    def __init__(self, coeficientes, correcao=1):
+        self.coeficientes = tuple(coeficientes)
+        self.correcao = correcao
+
+    def parametros(self):
+        """Parâmetros que definem a curva (usados na chave de caches)"""
+        return {"coeficientes": list(self.coeficientes),
+                "correcao": self.correcao}
+
+    def energia(self, i):
+        """retorna Eon+Eoff em mJ para um vetor de correntes"""
+        # Avaliação do polinômio pelo método de Horner.
+        E = 0
+        for c in self.coeficientes:
+            E = E*i + c
+        return E
+
+    def __call__(self, i):
+        """retorna perda em J para um vetor de correntes"""
+        return self.energia(i)/1000 * self.correcao # Joule
+
 ###########################################################################
 # DEFINIÇÃO DE FUNÇÕES DE PERDA EM FUNCAO DO COMPONENTE UTILIZADO         #
 # Usuário deve inserir equações aproximadas das perdas de condução e de   #
 # chaveamento para as chaves e diodos utilizados.                         #
 ###########################################################################
-def perdaConducaoQ(i):
+# Para IRG4PC50UD
+conducaoQ = ConducaoQuadratica(a= 34.494,
+                               b=-45.751198,
+                               c= 15.3045316,
+                               i_min=0.2, v_min=0.707)
+perdas_a_5ohms = 1.58282
+perdas_a_Rgate = 2.65279
+chaveamentoQ = ChaveamentoTabela(x=[0,13.5540,25.1140,39.409,54.0930], # A
+                                 y=[0, 1.1391, 2.3747, 4.484, 6.5859], # mJ
+                                 correcao=perdas_a_Rgate/perdas_a_5ohms)
+# Para Diodo inserido em IRG4PC50UD
+conducaoD = ConducaoQuadratica(a= 33.050759762,
+                               b=-48.682061178,
+                               c= 19.131811979,
+                               i_min=1.3, v_min=0.8)
+# UF5408
+conducaoDPonte = ConducaoLog([0.0430482, 0.1598030, 0.2299320,
+                              0.4327740, 1.12748],
+                             i_min=0.01, v_min=0.6)
+# Recuperação reversa do diodo inserido em IRG4PC50UD
+Qrr = 300e-9 # C
+# Recuperação reversa do UF5408
+trr = 75e-9 # s
+irr = 0.25  # A
+
+def perdaConducaoQ(i,fp=fp):
     """retorna perda em J da CHAVE em funcao da corrente"""
     # Para IRG4PC50UD
-    if(i<0.2):
-        Vceon = 0.707
-    else:
-        a= 34.494
-        b=-45.751198
-        c= 15.3045316
-        Vceon = (-b+sqrt(b**2 -4*a*(c-i)))/(2*a)
-
-    W = Vceon*i # W
-    t = 1/fp # s
-    return W*t # J = W*t
-    
+    return conducaoQ(i, fp)
+
 def perdaChaveamentoQ(i):
     """retorna perda em J da CHAVE em funcao da corrente"""
     # Para IRG4PC50UD
-    perdas_a_5ohms = 1.58282
-    perdas_a_Rgate = 2.65279
-    correcao_perdas = perdas_a_Rgate/perdas_a_5ohms
-    x=[0,13.5540,25.1140,39.409,54.0930] # A
-    y=[0, 1.1391, 2.3747, 4.484, 6.5859] # mJ
-    Eonoff = interpolar(i,x,y)
-    return Eonoff/1000 * correcao_perdas # Joule
-
-def perdaConducaoD(i):
+    return chaveamentoQ(i) # Joule
+
+def perdaConducaoD(i,fp=fp):
     """retorna perda em j do DIODO em funcao da corrente"""
     # Para Diodo inserido em IRG4PC50UD
-    if(i<1.3):
-        Vceon = 0.8
-    else:
-        a= 33.050759762
-        b=-48.682061178
-        c= 19.131811979
-        Vceon = (-b+sqrt(b**2 -4*a*(c-i)))/(2*a)
-
-    W = Vceon*i # W
-    t = 1/fp # s
-    return W*t # J = W*t
-    
+    return conducaoD(i, fp)
+
 def perdaChaveamentoD(i,vblock):
     """retorna perda em J do DIODO em funcao da corrente"""
     # Para Diodo inserido em IRG4PC50UD
-    Qrr = 300e-9 # C
     return vblock * Qrr # Joule
 
 
-def perdaConducaoDPonte(i):
+def perdaConducaoDPonte(i,fp=fp):
     """retorna perda em J do DIODO em funcao da corrente"""
-    # UF5408    
-    if(i<0.01): Vceon = 0.6
-    else:
-        Vceon = 0.0430482*log10(i)**4 + 0.1598030*log10(i)**3 + \
-                0.2299320*log10(i)**2 + 0.4327740*log10(i) + 1.12748
+    # UF5408
+    return conducaoDPonte(i, fp)
 
-    W = Vceon*i # W
-    t = 1/fp # s
-    return W*t # J = W*t
-    
 def perdaChaveamentoDPonte(i,vblock):
     """retorna perda em J do DIODO em funcao da corrente"""
     # UF5408
-    trr = 75e-9 # s
-    irr = 0.25  # A
     return vblock * trr * irr / 2 #J
 
+def parametrosModelo():
+    """
+    Retorna dicionário com os parâmetros de todas as curvas de perda,
+    usado para identificar o modelo dos componentes (ex.: em caches).
+    """
+    return ModeloPerdas().parametros()
+
+class ModeloPerdas(object):
+    """
+    Curvas de perda dos componentes, que podem substituir as funções de
+    perda acima (ver perdasDispositivos) para comparar componentes sem
+    alterar o arquivo. Curvas não fornecidas assumem as definidas acima,
+    com os mesmos resultados das funções de perda.
+    """
+    def __init__(self, conducaoQ=None, chaveamentoQ=None, conducaoD=None,
+                 Qrr=None, conducaoDPonte=None, trr=None, irr=None):
+        # Os argumentos têm os nomes das curvas definidas acima.
+        padrao = globals()
+        valores = locals()
+        for nome in ("conducaoQ", "chaveamentoQ", "conducaoD", "Qrr",
+                     "conducaoDPonte", "trr", "irr"):
+            setattr(self, nome, padrao[nome] if valores[nome] is None
+                                else valores[nome])
+
+    def parametros(self):
+        """Parâmetros de todas as curvas (usados na chave de caches)"""
+        return {"conducaoQ": self.conducaoQ.parametros(),
+                "chaveamentoQ": self.chaveamentoQ.parametros(),
+                "conducaoD": self.conducaoD.parametros(),
+                "conducaoDPonte": self.conducaoDPonte.parametros(),
+                "Qrr": self.Qrr, "trr": self.trr, "irr": self.irr}
+
+    def perdas(self, iabs, vblock, fp):
+        """
+        Retorna (condução, comutação), matrizes com as perdas (J) de cada
+        ciclo para cada tipo de TIPOS_PERDA (ver perdasDispositivos).
+        """
+        return (numpy.array([self.conducaoQ(iabs, fp),
+                             self.conducaoD(iabs, fp),
+                             self.conducaoDPonte(iabs, fp)]),
+                numpy.array([self.chaveamentoQ(iabs),
+                             vblock * self.Qrr,
+                             vblock * self.trr * self.irr / 2]))
+
 ###########################################################################
 # DEFINIÇÃO DE FUNÇÕES AUXILIARES                                         #
 ###########################################################################
@@ -125,9 +293,18 @@ def interpolar(x,list_x,list_y):
     """
     Recebe duas listas de mesmo tamanho, de pontos em um grafico.
     Retorna o valor de y interpolado para uma posição x fornecida.
+    Interpolação linear por partes, com os mesmos resultados de
+    scipy.interpolate.interp1d (inclusive erro para x fora da faixa).
     """
-    interpolador_y = scipy.interpolate.interp1d(list_x, list_y)
-    return interpolador_y(x)
+    list_x = numpy.asarray(list_x)
+    ordem = numpy.argsort(list_x, kind="mergesort")
+    list_x = list_x[ordem]
+    list_y = numpy.asarray(list_y)[ordem]
+    x = numpy.asarray(x)
+    if numpy.any(x < list_x[0]) or numpy.any(x > list_x[-1]):
+        raise ValueError("Valor fora da faixa de interpolação: %s a %s"
+                         % (list_x[0], list_x[-1]))
+    return numpy.asarray(numpy.interp(x, list_x, list_y))
     
 def validacao(nome_variavel,logica_de_teste):
     """
@@ -136,31 +313,47 @@ def validacao(nome_variavel,logica_de_teste):
     """
     if logica_de_teste == False:
         print("Variavel "+nome_variavel+" fora de limite.")
+    return logica_de_teste
     
-def rms(v):
-    """Calcula valor eficaz de uma lista de valores"""
-    return (sum([x**2 for x in v])/len(v))**0.5
+def rms(v,eixo=-1):
+    """
+    Calcula valor eficaz de uma lista de valores. Para matrizes, calcula
+    o valor eficaz de cada linha.
+    """
+    v = numpy.asarray(v)
+    return (numpy.sum(v**2,axis=eixo)/v.shape[eixo])**0.5
 
-def media(v):
-    """Calcula valor médio de uma lista de valores"""
-    return (sum(v)/len(v))
+def media(v,eixo=-1):
+    """
+    Calcula valor médio de uma lista de valores. Para matrizes, calcula
+    o valor médio de cada linha.
+    """
+    v = numpy.asarray(v)
+    return (numpy.sum(v,axis=eixo)/v.shape[eixo])
 
 def formaDeOndaCorrente(angulo,defasamento,fatorDeCrista):
     """
     Retorna o valor de uma corrente normalizada de 1 A eficaz
-    para um ângulo da senoide tal que 0 <= angulo <2*pi
+    para um ângulo (ou vetor de ângulos) da senoide tal que
+    0 <= angulo <2*pi
     com defasamento da corrente igual a "defasamento".
-    fatorDeCrista ignorado.
+    fatorDeCrista pode ser um número (raiz(2), a menos de
+    TOLERANCIA_SENOIDE, para senoide; outros valores usam
+    FormaFatorDeCrista) ou uma FormaDeOnda.
     """
+    forma = formaDeOnda(fatorDeCrista)
+    if forma is not None:
+        return forma(angulo, defasamento)
+
     # Corrente senoidal tem amplitude raiz(2) para valor eficaz ser de 1A.
     amplitude = sqrt(2)
     
     # Valor da corrente no angulo desejado
-    corrente = amplitude * sin(angulo + defasamento)
+    corrente = amplitude * numpy.sin(angulo + defasamento)
 
     return corrente
 
-def arredondaAngulo(angulo):
+def arredondaAngulo(angulo,mf):
     """Arredonda ângulo de entrada para concluir chaveamento anterior"""
     # Quantidade de chaveamentos por ciclo da referência.
     k = 2*pi/mf
@@ -173,645 +366,1177 @@ def radParaGraus(rad):
 def grausParaRad(graus):
     return 2*pi*graus/360
 
+###########################################################################
+# FORMAS DE ONDA DA CORRENTE                                              #
+# Formas de onda normalizadas para 1 A eficaz, usadas no lugar da         #
+# senoide quando o fator de crista da configuração (Configuracao.         #
+# fat_crista) não é raiz(2) (ver formaDeOnda). Os valores calculados      #
+# para um vetor de ângulos e um defasamento (o "modelo" da                #
+# corrente) são guardados, de forma que pontos que diferem apenas em Ief  #
+# apenas reescalam o modelo.                                              #
+###########################################################################
+class FormaDeOnda(object):
+    """
+    Forma de onda periódica (período 2*pi) da corrente, com valor eficaz
+    de 1 A. Subclasses definem _avalia(x) para o ângulo x (sem
+    defasamento) e parametros().
+    """
+    # Número de modelos guardados por forma de onda.
+    tamanho_memoria = 16
+    # Pontos usados para localizar passagens por zero e o pico.
+    pontos_busca = 4096
+
+    def _memoria(self):
+        if "_modelos" not in self.__dict__:
+            self._modelos = collections.OrderedDict()
+        return self._modelos
+
+    def __call__(self, angulo, defasamento):
+        """Corrente (1 A eficaz) em "angulo" com "defasamento" (rad)"""
+        angulo = numpy.asarray(angulo, dtype=float)
+        defasamento = numpy.asarray(defasamento, dtype=float)
+        chave = (angulo.shape, angulo.tobytes(), defasamento.shape,
+                 defasamento.tobytes())
+        modelos = self._memoria()
+        if chave in modelos:
+            # Reinsere o modelo para marcá-lo como usado mais recentemente.
+            modelo = modelos[chave] = modelos.pop(chave)
+            return modelo
+        modelo = self._avalia(angulo + defasamento)
+        # O modelo é compartilhado entre chamadas e não deve ser alterado.
+        modelo.flags.writeable = False
+        modelos[chave] = modelo
+        while len(modelos) > self.tamanho_memoria:
+            modelos.popitem(last=False)
+        return modelo
+
+    def passagens(self):
+        """
+        Ângulos (0 <= x < 2*pi, sem defasamento) em que a corrente muda de
+        sentido
+        """
+        x = numpy.linspace(0, 2*pi, self.pontos_busca, endpoint=False)
+        positivo = self._avalia(x) >= 0
+        mudancas = numpy.flatnonzero(positivo != numpy.roll(positivo, -1))
+        zeros = []
+        for k in mudancas:
+            # Refina por bisseção entre as amostras vizinhas.
+            a, b = x[k], x[k] + 2*pi/self.pontos_busca
+            sentido_a = positivo[k]
+            for _ in range(50):
+                m = (a + b)/2
+                if (self._avalia(numpy.array([m]))[0] >= 0) == sentido_a:
+                    a = m
+                else:
+                    b = m
+            zeros.append(b % (2*pi))
+        return zeros
+
+    def fatorDeCrista(self):
+        """Valor de pico (aproximado pelos pontos de busca) / valor eficaz"""
+        x = numpy.linspace(0, 2*pi, self.pontos_busca, endpoint=False)
+        return float(numpy.max(numpy.abs(self._avalia(x))))
+
+    def __getstate__(self):
+        # Modelos guardados não são enviados a outros processos.
+        estado = dict(self.__dict__)
+        estado.pop("_modelos", None)
+        return estado
+
+    def __repr__(self):
+        return "%s(fator de crista %.4g)" % (type(self).__name__,
+                                              self.fatorDeCrista())
+
+class FormaHarmonicas(FormaDeOnda):
+    """
+    Soma de harmônicas: lista de (ordem, amplitude, fase em rad), com
+    amplitudes em qualquer escala, ou dicionário {ordem: (amplitude,
+    fase)}. A ordem 0 é o valor médio (fase ignorada).
+    """
+    def __init__(self, harmonicas):
+        if isinstance(harmonicas, dict):
+            harmonicas = [(h, a, f) for h, (a, f) in harmonicas.items()]
+        self.harmonicas = tuple(sorted((int(h), float(a), float(f))
+                                       for h, a, f in harmonicas))
+        quadrados = sum(a**2 if h == 0 else a**2/2
+                        for h, a, f in self.harmonicas)
+        if quadrados <= 0:
+            raise ValueError("Forma de onda com valor eficaz nulo")
+        self._escala = 1/sqrt(quadrados)
+
+    def parametros(self):
+        return {"harmonicas": [list(h) for h in self.harmonicas]}
+
+    def _avalia(self, x):
+        i = numpy.zeros(numpy.shape(x))
+        for h, a, f in self.harmonicas:
+            i += a if h == 0 else a*numpy.sin(h*x + f)
+        i *= self._escala
+        return i
+
+class FormaAmostrada(FormaDeOnda):
+    """
+    Forma de onda dada por amostras de um período, interpoladas
+    linearmente. "angulos" (crescentes, 0 <= angulo < 2*pi) são os
+    ângulos das amostras; se omitidos, as amostras são igualmente
+    espaçadas a partir de 0.
+    """
+    def __init__(self, valores, angulos=None):
+        y = numpy.array(valores, dtype=float)
+        if angulos is None:
+            x = numpy.arange(len(y)) * 2*pi/len(y)
+        else:
+            x = numpy.array(angulos, dtype=float)
+            if len(x) != len(y) or numpy.any(numpy.diff(x) <= 0) or \
+               x[0] < 0 or x[-1] >= 2*pi:
+                raise ValueError("Ângulos das amostras devem ser crescentes"
+                                 " e estar entre 0 e 2*pi")
+        self.valores = y
+        self.angulos = x
+        # Período fechado com a primeira amostra, para interpolação.
+        self._x = numpy.append(x, x[0] + 2*pi)
+        self._y = numpy.append(y, y[0])
+        # Valor eficaz exato da interpolação linear.
+        y0, y1 = self._y[:-1], self._y[1:]
+        quadrados = numpy.sum((y0**2 + y0*y1 + y1**2)/3 *
+                              numpy.diff(self._x)) / (2*pi)
+        if quadrados <= 0:
+            raise ValueError("Forma de onda com valor eficaz nulo")
+        self._escala = 1/sqrt(quadrados)
+
+    def parametros(self):
+        return {"valores": self.valores.tolist(),
+                "angulos": self.angulos.tolist()}
+
+    def _avalia(self, x):
+        x = self._x[0] + numpy.mod(x - self._x[0], 2*pi)
+        return numpy.interp(x, self._x, self._y) * self._escala
+
+class FormaFatorDeCrista(FormaDeOnda):
+    """
+    Modelo paramétrico de corrente com fator de crista (pico/eficaz)
+    "fator": sinal(sen x)*|sen x|**n, com n ajustado para o fator de
+    crista. n = 1 é a senoide (raiz(2)); n > 1 gera pulsos estreitos,
+    como em cargas retificadoras, e n -> 0 tende à onda quadrada (1).
+    """
+    def __init__(self, fator):
+        if not fator >= 1:
+            raise ValueError("Fator de crista deve ser maior ou igual a 1")
+        self.fator = float(fator)
+        self.n = self.expoente(self.fator)
+        # Valor eficaz de |sen x|**n: raiz(Gama(n+1/2)/(raiz(pi)*Gama(n+1)))
+        self._escala = 1/self._eficaz(self.n)
+
+    @staticmethod
+    def _eficaz(n):
+        return exp((lgamma(n + 0.5) - lgamma(n + 1))/2) / pi**0.25
+
+    @classmethod
+    def expoente(cls, fator):
+        """Expoente n cujo fator de crista é "fator" (por bisseção)"""
+        if fator == 1:
+            return 0.0
+        a, b = 1e-9, 1e6
+        for _ in range(200):
+            m = sqrt(a*b)
+            if 1/cls._eficaz(m) < fator:
+                a = m
+            else:
+                b = m
+        return sqrt(a*b)
+
+    def parametros(self):
+        return {"fator_de_crista": self.fator}
+
+    def _avalia(self, x):
+        s = numpy.sin(x)
+        return numpy.sign(s) * numpy.abs(s)**self.n * self._escala
+
+    def passagens(self):
+        return [0.0, pi]
+
+    def fatorDeCrista(self):
+        return self.fator
+
+# Diferença relativa máxima para raiz(2) de um fator de crista numérico
+# tratado como senoide (valores digitados ou gravados com 12 dígitos).
+TOLERANCIA_SENOIDE = 1e-9
+
+# Modelos paramétricos dos fatores de crista numéricos usados por último
+# (ver formaDeOnda), no máximo TAMANHO_FORMAS.
+TAMANHO_FORMAS = 8
+_formasFatorDeCrista = collections.OrderedDict()
+
+def formaDeOnda(fatorDeCrista):
+    """
+    Retorna a FormaDeOnda dada por "fatorDeCrista" (ver
+    formaDeOndaCorrente), ou None para a senoide.
+    """
+    if isinstance(fatorDeCrista, FormaDeOnda):
+        return fatorDeCrista
+    if abs(fatorDeCrista - sqrt(2)) <= TOLERANCIA_SENOIDE*sqrt(2):
+        return None
+    # Reinsere o modelo para marcá-lo como usado mais recentemente.
+    forma = _formasFatorDeCrista.pop(fatorDeCrista, None)
+    if forma is None:
+        forma = FormaFatorDeCrista(fatorDeCrista)
+    _formasFatorDeCrista[fatorDeCrista] = forma
+    while len(_formasFatorDeCrista) > TAMANHO_FORMAS:
+        _formasFatorDeCrista.popitem(last=False)
+    return forma
+
+def passagensPorZero(defasamento, fatorDeCrista):
+    """
+    Ângulos em que a corrente com "defasamento" muda de sentido, entre
+    -2*pi e 4*pi (ver trechosCiclos).
+    """
+    forma = formaDeOnda(fatorDeCrista)
+    if forma is None:
+        return [m*pi - defasamento for m in range(-1, 4)]
+    return [z - defasamento + 2*pi*m for z in forma.passagens()
+            for m in (-1, 0, 1)]
+
+def parametrosForma(fatorDeCrista):
+    """
+    Parâmetros da forma de onda de "fatorDeCrista" (ver
+    formaDeOndaCorrente), usados na chave de caches e para guardar a
+    forma de onda em arquivos (ver formaDeParametros)
+    """
+    forma = formaDeOnda(fatorDeCrista)
+    if forma is None:
+        return {"senoide": True}
+    parametros = forma.parametros()
+    parametros["tipo"] = type(forma).__name__
+    return parametros
+
+def formaDeParametros(parametros):
+    """
+    Inverso de parametrosForma: retorna o fator de crista (número ou
+    FormaDeOnda) descrito por "parametros"
+    """
+    if parametros.get("senoide"):
+        return sqrt(2)
+    tipo = parametros.get("tipo")
+    if tipo == "FormaFatorDeCrista":
+        return parametros["fator_de_crista"]
+    if tipo == "FormaHarmonicas":
+        return FormaHarmonicas(parametros["harmonicas"])
+    if tipo == "FormaAmostrada":
+        return FormaAmostrada(parametros["valores"], parametros["angulos"])
+    raise ValueError("Forma de onda desconhecida: " + repr(tipo))
+
 ###########################################################################
 # TESTES DE VALIDAÇÃO DAS ENTRADAS                                        #
 ###########################################################################
-# V1 deve ser menor que V2
-validacao("V1 e V2", V1 < V2 )
-# Não se pode modular tensao maior que as somas das tensoes do barramento
-validacao("Ar", Ar <= (V1 + V2) )
-# Não se possui sete niveis se amplitude for menor que V2:
-validacao("Ar", Ar > V2 )
-# Não se pode modular se portadora tiver frequência menor que referencia
-validacao("fp", fp > fr )
-# Não se pode modular se portadora tiver frequência menor que referencia
-validacao("fp", fp > fr )
-
-# Defasamento Corrente 
-validacao("I_def", (-pi/2 <= I_def and I_def <= pi/2) )
-# Fator de Crista Padrão
+def testesEntradas(cfg):
+    """
+    Testes de validação das entradas da configuração "cfg". Retorna
+    lista de (nome da variável, resultado do teste). Os valores de "cfg"
+    podem ser vetores (ver calcular_lote); nesse caso cada resultado é
+    um vetor lógico, com um elemento por ponto.
+    """
+    return [
+        # V1 deve ser menor que V2
+        ("V1 e V2", cfg.V1 < cfg.V2 ),
+        # Não se pode modular tensao maior que as somas das tensoes do
+        # barramento
+        ("Ar", cfg.Ar <= (cfg.V1 + cfg.V2) ),
+        # Não se possui sete niveis se amplitude for menor que V2:
+        ("Ar", cfg.Ar > cfg.V2 ),
+        # Não se pode modular se portadora tiver frequência menor que
+        # referencia
+        ("fp", cfg.fp > cfg.fr ),
+        # Defasamento Corrente
+        ("I_def", (-pi/2 <= cfg.I_def) & (cfg.I_def <= pi/2) )]
+
+def validaEntradas(cfg, invalidas=None):
+    """
+    Aplica os testes de validação (testesEntradas) às entradas da
+    configuração "cfg". Retorna lista com o nome das variáveis fora de
+    limite (vazia se todas estiverem coerentes). Se "invalidas" não for
+    fornecida, também imprime os avisos.
+    """
+    imprimir = invalidas is None
+    lista = [] if imprimir else invalidas
+    for nome_variavel, logica_de_teste in testesEntradas(cfg):
+        if imprimir:
+            validacao(nome_variavel, logica_de_teste)
+        if logica_de_teste == False:
+            lista.append(nome_variavel)
+    return lista
+
+def entradasValidas(cfg):
+    """
+    Vetor lógico (ou valor, para configuração escalar) indicando os
+    pontos de "cfg" que passam em todos os testes de testesEntradas
+    """
+    return numpy.logical_and.reduce([teste for _, teste in
+                                     testesEntradas(cfg)])
+
+# Fator de Crista Padrão (raiz(2): corrente senoidal), usado quando a
+# configuração não define outro (ver Configuracao).
 fat_crista = sqrt(2)
- 
+
+###########################################################################
+# CONFIGURAÇÃO E RESULTADO DO CÁLCULO                                     #
+###########################################################################
+# Versão do cálculo. Deve ser alterada sempre que uma mudança no código
+# alterar os resultados, para invalidar resultados guardados em cache.
+VERSAO_MOTOR = "2"
+
+# Nomes das chaves e diodos, na ordem em que são apresentados.
+DISPOSITIVOS = ("S1Q", "S1D", "S2Q", "S2D", "S3Q", "S3D", "S4Q", "S4D",
+                "S5pQ", "S5pDp", "S5pDn", "S6pQ", "S6pDp", "S6pDn",
+                "S5sQp", "S5sQn", "S5sDp", "S5sDn",
+                "S6sQp", "S6sQn", "S6sDp", "S6sDn")
+
+# Índice de cada chave e diodo nas linhas das matrizes de perdas e
+# correntes (ex.: perdas[S3Q] é o vetor de perdas da chave S3).
+S1Q, S1D, S2Q, S2D, S3Q, S3D, S4Q, S4D, \
+    S5pQ, S5pDp, S5pDn, S6pQ, S6pDp, S6pDn, \
+    S5sQp, S5sQn, S5sDp, S5sDn, \
+    S6sQp, S6sQn, S6sDp, S6sDn = range(len(DISPOSITIVOS))
+
+# Entradas numéricas da configuração (todas exceto a forma de onda).
+ENTRADAS = ("V1", "V2", "Ar", "Ief", "I_def", "fr", "fp")
+
+class Configuracao(object):
+    """
+    Ponto de operação a ser calculado. Valores não fornecidos assumem os
+    definidos pelo usuário no início do arquivo; "Ar" assume V1 + V2.
+    "fat_crista" define a forma de onda da corrente: um número (fator de
+    crista, raiz(2) para a senoide) ou uma FormaDeOnda (FormaHarmonicas,
+    FormaAmostrada ou FormaFatorDeCrista); ver formaDeOndaCorrente.
+    """
+    __slots__ = ENTRADAS + ("fat_crista",)
+
+    def __init__(self, V1=V1, V2=V2, Ar=None, Ief=Ief, I_def=I_def,
+                 fr=fr, fp=fp, fat_crista=fat_crista):
+        self.V1 = V1
+        self.V2 = V2
+        self.Ar = V1 + V2 if Ar is None else Ar
+        self.Ief = Ief
+        self.I_def = I_def
+        self.fr = fr
+        self.fp = fp
+        self.fat_crista = fat_crista
+
+    def substitui(self, **valores):
+        """Retorna cópia da configuração com os valores fornecidos"""
+        atual = dict((nome, getattr(self, nome)) for nome in self.__slots__)
+        atual.update(valores)
+        return Configuracao(**atual)
+
+    def __repr__(self):
+        return "Configuracao(" + ", ".join(
+            nome + "=" + repr(getattr(self, nome)) for nome in self.__slots__
+        ) + ")"
+
+class Resultado(object):
+    """
+    Resumo do cálculo de um ponto de operação. Os valores por
+    dispositivo são indexados pelos itens da tabela de estados usada
+    (TabelaEstados.dispositivos; DISPOSITIVOS na tabela padrão).
+    perdas    : perda (J por ciclo da referência) de cada item
+    correntes : corrente média (A) de cada item
+    correntes_rms : valor eficaz (A) das correntes médias por ciclo de
+                cada item
+    tt0..tt8  : ângulos reais (arredondados) de mudança de estado, em rad
+    chA..chF  : número de ciclos de chaveamento em cada intervalo
+    erro_estimado : no modo "analitico", estimativa do erro (J) da perda
+                de cada item em relação à soma por ciclo
+                (ver calculaAnalitico); None no modo "ciclos"
+    """
+    __slots__ = ("config", "avisos", "perdas", "correntes", "ma", "mf",
+                 "tt0", "tt1", "tt2", "tt3", "tt4", "tt5", "tt6", "tt7",
+                 "tt8", "chA", "chB", "chC", "chD", "chE", "chF",
+                 "potencia_saida", "perdasW_bidir_ponte",
+                 "perdasW_bidir_2ch", "rend_ponte", "rend_2ch",
+                 "erro_estimado", "correntes_rms")
+
+    def __init__(self, **valores):
+        for nome in self.__slots__:
+            setattr(self, nome, valores[nome])
+
+    def __repr__(self):
+        return ("Resultado(rend_ponte=%.4f %%, rend_2ch=%.4f %%, "
+                "ma=%s, mf=%s)" % (self.rend_ponte, self.rend_2ch,
+                                   self.ma, self.mf))
+
+###########################################################################
+# TABELA DE ESTADOS DAS CHAVES                                            #
+# Para cada intervalo e sentido da corrente ("+" ou "-"), o tempo ativo   #
+# de cada chave e diodo em condução ("1", "d" ou "1-d") e, com o sufixo   #
+# "+s", a ocorrência de comutação. Itens ausentes não conduzem.           #
+###########################################################################
+ESTADOS_7NIVEIS = {
+    "A+": {"S3Q":  "1",     "S4D":   "1-d+s",
+           "S5pQ": "d+s",   "S5pDp": "d+s",
+           "S5sQp": "d+s",  "S5sDp": "d+s"},
+    "A-": {"S3D":  "1",     "S4Q":   "1-d+s",
+           "S5pQ": "d+s",   "S5pDn": "d+s",
+           "S5sQn": "d+s",  "S5sDn": "d+s"},
+    "B+": {"S1Q":  "d+s",   "S3Q":   "1-d+s",
+           "S5pQ": "1-d+s", "S5pDp": "1-d+s",
+           "S6pQ": "d+s",   "S6pDp": "d+s",
+           "S5sQp": "1-d+s", "S5sDp": "1-d+s",
+           "S6sQp": "d+s",   "S6sDp": "d+s"},
+    "B-": {"S1D":  "d+s",   "S3D":   "1-d+s",
+           "S5pQ": "1-d+s", "S5pDn": "1-d+s",
+           "S6pQ": "d+s",   "S6pDn": "d+s",
+           "S5sQn": "1-d+s", "S5sDn": "1-d+s",
+           "S6sQn": "d+s",   "S6sDn": "d+s"},
+    "C+": {"S1Q":  "1",     "S3Q":   "d+s",
+           "S6pQ": "1-d+s", "S6pDp": "1-d+s",
+           "S6sQp": "1-d+s", "S6sDp": "1-d+s"},
+    "C-": {"S1D":  "1",     "S3D":   "d+s",
+           "S6pQ": "1-d+s", "S6pDn": "1-d+s",
+           "S6sQn": "1-d+s", "S6sDn": "1-d+s"},
+    "D+": {"S3Q":  "d+s",   "S4D":   "1",
+           "S6pQ": "1-d+s", "S6pDp": "1-d+s",
+           "S6sQp": "1-d+s", "S6sDp": "1-d+s"},
+    "D-": {"S3D":  "d+s",   "S4Q":   "1",
+           "S6pQ": "1-d+s", "S6pDn": "1-d+s",
+           "S6sQn": "1-d+s", "S6sDn": "1-d+s"},
+    "E+": {"S2D":  "1-d+s", "S4D":   "d+s",
+           "S5pQ": "1-d+s", "S5pDp": "1-d+s",
+           "S6pQ": "d+s",   "S6pDp": "d+s",
+           "S5sQp": "1-d+s", "S5sDp": "1-d+s",
+           "S6sQp": "d+s",   "S6sDp": "d+s"},
+    "E-": {"S2Q":  "1-d+s", "S4Q":   "d+s",
+           "S5pQ": "1-d+s", "S5pDn": "1-d+s",
+           "S6pQ": "d+s",   "S6pDn": "d+s",
+           "S5sQn": "1-d+s", "S5sDn": "1-d+s",
+           "S6sQn": "d+s",   "S6sDn": "d+s"},
+    "F+": {"S2D":  "1",     "S4D":   "1-d+s",
+           "S5pQ": "d+s",   "S5pDp": "d+s",
+           "S5sQp": "d+s",  "S5sDp": "d+s"},
+    "F-": {"S2Q":  "1",     "S4Q":   "1-d+s",
+           "S5pQ": "d+s",   "S5pDn": "d+s",
+           "S5sQn": "d+s",  "S5sDn": "d+s"},
+}
+
+# Curva de perda usada por cada item: "Q" (chave), "D" (diodo em
+# paralelo ou em anti-série) ou "DP" (diodo da ponte).
+TIPOS_PERDA = ("Q", "D", "DP")
+TIPOS_7NIVEIS = {"S1Q": "Q",  "S1D": "D",  "S2Q": "Q",  "S2D": "D",
+                 "S3Q": "Q",  "S3D": "D",  "S4Q": "Q",  "S4D": "D",
+                 "S5pQ": "Q", "S5pDp": "DP", "S5pDn": "DP",
+                 "S6pQ": "Q", "S6pDp": "DP", "S6pDn": "DP",
+                 "S5sQp": "Q", "S5sQn": "Q", "S5sDp": "D", "S5sDn": "D",
+                 "S6sQp": "Q", "S6sQn": "Q", "S6sDp": "D", "S6sDn": "D"}
+
+class TabelaEstados(object):
+    """
+    Tabela de estados compilada em matrizes, com uma linha por chave ou
+    diodo e uma coluna por estado (intervalo e sentido da corrente).
+    O tempo ativo é guardado como constante + coeficiente*d, e a
+    comutação como 0 ou 1, de forma que todos os ciclos são calculados
+    com indexação e multiplicações, sem desvios.
+    """
+    def __init__(self, estados, tipos, dispositivos=DISPOSITIVOS):
+        self.dispositivos = tuple(dispositivos)
+        self.intervalos = tuple(sorted(set(e[:-1] for e in estados)))
+        linha = dict((nome, k) for k, nome in enumerate(self.dispositivos))
+        n = (len(self.dispositivos), 2*len(self.intervalos))
+        self.constante = numpy.zeros(n)
+        self.coef_d    = numpy.zeros(n)
+        self.comuta    = numpy.zeros(n)
+        for chave, ativos in estados.items():
+            coluna = self.coluna(chave[:-1], chave[-1] == "+")
+            for nome, texto in ativos.items():
+                tempo, _, comuta = texto.partition("+")
+                if tempo not in ("1", "d", "1-d") or comuta not in ("", "s"):
+                    raise ValueError("Estado inválido para " + nome + " em " +
+                                     chave + ": " + texto)
+                self.constante[linha[nome], coluna] = tempo != "d"
+                self.coef_d[linha[nome], coluna] = \
+                    {"1": 0, "d": 1, "1-d": -1}[tempo]
+                self.comuta[linha[nome], coluna] = comuta == "s"
+        self.tipo = numpy.array([TIPOS_PERDA.index(tipos[nome])
+                                 for nome in self.dispositivos])
+
+    @classmethod
+    def deJSON(cls, caminho):
+        """
+        Lê tabela de arquivo JSON com as chaves "estados" (no formato de
+        ESTADOS_7NIVEIS), "tipos" e, opcionalmente, "dispositivos".
+        """
+        with open(caminho) as arquivo:
+            dados = json.load(arquivo)
+        return cls(dados["estados"], dados["tipos"],
+                   dados.get("dispositivos", DISPOSITIVOS))
+
+    def semComutacao(self):
+        """
+        Retorna cópia da tabela sem perdas de comutação, usada para
+        separar as parcelas de condução e de chaveamento das perdas.
+        """
+        copia = copy.copy(self)
+        copia.comuta = numpy.zeros_like(self.comuta)
+        return copia
+
+    def coluna(self, intervalo, i_positivo):
+        """Coluna do estado (intervalo, sentido da corrente)"""
+        return 2*self.intervalos.index(intervalo) + (0 if i_positivo else 1)
+
+    def estado(self, intervalo, i_positivo):
+        """
+        Retorna vetor com a coluna de estado de cada ciclo, dados os
+        vetores de intervalo e de sentido da corrente.
+        """
+        rotulos = numpy.array(self.intervalos)
+        codigo = numpy.searchsorted(rotulos, intervalo)
+        return 2*codigo + ~numpy.asarray(i_positivo)
+
+    def aplica(self, estado, d, iabs, conducao, comutacao):
+        """
+        Retorna (perdas, correntes médias), matrizes com uma linha por
+        chave ou diodo e uma coluna por ciclo. "conducao" e "comutacao"
+        trazem as perdas de cada ciclo para cada tipo de TIPOS_PERDA.
+        """
+        ativo = self.tempoAtivo(estado, d)
+        imed = ativo * iabs
+        # O vetor de tempo ativo não é mais usado e recebe as perdas.
+        return self.perdas(estado, ativo, conducao, comutacao, ativo), imed
+
+    def tempoAtivo(self, estado, d):
+        """
+        Retorna matriz com a fração do ciclo em que cada chave ou diodo
+        conduz: constante + coeficiente*d.
+        """
+        ativo = numpy.take(self.coef_d, estado, axis=1)
+        ativo *= d
+        ativo += numpy.take(self.constante, estado, axis=1)
+        return ativo
+
+    def perdas(self, estado, ativo, conducao, comutacao, saida=None):
+        """
+        Retorna matriz de perdas a partir do tempo ativo (ver tempoAtivo):
+        perda de condução*tempo ativo + perda de comutação. Se fornecida,
+        "saida" (que pode ser o próprio "ativo") recebe o resultado.
+        """
+        perdas = numpy.multiply(ativo, numpy.take(conducao, self.tipo,
+                                                  axis=0), out=saida)
+        perdas += numpy.take(self.comuta, estado, axis=1) * \
+                  numpy.take(comutacao, self.tipo, axis=0)
+        return perdas
+
+TABELA_7NIVEIS = TabelaEstados(ESTADOS_7NIVEIS, TIPOS_7NIVEIS)
+
 ###########################################################################
 # CALCULO DE PARAMETROS DE CHAVEAMENTO                                    #
 ###########################################################################
-# Amplitude da portadora
-Ap = V1
-# Número de portadoras
-np = 6
-# Índice de Modulação de Amplitude
-# ma = Ar / (V1 + V2) ou formalmente:
-ma = 2*Ar/(np*Ap)
-
-# Índice de Modulação de Frequência
-mf = fp/fr
-
-# Ângulos teóricos de mudança de estado
-theta0  =   0
-theta1  =   asin( V1/Ar )
-theta2  =   asin( V2/Ar )
-theta3  =   pi - theta2 
-theta4  =   pi - theta1
-theta5  =   pi + theta1
-theta6  =   pi + theta2
-theta7  = 2*pi - theta2 
-theta8  = 2*pi - theta1
-
-# Ângulos reais de mudança de estado
-tt0 = arredondaAngulo(theta0)
-tt1 = arredondaAngulo(theta1)
-tt2 = arredondaAngulo(theta2)
-tt3 = arredondaAngulo(theta3)
-tt4 = arredondaAngulo(theta4)
-tt5 = arredondaAngulo(theta5)
-tt6 = arredondaAngulo(theta6)
-tt7 = arredondaAngulo(theta7)
-tt8 = arredondaAngulo(theta8)
-pi1 = arredondaAngulo(pi)
-pi2 = arredondaAngulo(2*pi)
-
-#número de chaveamentos em cada intervalo
-chA = mf * ((tt1 - tt0) + (pi1 - tt4)) / (2*pi) 
-chB = mf * ((tt2 - tt1) + (tt4 - tt3)) / (2*pi) 
-chC = mf * ((tt3 - tt2)              ) / (2*pi) 
-chD = mf * ((tt5 - pi1) + (pi2 - tt8)) / (2*pi) 
-chE = mf * ((tt6 - tt5) + (tt8 - tt7)) / (2*pi)
-chF = mf * ((tt7 - tt6)              ) / (2*pi)
-
-# Vetores para armazenar dados calculados em cada ciclo de chaveamento.
-RAZAOCICLICA = []
-CORRENTE     = []
-TENSAOREF    = []
-POTENCIAINST = []
-
-#Variáveis para salvar as perdas em cada chave e diodo
-perda_S1Q = [] # Perda da Chave S1
-perda_S1D = [] # Perda do Diodo em paralelo com a chave S1
-perda_S2Q = [] # Perda da Chave S2
-perda_S2D = [] # Perda do Diodo em paralelo com a chave S2
-perda_S3Q = [] # Perda da Chave S3
-perda_S3D = [] # Perda do Diodo em paralelo com a chave S3
-perda_S4Q = [] # Perda da Chave S4
-perda_S4D = [] # Perda do Diodo em paralelo com a chave S4
-
-perda_S5pQ  = [] # Perda da Chave S5 (Chave bidirecional em ponte de diodo)
-perda_S5pDp = [] # Perda do Diodo da Ponte em S5 (conduz com i_positivo)
-perda_S5pDn = [] # Perda do Diodo da Ponte em S5 (conduz com i_negativo)
- 
-perda_S6pQ  = [] # Perda da Chave S6 (Chave bidirecional em ponte de diodo)
-perda_S6pDp = [] # Perda do Diodo da Ponte em S6 (conduz com i_positivo)
-perda_S6pDn = [] # Perda do Diodo da Ponte em S6 (conduz com i_negativo)
-
-perda_S5sQp = [] # Perda da Chave S5 (Chave bidirecional em série p/ i+)
-perda_S5sQn = [] # Perda da Chave S5 (Chave bidirecional em série p/ i-)
-perda_S5sDp = [] # Perda do Diodo em S5 (Chave bidir. em série p/ i+)
-perda_S5sDn = [] # Perda do Diodo em S5 (Chave bidir. em série p/ i-)
-
-perda_S6sQp = [] # Perda da Chave S6 (Chave bidirecional em série p/ i+)
-perda_S6sQn = [] # Perda da Chave S6 (Chave bidirecional em série p/ i-)
-perda_S6sDp = [] # Perda do Diodo em S6 (Chave bidir. em série p/ i+)
-perda_S6sDn = [] # Perda do Diodo em S6 (Chave bidir. em série p/ i-)
-
-i_S1Q = [] # Corrente na Chave S1
-i_S1D = [] # Corrente no Diodo em paralelo com a chave S1
-i_S2Q = [] # Corrente na Chave S2
-i_S2D = [] # Corrente no Diodo em paralelo com a chave S2
-i_S3Q = [] # Corrente na Chave S3
-i_S3D = [] # Corrente no Diodo em paralelo com a chave S3
-i_S4Q = [] # Corrente na Chave S4
-i_S4D = [] # Corrente no Diodo em paralelo com a chave S4
-
-i_S5pQ  = [] # Corrente na Chave S5 (Chave bidirecional em ponte de diodo)
-i_S5pDp = [] # Corrente no Diodo da Ponte em S5 (conduz com i_positivo)
-i_S5pDn = [] # Corrente no Diodo da Ponte em S5 (conduz com i_negativo)
-
-i_S6pQ  = [] # Corrente na Chave S6 (Chave bidirecional em ponte de diodo)
-i_S6pDp = [] # Corrente no Diodo da Ponte em S6 (conduz com i_positivo)
-i_S6pDn = [] # Corrente no Diodo da Ponte em S6 (conduz com i_negativo)
-
-i_S5sQp = [] # Corrente na Chave S5 (Chave bidirecional em série p/ i+)
-i_S5sQn = [] # Corrente na Chave S5 (Chave bidirecional em série p/ i-)
-i_S5sDp = [] # Corrente no Diodo em S5 (Chave bidir. em série p/ i+)
-i_S5sDn = [] # Corrente no Diodo em S5 (Chave bidir. em série p/ i-)
-
-i_S6sQp = [] # Corrente na Chave S6 (Chave bidirecional em série p/ i+)
-i_S6sQn = [] # Corrente na Chave S6 (Chave bidirecional em série p/ i-)
-i_S6sDp = [] # Corrente no Diodo em S6 (Chave bidir. em série p/ i+)
-i_S6sDn = [] # Corrente no Diodo em S6 (Chave bidir. em série p/ i-)
-
-# Temos "mf" ciclos de chaveamento durante um ciclo do sinal de referencia
-# Para cada ciclo de chaveamento, será calculado o ângulo do chaveamento,
-# a tensão de referencia, a corrente resultante e as perdas em cada chave
-# e diodo.
-for k in range(int(mf)): # loop de k variando de 0,1,2 ... "mf"
-    # Calculo do Ângulo em que se inicia este ciclo de chaveamento
+class Geometria(object):
+    """
+    Parâmetros de modulação de uma configuração: índices de modulação,
+    ângulos teóricos (theta) e reais (tt) de mudança de estado e número
+    de ciclos de chaveamento em cada intervalo.
+    """
+    def __init__(self, cfg):
+        V1, V2, Ar = cfg.V1, cfg.V2, cfg.Ar
+        # Amplitude da portadora
+        Ap = V1
+        # Número de portadoras
+        np = 6
+        # Índice de Modulação de Amplitude
+        # ma = Ar / (V1 + V2) ou formalmente:
+        self.ma = 2*Ar/(np*Ap)
+
+        # Índice de Modulação de Frequência
+        self.mf = mf = cfg.fp/cfg.fr
+
+        # Ângulos teóricos de mudança de estado
+        theta0  =   0
+        theta1  =   asin( V1/Ar )
+        theta2  =   asin( V2/Ar )
+        theta3  =   pi - theta2
+        theta4  =   pi - theta1
+        theta5  =   pi + theta1
+        theta6  =   pi + theta2
+        theta7  = 2*pi - theta2
+        theta8  = 2*pi - theta1
+        self.theta = (theta0, theta1, theta2, theta3, theta4,
+                      theta5, theta6, theta7, theta8)
+
+        # Ângulos reais de mudança de estado
+        self.tt = tuple(arredondaAngulo(t, mf) for t in self.theta)
+        tt0, tt1, tt2, tt3, tt4, tt5, tt6, tt7, tt8 = self.tt
+        self.pi1 = pi1 = arredondaAngulo(pi, mf)
+        self.pi2 = pi2 = arredondaAngulo(2*pi, mf)
+
+        #número de chaveamentos em cada intervalo
+        chA = mf * ((tt1 - tt0) + (pi1 - tt4)) / (2*pi)
+        chB = mf * ((tt2 - tt1) + (tt4 - tt3)) / (2*pi)
+        chC = mf * ((tt3 - tt2)              ) / (2*pi)
+        chD = mf * ((tt5 - pi1) + (pi2 - tt8)) / (2*pi)
+        chE = mf * ((tt6 - tt5) + (tt8 - tt7)) / (2*pi)
+        chF = mf * ((tt7 - tt6)              ) / (2*pi)
+        self.ch = (chA, chB, chC, chD, chE, chF)
+
+###########################################################################
+# CALCULO DAS PERDAS EM CADA CICLO DE CHAVEAMENTO                         #
+###########################################################################
+def angulosCiclos(mf):
+    """
+    Retorna vetor com o ângulo no meio de cada um dos "mf" ciclos de
+    chaveamento de um ciclo da referência.
+    """
+    # Temos "mf" ciclos de chaveamento durante um ciclo do sinal de
+    # referencia. Todos os ciclos são calculados de uma só vez, em
+    # vetores, onde a posição k corresponde ao k-ésimo ciclo.
+    k = numpy.arange(int(mf)) # k variando de 0,1,2 ... "mf"
+
+    # Calculo do Ângulo em que se inicia cada ciclo de chaveamento
     angulo = 2*pi * (k/int(mf))
     #Adicão de meio ciclo para calcular valores médios do chaveamento
     angulo += 2*pi * 1/(2*mf)
-    
-    # Valor instantâneo da tensão de referência neste ângulo.
-    vref = Ar*sin(angulo)
-    
-    # Valor instantâneo da corrente neste ângulo.
-    i = Ief * formaDeOndaCorrente(angulo,I_def,fat_crista)
-
-    # Determinação do intervalo de chaveamento referido
-    if(angulo <= theta1):
-        intervalo = "A"
-    elif(angulo <= theta2):
-        intervalo = "B"
-    elif(angulo <= theta3):
-        intervalo = "C"
-    elif(angulo <= theta4):
-        intervalo = "B"    
-    elif(angulo <= pi):
-        intervalo = "A"  
-    elif(angulo <= theta5):
-        intervalo = "D" 
-    elif(angulo <= theta6):
-        intervalo = "E"      
-    elif(angulo <= theta7):
-        intervalo = "F" 
-    elif(angulo <= theta8):
-        intervalo = "E"
-    else: # angulo <= 2*pi:
-        intervalo = "D"
+    return angulo
+
+def classificaIntervalo(angulo, theta):
+    """
+    Retorna o intervalo ("A" a "F") de cada ângulo do vetor "angulo",
+    dados os ângulos teóricos de mudança de estado "theta".
+    """
+    theta0, theta1, theta2, theta3, theta4, \
+        theta5, theta6, theta7, theta8 = theta
+    # A primeira condição verdadeira define o intervalo, como em uma
+    # sequência de "elif".
+    return numpy.select([angulo <= theta1,
+                         angulo <= theta2,
+                         angulo <= theta3,
+                         angulo <= theta4,
+                         angulo <= pi,
+                         angulo <= theta5,
+                         angulo <= theta6,
+                         angulo <= theta7,
+                         angulo <= theta8],
+                        ["A", "B", "C", "B", "A", "D", "E", "F", "E"],
+                        "D") # angulo <= 2*pi
+
+def calculaCiclos(cfg, geo=None, tabela=None, modelo=None):
+    """
+    Calcula, para todos os "mf" ciclos de chaveamento de um ciclo da
+    referência, o ângulo, a tensão de referência, a corrente, a razão
+    cíclica e as perdas e correntes médias em cada chave e diodo.
+    Retorna dicionário de vetores; "perdas" e "correntes" são matrizes
+    com uma linha por item da tabela (na tabela padrão, ver índices
+    S1Q ... S6sDn) e uma coluna por ciclo.
+    """
+    if geo is None:
+        geo = Geometria(cfg)
+    angulo = angulosCiclos(geo.mf)
+    intervalo = classificaIntervalo(angulo, geo.theta)
+    return calculaPontos(cfg, angulo, intervalo, tabela=tabela,
+                         modelo=modelo)
+
+def modulacao(cfg, angulo, intervalo):
+    """
+    Estágio de modulação: retorna (tensão de referência, razão cíclica,
+    tensão de bloqueio) nos ângulos do vetor "angulo", cujos intervalos
+    são dados por "intervalo". Depende apenas de V1, V2 e Ar.
+    """
+    V1, V2, Ar = cfg.V1, cfg.V2, cfg.Ar
+
+    # Valor instantâneo da tensão de referência em cada ângulo.
+    vref = Ar*numpy.sin(angulo)
+
+    A = (intervalo == "A")
+    B = (intervalo == "B")
+    C = (intervalo == "C")
+    D = (intervalo == "D")
+    E = (intervalo == "E")
+    F = (intervalo == "F")
 
     # Cálculo da razão cíclica em função do intervalo.
-    if intervalo == "A":
-        d = vref/V1
-        vblock = V1
-    elif intervalo == "B":
-        d = (vref-V1)/(V2-V1)  
-        vblock = V2    
-    elif intervalo == "C":
-        d = (vref-V2)/(V1) 
-        vblock = V1+V2           
-    elif intervalo == "D":
-        d = 1-(-vref)/V1 
-        vblock = V1         
-    elif intervalo == "E":
-        d = 1-(-vref-V1)/(V2-V1) 
-        vblock = V2               
-    elif intervalo == "F":
-        d = 1-(-vref-V2)/(V1)
-        vblock = V1+V2          
+    d = numpy.select([A, B, C, D, E, F],
+                     [vref/V1,
+                      (vref-V1)/(V2-V1),
+                      (vref-V2)/(V1),
+                      1-(-vref)/V1,
+                      1-(-vref-V1)/(V2-V1),
+                      1-(-vref-V2)/(V1)])
+    vblock = numpy.select([A | D, B | E, C | F], [V1, V2, V1+V2])
+    return vref, d, vblock
+
+def corrente(cfg, angulo):
+    """
+    Estágio de corrente: retorna o valor instantâneo da corrente nos
+    ângulos do vetor "angulo". Depende apenas de Ief, I_def e
+    fat_crista.
+    """
+    return cfg.Ief * formaDeOndaCorrente(angulo,cfg.I_def,cfg.fat_crista)
 
-    
+def perdasDispositivos(iabs, vblock, fp, modelo=None):
+    """
+    Estágio de perdas dos componentes: retorna (condução, comutação),
+    matrizes com as perdas (J) de cada ciclo para cada tipo de
+    TIPOS_PERDA, dados o módulo da corrente e a tensão de bloqueio.
+    Sem "modelo", usa as funções de perda definidas pelo usuário (ver
+    perdaConducaoQ ...); caso contrário, modelo.perdas (ver
+    ModeloPerdas).
+    """
+    if modelo is not None:
+        return modelo.perdas(iabs, vblock, fp)
     # Calculo da Perda de condução e de chaveamento em função da corrente.
     # A perda será somada posteriormente às chaves em condução/comutação.
+    perda_Qs  = perdaChaveamentoQ(iabs)
+    perda_Qc  = perdaConducaoQ(iabs,fp)
+    perda_Ds  = perdaChaveamentoD(iabs,vblock)
+    perda_Dc  = perdaConducaoD(iabs,fp)
+    perda_DPs = perdaChaveamentoDPonte(iabs,vblock)
+    perda_DPc = perdaConducaoDPonte(iabs,fp)
+    return (numpy.array([perda_Qc, perda_Dc, perda_DPc]),
+            numpy.array([perda_Qs, perda_Ds, perda_DPs]))
+
+def calculaPontos(cfg, angulo, intervalo, i_positivo=None, tabela=None,
+                  modelo=None):
+    """
+    Calcula tensão de referência, corrente, razão cíclica e perdas e
+    correntes médias em cada chave e diodo nos ângulos do vetor "angulo",
+    cujos intervalos são dados por "intervalo". O sentido da corrente
+    pode ser imposto por "i_positivo"; se omitido, é o sinal da corrente
+    em cada ângulo. "tabela" é a TabelaEstados usada (padrão:
+    TABELA_7NIVEIS) e "modelo" o ModeloPerdas (padrão: funções de perda
+    do usuário). Retorna dicionário no formato de calculaCiclos.
+    """
+    vref, d, vblock = modulacao(cfg, angulo, intervalo)
+    i = corrente(cfg, angulo)
     iabs = abs(i)
-    perda_Qs  = perdaChaveamentoQ(iabs) 
-    perda_Qc  = perdaConducaoQ(iabs)
-    perda_Ds  = perdaChaveamentoD(iabs,abs(vblock)) 
-    perda_Dc  = perdaConducaoD(iabs)
-    perda_DPs = perdaChaveamentoDPonte(iabs,abs(vblock))
-    perda_DPc = perdaConducaoDPonte(iabs)
+    conducao, comutacao = perdasDispositivos(iabs, abs(vblock), cfg.fp,
+                                             modelo)
 
     # Determinação do Sentido da Corrente
-    i_positivo = (i >= 0)    
-
-    # As perdas calculadas são adicionadas às chaves de acordo com o estado
-    # de cada chave no intervalo.
-    # i) Perda de condução às chaves em função do tempo ativo (1, d ou 1-d)
-    # ii) Perda de comutação às chaves que comutaram neste intervalo.
-    # iii) Avaliação da adição das perdas à chave ou ao diodo em função do
-    #      sentido da corrente.
-    if intervalo == "A" and i_positivo:
-        perda_S3Q.append(perda_Qc *( 1 ))
-        perda_S4D.append(perda_Dc *(1-d) + perda_Ds)
-        perda_S5pQ.append(perda_Qc *( d ) + perda_Qs)
-        perda_S5pDp.append(perda_DPc*( d ) + perda_DPs)
-        
-        perda_S5sQp.append(perda_Qc*( d ) + perda_Qs)
-        perda_S5sDp.append(perda_Dc*( d ) + perda_Ds)
-        
-    elif intervalo == "A" and not i_positivo:
-        perda_S3D.append(perda_Dc *( 1 ))
-        perda_S4Q.append(perda_Qc *(1-d) + perda_Qs)
-        perda_S5pQ.append(perda_Qc *( d ) + perda_Qs)
-        perda_S5pDn.append(perda_DPc*( d ) + perda_DPs)
-        
-        perda_S5sQn.append(perda_Qc*( d ) + perda_Qs)
-        perda_S5sDn.append(perda_Dc*( d ) + perda_Ds)
-        
-    elif intervalo == "B" and i_positivo:
-        perda_S1Q.append(perda_Qc *( d ) + perda_Qs)
-        perda_S3Q.append(perda_Qc *(1-d) + perda_Qs)
-        perda_S5pQ.append(perda_Qc *(1-d) + perda_Qs)
-        perda_S5pDp.append(perda_DPc*(1-d) + perda_DPs)
-        perda_S6pQ.append(perda_Qc *( d ) + perda_Qs)
-        perda_S6pDp.append(perda_DPc*( d ) + perda_DPs)
-		
-        perda_S5sQp.append(perda_Qc*(1-d) + perda_Qs)
-        perda_S5sDp.append(perda_Dc*(1-d) + perda_Ds)
-        perda_S6sQp.append(perda_Qc*( d ) + perda_Qs)
-        perda_S6sDp.append(perda_Dc*( d ) + perda_Ds)
-		
-    elif intervalo == "B" and not i_positivo:
-        perda_S1D.append(perda_Dc *( d ) + perda_Ds)
-        perda_S3D.append(perda_Dc *(1-d) + perda_Ds)
-        perda_S5pQ.append(perda_Qc *(1-d) + perda_Qs)
-        perda_S5pDn.append(perda_DPc*(1-d) + perda_DPs)
-        perda_S6pQ.append(perda_Qc *( d ) + perda_Qs)
-        perda_S6pDn.append(perda_DPc*( d ) + perda_DPs)
-		
-        perda_S5sQn.append(perda_Qc*(1-d) + perda_Qs)
-        perda_S5sDn.append(perda_Dc*(1-d) + perda_Ds)
-        perda_S6sQn.append(perda_Qc*( d ) + perda_Qs)
-        perda_S6sDn.append(perda_Dc*( d ) + perda_Ds)
-        
-    elif intervalo == "C" and i_positivo:
-        perda_S1Q.append(perda_Qc *( 1 ))
-        perda_S3Q.append(perda_Qc *( d ) + perda_Qs)
-        perda_S6pQ.append(perda_Qc *(1-d) + perda_Qs)
-        perda_S6pDp.append(perda_DPc*(1-d) + perda_DPs)
-		
-        perda_S6sQp.append(perda_Qc*(1-d) + perda_Qs)
-        perda_S6sDp.append(perda_Dc*(1-d) + perda_Ds)
-        
-    elif intervalo == "C" and not i_positivo:
-        perda_S1D.append(perda_Dc *( 1 ))
-        perda_S3D.append(perda_Dc *( d ) + perda_Ds)
-        perda_S6pQ.append(perda_Qc *(1-d) + perda_Qs)
-        perda_S6pDn.append(perda_DPc*(1-d) + perda_DPs)
-		
-        perda_S6sQn.append(perda_Qc*(1-d) + perda_Qs)
-        perda_S6sDn.append(perda_Dc*(1-d) + perda_Ds)
-        
-    elif intervalo == "D" and i_positivo:
-        perda_S3Q.append(perda_Qc *( d ) + perda_Qs)
-        perda_S4D.append(perda_Dc *( 1 ))
-        perda_S6pQ.append(perda_Qc *(1-d) + perda_Qs)
-        perda_S6pDp.append(perda_DPc*(1-d) + perda_DPs)
-		
-        perda_S6sQp.append(perda_Qc*(1-d) + perda_Qs)
-        perda_S6sDp.append(perda_Dc*(1-d) + perda_Ds)
-        
-    elif intervalo == "D" and not i_positivo:
-        perda_S3D.append(perda_Dc *( d ) + perda_Ds)
-        perda_S4Q.append(perda_Qc *( 1 ))
-        perda_S6pQ.append(perda_Qc *(1-d) + perda_Qs)
-        perda_S6pDn.append(perda_DPc*(1-d) + perda_DPs)
-		
-        perda_S6sQn.append(perda_Qc*(1-d) + perda_Qs)
-        perda_S6sDn.append(perda_Dc*(1-d) + perda_Ds)
-        
-    elif intervalo == "E" and i_positivo:
-        perda_S2D.append(perda_Dc *(1-d) + perda_Ds)
-        perda_S4D.append(perda_Dc *( d ) + perda_Ds)
-        perda_S5pQ.append(perda_Qc *(1-d) + perda_Qs)
-        perda_S5pDp.append(perda_DPc*(1-d) + perda_DPs)
-        perda_S6pQ.append(perda_Qc *( d ) + perda_Qs)
-        perda_S6pDp.append(perda_DPc*( d ) + perda_DPs)
-		
-        perda_S5sQp.append(perda_Qc*(1-d) + perda_Qs)
-        perda_S5sDp.append(perda_Dc*(1-d) + perda_Ds)
-        perda_S6sQp.append(perda_Qc*( d ) + perda_Qs)
-        perda_S6sDp.append(perda_Dc*( d ) + perda_Ds)
-        
-    elif intervalo == "E" and not i_positivo:
-        perda_S2Q.append(perda_Qc *(1-d) + perda_Qs)
-        perda_S4Q.append(perda_Qc *( d ) + perda_Qs)
-        perda_S5pQ.append(perda_Qc *(1-d) + perda_Qs)
-        perda_S5pDn.append(perda_DPc*(1-d) + perda_DPs)
-        perda_S6pQ.append(perda_Qc *( d ) + perda_Qs)
-        perda_S6pDn.append(perda_DPc*( d ) + perda_DPs)
-		
-        perda_S5sQn.append(perda_Qc*(1-d) + perda_Qs)
-        perda_S5sDn.append(perda_Dc*(1-d) + perda_Ds)
-        perda_S6sQn.append(perda_Qc*( d ) + perda_Qs)
-        perda_S6sDn.append(perda_Dc*( d ) + perda_Ds)
-        
-    elif intervalo == "F" and i_positivo:
-        perda_S2D.append(perda_Dc *( 1 ))
-        perda_S4D.append(perda_Dc *(1-d) + perda_Ds)
-        perda_S5pQ.append(perda_Qc *( d ) + perda_Qs)
-        perda_S5pDp.append(perda_DPc*( d ) + perda_DPs)
-		
-        perda_S5sQp.append(perda_Qc*( d ) + perda_Qs)
-        perda_S5sDp.append(perda_Dc*( d ) + perda_Ds)
-
-    elif intervalo == "F" and not i_positivo:
-        perda_S2Q.append(perda_Qc*( 1 ))
-        perda_S4Q.append(perda_Qc*(1-d) + perda_Qs)
-        perda_S5pQ.append(perda_Qc*( d ) + perda_Qs)
-        perda_S5pDn.append(perda_DPc*( d ) + perda_DPs)
-		
-        perda_S5sQn.append(perda_Qc*( d ) + perda_Qs)
-        perda_S5sDn.append(perda_Dc*( d ) + perda_Ds)
+    if i_positivo is None:
+        i_positivo = (i >= 0)
+
+    # As perdas calculadas são adicionadas às chaves de acordo com o
+    # estado de cada chave no intervalo e sentido da corrente, descrito
+    # pela tabela de estados (ver TabelaEstados).
+    if tabela is None:
+        tabela = TABELA_7NIVEIS
+    estado = tabela.estado(intervalo, i_positivo)
+    perdas, imed = tabela.aplica(estado, d, iabs, conducao, comutacao)
+
+    # Valores calculados em cada chaveamento, para criação de gráfico.
+    return {"ANGULO":       angulo,
+            "INTERVALO":    intervalo,
+            "RAZAOCICLICA": d * 100, # Transforma em porcentagem
+            "CORRENTE":     i,
+            "TENSAOREF":    vref,
+            "POTENCIAINST": vref*i,
+            "VBLOCK":       vblock,
+            "perdas":       perdas,
+            "correntes":    imed}
+
+def resumeCiclos(cfg, geo, ciclos, avisos=(), tabela=None):
+    """
+    Soma as perdas e calcula correntes médias, potência de saída e
+    rendimentos a partir dos vetores retornados por calculaCiclos com a
+    TabelaEstados "tabela" (padrão: TABELA_7NIVEIS).
+    """
+    nomes = (TABELA_7NIVEIS if tabela is None else tabela).dispositivos
+    s = dict(zip(nomes, numpy.sum(ciclos["perdas"], axis=1)))
+    correntes = dict(zip(nomes, media(ciclos["correntes"])))
+    correntes_rms = dict(zip(nomes, rms(ciclos["correntes"])))
+    potencia_saida = media(ciclos["POTENCIAINST"])
+    return resumeSomas(cfg, geo, s, correntes, potencia_saida, avisos,
+                       correntes_rms=correntes_rms, tabela=tabela)
+
+def multiplicidades(dispositivos=DISPOSITIVOS):
+    """
+    Número de vezes que cada item de "dispositivos" entra nas perdas
+    totais de cada variante (ver resumeSomas). Retorna {"ponte":
+    vetor, "2ch": vetor}. Itens de S5/S6 com ponte ("S5p", "S6p") só
+    entram na variante "ponte", com os diodos da ponte contados duas
+    vezes; itens em anti-série ("S5s", "S6s") só na "2ch"; os demais
+    entram nas duas.
+    """
+    ponte = [0 if n.startswith(("S5s", "S6s")) else
+             2 if n.startswith(("S5pD", "S6pD")) else 1 for n in dispositivos]
+    serie = [0 if n.startswith(("S5p", "S6p")) else 1 for n in dispositivos]
+    return {"ponte": numpy.array(ponte), "2ch": numpy.array(serie)}
+
+def resumeSomas(cfg, geo, s, correntes, potencia_saida, avisos=(),
+                erro_estimado=None, correntes_rms=None, tabela=None):
+    """
+    Calcula perdas totais e rendimentos a partir das perdas somadas "s" e
+    das correntes médias de cada item da TabelaEstados "tabela" (padrão:
+    TABELA_7NIVEIS) e monta o Resultado. Cada item entra nas perdas
+    totais de cada variante conforme multiplicidades.
+    """
+    nomes = (TABELA_7NIVEIS if tabela is None else tabela).dispositivos
+    m = multiplicidades(nomes)
+    perdasJ_bidir_ponte = sum(int(k)*s[n] for k, n in zip(m["ponte"], nomes)
+                              if k)
+    perdasJ_bidir_2ch = sum(int(k)*s[n] for k, n in zip(m["2ch"], nomes)
+                            if k)
+
+    #Perdas em J calculadas para 1 ciclo.
+    #Perdas em W calculadas para 1 segundo = perdasJ / t_ciclo = perdasJ*fr
+    perdasW_bidir_ponte = perdasJ_bidir_ponte * cfg.fr
+    perdasW_bidir_2ch   = perdasJ_bidir_2ch   * cfg.fr
+
+    rend_ponte = (potencia_saida - perdasW_bidir_ponte) / potencia_saida * 100
+    rend_2ch   = (potencia_saida - perdasW_bidir_2ch  ) / potencia_saida * 100
+
+    tt0, tt1, tt2, tt3, tt4, tt5, tt6, tt7, tt8 = geo.tt
+    chA, chB, chC, chD, chE, chF = geo.ch
+    return Resultado(config=cfg, avisos=list(avisos),
+                     perdas=s, correntes=correntes, ma=geo.ma, mf=geo.mf,
+                     tt0=tt0, tt1=tt1, tt2=tt2, tt3=tt3, tt4=tt4,
+                     tt5=tt5, tt6=tt6, tt7=tt7, tt8=tt8,
+                     chA=chA, chB=chB, chC=chC, chD=chD, chE=chE, chF=chF,
+                     potencia_saida=potencia_saida,
+                     perdasW_bidir_ponte=perdasW_bidir_ponte,
+                     perdasW_bidir_2ch=perdasW_bidir_2ch,
+                     rend_ponte=rend_ponte, rend_2ch=rend_2ch,
+                     erro_estimado=erro_estimado,
+                     correntes_rms=correntes_rms)
 
+###########################################################################
+# INTEGRAÇÃO ANALÍTICA POR INTERVALO                                      #
+# Dentro de um trecho de ciclos de mesmo intervalo e mesmo sentido de     #
+# corrente, razão cíclica, corrente e tensão de bloqueio são funções      #
+# suaves do ângulo. A soma das perdas dos ciclos do trecho é aproximada   #
+# pela integral da perda no trecho, dividida pela largura de um ciclo,    #
+# calculada por quadratura de Gauss-Legendre. O custo não depende de mf.  #
+###########################################################################
+def trechosCiclos(cfg, geo):
+    """
+    Divide os ciclos de chaveamento em trechos contíguos de mesmo
+    intervalo e mesmo sentido de corrente. Retorna lista de
+    (primeiro ciclo, último ciclo + 1, intervalo, i_positivo).
+    """
+    N = int(geo.mf)
+    h = 2*pi/N
+    a0 = 2*pi * 1/(2*geo.mf)
+
+    def ciclosAte(x):
+        """Número de ciclos cujo ângulo médio é menor ou igual a x"""
+        return min(max(int(floor((x - a0)/h)) + 1, 0), N)
+
+    def estado(k):
+        """Intervalo e sentido da corrente do ciclo k"""
+        angulo = numpy.array([2*pi * (k/N) + 2*pi * 1/(2*geo.mf)])
+        i = corrente(cfg, angulo)
+        return str(classificaIntervalo(angulo, geo.theta)[0]), bool(i[0] >= 0)
+
+    # Mudanças de intervalo e passagens da corrente por zero.
+    fronteiras = list(geo.theta[1:]) + [pi]
+    fronteiras += passagensPorZero(cfg.I_def, cfg.fat_crista)
+    cortes = sorted(set([0, N] + [ciclosAte(x) for x in fronteiras]))
+
+    trechos = []
+    for k0, k1 in zip(cortes[:-1], cortes[1:]):
+        # Um ciclo exatamente sobre a fronteira pode ter sido atribuído ao
+        # trecho vizinho por arredondamento; é separado em trecho próprio.
+        primeiro, ultimo = estado(k0), estado(k1 - 1)
+        if k1 - k0 > 1 and primeiro != estado(k0 + 1):
+            trechos.append((k0, k0 + 1) + primeiro)
+            k0 += 1
+        if k1 - k0 > 1 and ultimo != estado(k1 - 2):
+            trechos.append((k0, k1 - 1) + estado(k0))
+            trechos.append((k1 - 1, k1) + ultimo)
+        else:
+            trechos.append((k0, k1) + estado(k0))
+    return trechos
+
+def _nosQuadratura(trechos, mf, paineis, ordem):
+    """
+    Retorna ângulos, pesos (em ciclos de chaveamento), intervalos e
+    sentidos de corrente dos nós de quadratura de todos os trechos.
+    """
+    N = int(mf)
+    h = 2*pi/N
+    a0 = 2*pi * 1/(2*mf)
+    t, w = numpy.polynomial.legendre.leggauss(ordem)
+    angulos, pesos, intervalos, positivos = [], [], [], []
+    for k0, k1, intervalo, i_positivo in trechos:
+        # Trecho cobre de meio ciclo antes do primeiro ângulo médio até
+        # meio ciclo depois do último.
+        inicio = a0 + k0*h - h/2
+        largura = (k1 - k0)*h / paineis
+        for p in range(paineis):
+            angulos.append(inicio + (p + (t + 1)/2)*largura)
+            pesos.append(w*largura/2 / h)
+        intervalos.append(numpy.repeat(intervalo, paineis*ordem))
+        positivos.append(numpy.repeat(i_positivo, paineis*ordem))
+    return (numpy.concatenate(angulos), numpy.concatenate(pesos),
+            numpy.concatenate(intervalos), numpy.concatenate(positivos))
+
+def _erroSomaDiscreta(cfg, trechos, mf, paineis, ordem, tabela=None,
+                      modelo=None):
+    """
+    Estima, para cada item da tabela, a diferença entre a integral
+    dos trechos (dividida pela largura de um ciclo) e a soma por ciclo,
+    somando o valor absoluto da diferença de cada trecho.
+    Pela fórmula de Euler-Maclaurin da regra do ponto médio, em um
+    trecho essa diferença é h/24*(f'(b) - f'(a)); as derivadas nas bordas
+    são aproximadas pelas perdas dos três primeiros e três últimos ciclos.
+    Em trechos com menos de três ciclos, a diferença é calculada
+    diretamente.
+    """
+    N = int(mf)
+    h = 2*pi/N
+    a0 = 2*pi * 1/(2*mf)
+    # h*f'(b) ~ 2 f[-1] - 3 f[-2] + f[-3] e h*f'(a) ~ -(2 f[0] - 3 f[1] + f[2])
+    bordas = numpy.array([2, -3, 1, 1, -3, 2]) / 24
+    ciclos, pesos, grupos, intervalos, positivos = [], [], [], [], []
+    curtos, grupos_curtos = [], []
+    for t, (k0, k1, intervalo, i_positivo) in enumerate(trechos):
+        if k1 - k0 < 3:
+            novos = list(range(k0, k1))
+            pesos.append(-numpy.ones(len(novos)))
+            curtos.append(trechos[t])
+            grupos_curtos.append(t)
+        else:
+            novos = [k0, k0 + 1, k0 + 2, k1 - 3, k1 - 2, k1 - 1]
+            pesos.append(bordas)
+        ciclos += novos
+        grupos += [t]*len(novos)
+        intervalos += [intervalo]*len(novos)
+        positivos += [i_positivo]*len(novos)
+    angulo = a0 + h*numpy.array(ciclos)
+    intervalo, i_positivo = numpy.array(intervalos), numpy.array(positivos)
+    if curtos:
+        # Integral dos trechos curtos, com os mesmos nós de calculaAnalitico.
+        nos = _nosQuadratura(curtos, mf, paineis, ordem)
+        angulo = numpy.concatenate([angulo, nos[0]])
+        pesos.append(nos[1])
+        grupos += list(numpy.repeat(grupos_curtos, paineis*ordem))
+        intervalo = numpy.concatenate([intervalo, nos[2]])
+        i_positivo = numpy.concatenate([i_positivo, nos[3]])
+    pontos = calculaPontos(cfg, angulo, intervalo, i_positivo, tabela,
+                           modelo)
+    # Diferença de cada item (linhas) em cada trecho (colunas).
+    membros = numpy.array(grupos)[:, None] == numpy.arange(len(trechos))
+    diferencas = numpy.dot(pontos["perdas"] * numpy.concatenate(pesos),
+                           membros)
+    return numpy.sum(numpy.abs(diferencas), axis=1)
+
+def calculaAnalitico(cfg, geo=None, paineis=4, ordem=8, tabela=None,
+                     modelo=None):
+    """
+    Calcula as perdas somadas de cada item da tabela integrando
+    cada trecho de ciclos com "paineis" painéis de Gauss-Legendre de
+    "ordem" pontos. O erro estimado de cada item é a soma do erro de
+    quadratura (diferença para a integração com metade dos painéis) e
+    da diferença estimada entre a integral e a soma por ciclo (ver
+    _erroSomaDiscreta); é uma estimativa da ordem do erro, não um limite.
+    Comparado à soma por ciclo (calculaCiclos), para mf >= 100, a
+    diferença na perda de cada item fica abaixo de 1e-4 da perda total e
+    a diferença nas perdas totais abaixo de 5e-4 delas; a diferença nos
+    rendimentos fica, portanto, abaixo de 5e-4*(100 - rendimento) pontos
+    percentuais.
+    Retorna dicionários de somas, correntes médias, potência de saída,
+    erro estimado e valor eficaz das correntes médias.
+    """
+    if geo is None:
+        geo = Geometria(cfg)
+    tabela = TABELA_7NIVEIS if tabela is None else tabela
+    trechos = trechosCiclos(cfg, geo)
+    N = int(geo.mf)
+
+    def integra(n_paineis):
+        angulo, peso, intervalo, i_positivo = \
+            _nosQuadratura(trechos, geo.mf, n_paineis, ordem)
+        pontos = calculaPontos(cfg, angulo, intervalo, i_positivo, tabela,
+                               modelo)
+        imed = pontos["correntes"]
+        return (numpy.dot(pontos["perdas"], peso),
+                numpy.dot(imed, peso)/N,
+                numpy.sqrt(numpy.dot(imed**2, peso)/N),
+                numpy.dot(pontos["POTENCIAINST"], peso)/N)
+
+    grosso = integra(max(paineis//2, 1))[0]
+    somas, correntes, correntes_rms, potencia_saida = integra(paineis)
+    erro = abs(somas - grosso) + _erroSomaDiscreta(
+        cfg, trechos, geo.mf, paineis, ordem, tabela, modelo)
+    nomes = tabela.dispositivos
+    return (dict(zip(nomes, somas)),
+            dict(zip(nomes, correntes)),
+            potencia_saida,
+            dict(zip(nomes, erro)),
+            dict(zip(nomes, correntes_rms)))
+
+def calcular_perdas(config=None, modo="ciclos", tabela=None, modelo=None):
+    """
+    Calcula as perdas de um ponto de operação sem imprimir nada.
+    Recebe uma Configuracao (ou None, para os valores definidos pelo
+    usuário) e retorna um Resultado. Variáveis fora de limite são
+    listadas em Resultado.avisos.
+    modo "ciclos"    : soma as perdas de cada ciclo de chaveamento
+    modo "analitico" : integra as perdas em cada trecho (ver
+                       calculaAnalitico), com custo independente de mf
+    "tabela" é a TabelaEstados usada (padrão: TABELA_7NIVEIS) e
+    "modelo" o ModeloPerdas (padrão: funções de perda do usuário).
+    """
+    cfg = Configuracao() if config is None else config
+    avisos = validaEntradas(cfg, [])
+    geo = Geometria(cfg)
+    if modo == "ciclos":
+        return resumeCiclos(cfg, geo,
+                            calculaCiclos(cfg, geo, tabela, modelo), avisos,
+                            tabela)
+    elif modo == "analitico":
+        somas, correntes, potencia_saida, erro, correntes_rms = \
+            calculaAnalitico(cfg, geo, tabela=tabela, modelo=modelo)
+        return resumeSomas(cfg, geo, somas, correntes, potencia_saida,
+                           avisos, erro, correntes_rms, tabela)
     else:
-        print "error", intervalo, i_positivo
-		
-    if intervalo == "A" and i_positivo:
-        i_S3Q.append(iabs*( 1 ))
-        i_S4D.append(iabs*(1-d))
-        i_S5pQ.append(iabs*( d ))
-        i_S5pDp.append(iabs*( d ))
-        
-        i_S5sQp.append(iabs*( d ))
-        i_S5sDp.append(iabs*( d ))
-        
-    elif intervalo == "A" and not i_positivo:
-        i_S3D.append(iabs*( 1 ))
-        i_S4Q.append(iabs*(1-d))
-        i_S5pQ.append(iabs*( d ))
-        i_S5pDn.append(iabs*( d ))
-        
-        i_S5sQn.append(iabs*( d ))
-        i_S5sDn.append(iabs*( d ))
-        
-    elif intervalo == "B" and i_positivo:
-        i_S1Q.append(iabs*( d ))
-        i_S3Q.append(iabs*(1-d))
-        i_S5pQ.append(iabs*(1-d))
-        i_S5pDp.append(iabs*(1-d))
-        i_S6pQ.append(iabs*( d ))
-        i_S6pDp.append(iabs*( d ))
-		
-        i_S5sQp.append(iabs*(1-d))
-        i_S5sDp.append(iabs*(1-d))
-        i_S6sQp.append(iabs*( d ))
-        i_S6sDp.append(iabs*( d ))
-		
-    elif intervalo == "B" and not i_positivo:
-        i_S1D.append(iabs*( d ))
-        i_S3D.append(iabs*(1-d))
-        i_S5pQ.append(iabs*(1-d))
-        i_S5pDn.append(iabs*(1-d))
-        i_S6pQ.append(iabs*( d ))
-        i_S6pDn.append(iabs*( d ))
-		
-        i_S5sQn.append(iabs*(1-d))
-        i_S5sDn.append(iabs*(1-d))
-        i_S6sQn.append(iabs*( d ))
-        i_S6sDn.append(iabs*( d ))
-        
-    elif intervalo == "C" and i_positivo:
-        i_S1Q.append(iabs*( 1 ))
-        i_S3Q.append(iabs*( d ))
-        i_S6pQ.append(iabs*(1-d))
-        i_S6pDp.append(iabs*(1-d))
-		
-        i_S6sQp.append(iabs*(1-d))
-        i_S6sDp.append(iabs*(1-d))
-        
-    elif intervalo == "C" and not i_positivo:
-        i_S1D.append(iabs*( 1 ))
-        i_S3D.append(iabs*( d ))
-        i_S6pQ.append(iabs*(1-d))
-        i_S6pDn.append(iabs*(1-d))
-		
-        i_S6sQn.append(iabs*(1-d))
-        i_S6sDn.append(iabs*(1-d))
-        
-    elif intervalo == "D" and i_positivo:
-        i_S3Q.append(iabs*( d ))
-        i_S4D.append(iabs*( 1 ))
-        i_S6pQ.append(iabs*(1-d))
-        i_S6pDp.append(iabs*(1-d))
-		
-        i_S6sQp.append(iabs*(1-d))
-        i_S6sDp.append(iabs*(1-d))
-        
-    elif intervalo == "D" and not i_positivo:
-        i_S3D.append(iabs*( d ))
-        i_S4Q.append(iabs*( 1 ))
-        i_S6pQ.append(iabs*(1-d))
-        i_S6pDn.append(iabs*(1-d))
-		
-        i_S6sQn.append(iabs*(1-d))
-        i_S6sDn.append(iabs*(1-d))
-        
-    elif intervalo == "E" and i_positivo:
-        i_S2D.append(iabs*(1-d))
-        i_S4D.append(iabs*( d ))
-        i_S5pQ.append(iabs*(1-d))
-        i_S5pDp.append(iabs*(1-d))
-        i_S6pQ.append(iabs*( d ))
-        i_S6pDp.append(iabs*( d ))
-		
-        i_S5sQp.append(iabs*(1-d))
-        i_S5sDp.append(iabs*(1-d))
-        i_S6sQp.append(iabs*( d ))
-        i_S6sDp.append(iabs*( d ))
-        
-    elif intervalo == "E" and not i_positivo:
-        i_S2Q.append(iabs*(1-d))
-        i_S4Q.append(iabs*( d ))
-        i_S5pQ.append(iabs*(1-d))
-        i_S5pDn.append(iabs*(1-d))
-        i_S6pQ.append(iabs*( d ))
-        i_S6pDn.append(iabs*( d ))
-		
-        i_S5sQn.append(iabs*(1-d))
-        i_S5sDn.append(iabs*(1-d))
-        i_S6sQn.append(iabs*( d ))
-        i_S6sDn.append(iabs*( d ))
-        
-    elif intervalo == "F" and i_positivo:
-        i_S2D.append(iabs*( 1 ))
-        i_S4D.append(iabs*(1-d))
-        i_S5pQ.append(iabs*( d ))
-        i_S5pDp.append(iabs*( d ))
-		
-        i_S5sQp.append(iabs*( d ))
-        i_S5sDp.append(iabs*( d ))
-
-    elif intervalo == "F" and not i_positivo:
-        i_S2Q.append(iabs*( 1 ))
-        i_S4Q.append(iabs*(1-d))
-        i_S5pQ.append(iabs*( d ))
-        i_S5pDn.append(iabs*( d ))
-		
-        i_S5sQn.append(iabs*( d ))
-        i_S5sDn.append(iabs*( d ))
+        raise ValueError("Modo de cálculo desconhecido: " + str(modo))
 
+###########################################################################
+# CÁLCULO EM LOTE                                                         #
+# Pontos de operação que diferem apenas em Ief e I_def têm a mesma        #
+# geometria e os mesmos intervalos em cada ciclo; são calculados juntos,  #
+# com os ciclos de todos os pontos concatenados em um único vetor.        #
+###########################################################################
+def calculaLote(cfg, Ief, I_def, geo=None, tabela=None, modelo=None):
+    """
+    Calcula, como calculaCiclos, os pontos de operação dados pelos
+    vetores "Ief" e "I_def"; as demais entradas vêm de "cfg".
+    Retorna (somas, correntes médias, valor eficaz das correntes médias,
+    potência de saída); as três primeiras são matrizes com uma linha por
+    item da tabela e uma coluna por ponto.
+    """
+    if geo is None:
+        geo = Geometria(cfg)
+    Ief, I_def = numpy.broadcast_arrays(numpy.atleast_1d(Ief),
+                                        numpy.atleast_1d(I_def))
+    angulo = angulosCiclos(geo.mf)
+    intervalo = classificaIntervalo(angulo, geo.theta)
+    n, N = len(Ief), len(angulo)
+    lote = cfg.substitui(Ief=numpy.repeat(Ief, N),
+                         I_def=numpy.repeat(I_def, N))
+    pontos = calculaPontos(lote, numpy.tile(angulo, n),
+                           numpy.tile(intervalo, n), tabela=tabela,
+                           modelo=modelo)
+    forma = (len(pontos["perdas"]), n, N)
+    imed = pontos["correntes"].reshape(forma)
+    return (numpy.sum(pontos["perdas"].reshape(forma), axis=-1),
+            media(imed), rms(imed),
+            media(pontos["POTENCIAINST"].reshape(n, N)))
+
+def calcular_lote(config, Ief, I_def, modo="ciclos", tabela=None,
+                  modelo=None):
+    """
+    Calcula as perdas dos pontos de operação dados pelos vetores "Ief" e
+    "I_def", com as demais entradas de "config". Retorna um Resultado
+    cujos valores (perdas, correntes, potência, rendimentos) são vetores
+    com um elemento por ponto. Os pontos não são validados; apenas
+    "config" é listada em Resultado.avisos.
+    No modo "analitico" os pontos são calculados um a um.
+    """
+    avisos = validaEntradas(config, [])
+    geo = Geometria(config)
+    tabela = TABELA_7NIVEIS if tabela is None else tabela
+    nomes = tabela.dispositivos
+    if modo == "ciclos":
+        somas, correntes, correntes_rms, potencia_saida = \
+            calculaLote(config, Ief, I_def, geo, tabela, modelo)
+        erro = None
+    elif modo == "analitico":
+        Ief, I_def = numpy.broadcast_arrays(numpy.atleast_1d(Ief),
+                                            numpy.atleast_1d(I_def))
+        partes = [calculaAnalitico(config.substitui(Ief=a, I_def=b), geo,
+                                   tabela=tabela, modelo=modelo)
+                  for a, b in zip(Ief, I_def)]
+        somas, correntes, potencia_saida, erro, correntes_rms = [
+            [[p[j][n] for p in partes] for n in nomes]
+            if j != 2 else [p[j] for p in partes] for j in range(5)]
+        erro = dict(zip(nomes, numpy.array(erro)))
+        potencia_saida = numpy.array(potencia_saida)
     else:
-        print "error", intervalo, i_positivo
-
-    #Insere ZERO nos vetores que não foram atualizados.
-    if (k+1) > len(perda_S1Q):    perda_S1Q.append(0)
-    if (k+1) > len(perda_S1D):    perda_S1D.append(0)
-    if (k+1) > len(perda_S2Q):    perda_S2Q.append(0)
-    if (k+1) > len(perda_S2D):    perda_S2D.append(0)
-    if (k+1) > len(perda_S3Q):    perda_S3Q.append(0)
-    if (k+1) > len(perda_S3D):    perda_S3D.append(0)
-    if (k+1) > len(perda_S4Q):    perda_S4Q.append(0)
-    if (k+1) > len(perda_S4D):    perda_S4D.append(0)
-    if (k+1) > len(perda_S5pQ):   perda_S5pQ.append(0)
-    if (k+1) > len(perda_S5pDp):  perda_S5pDp.append(0)
-    if (k+1) > len(perda_S5pDn):  perda_S5pDn.append(0)
-    if (k+1) > len(perda_S6pQ):   perda_S6pQ.append(0)
-    if (k+1) > len(perda_S6pDp):  perda_S6pDp.append(0)
-    if (k+1) > len(perda_S6pDn):  perda_S6pDn.append(0)
-    if (k+1) > len(perda_S5sQp):  perda_S5sQp.append(0)
-    if (k+1) > len(perda_S5sQn):  perda_S5sQn.append(0)
-    if (k+1) > len(perda_S5sDp):  perda_S5sDp.append(0)
-    if (k+1) > len(perda_S5sDn):  perda_S5sDn.append(0)
-    if (k+1) > len(perda_S6sQp):  perda_S6sQp.append(0)
-    if (k+1) > len(perda_S6sQn):  perda_S6sQn.append(0)
-    if (k+1) > len(perda_S6sDp):  perda_S6sDp.append(0)
-    if (k+1) > len(perda_S6sDn):  perda_S6sDn.append(0)
-	
-    if (k+1) > len(i_S1Q):    i_S1Q.append(0)
-    if (k+1) > len(i_S1D):    i_S1D.append(0)
-    if (k+1) > len(i_S2Q):    i_S2Q.append(0)
-    if (k+1) > len(i_S2D):    i_S2D.append(0)
-    if (k+1) > len(i_S3Q):    i_S3Q.append(0)
-    if (k+1) > len(i_S3D):    i_S3D.append(0)
-    if (k+1) > len(i_S4Q):    i_S4Q.append(0)
-    if (k+1) > len(i_S4D):    i_S4D.append(0)
-    if (k+1) > len(i_S5pQ):   i_S5pQ.append(0)
-    if (k+1) > len(i_S5pDp):  i_S5pDp.append(0)
-    if (k+1) > len(i_S5pDn):  i_S5pDn.append(0)
-    if (k+1) > len(i_S6pQ):   i_S6pQ.append(0)
-    if (k+1) > len(i_S6pDp):  i_S6pDp.append(0)
-    if (k+1) > len(i_S6pDn):  i_S6pDn.append(0)
-    if (k+1) > len(i_S5sQp):  i_S5sQp.append(0)
-    if (k+1) > len(i_S5sQn):  i_S5sQn.append(0)
-    if (k+1) > len(i_S5sDp):  i_S5sDp.append(0)
-    if (k+1) > len(i_S5sDn):  i_S5sDn.append(0)
-    if (k+1) > len(i_S6sQp):  i_S6sQp.append(0)
-    if (k+1) > len(i_S6sQn):  i_S6sQn.append(0)
-    if (k+1) > len(i_S6sDp):  i_S6sDp.append(0)
-    if (k+1) > len(i_S6sDn):  i_S6sDn.append(0)
-    
-    # Salva os valores calculados neste chaveamento nos vetores
-    # Para criação de gráfico.
-    RAZAOCICLICA.append(d * 100) # Transforma em porcentagem
-    CORRENTE.append(i)
-    TENSAOREF.append(vref)
-    POTENCIAINST.append(vref*i)
-
-print("Resultados:")
-print("Valores de entrada:")
-print("V1           = "+str(V1)+" V")
-print("V2           = "+str(V1)+" V")
-print("Vref         = "+str(Ar)+" V") 
-print("Vref eficaz  = "+str(Ar/sqrt(2))+" Vef")
-print("Vref calc.   = "+str(rms(TENSAOREF))+" Vef")
-print("Ief          = "+str(Ief)+" Aef")
-print("Ief calculado= "+str(rms(CORRENTE))+" Aef")
-
-print("I_def        = "+str(I_def)+" rad")
-print("             = "+str(radParaGraus(I_def))+" graus")
-
-print("Fator de Crista  = "+str(fat_crista))
-print("Freq Vref        = "+str(fr)+" Hz")
-print("Freq chaveamento = "+str(fp)+" Hz")
-print("Índice de Modulação de Amplitude,  ma = "+str(ma))
-print("Índice de Modulação de Frequência, mf = "+str(mf))
-
-angulos = [tt0,tt1,tt2,tt3,tt4,pi,tt5,tt6,tt7,tt8]
-str_angulos = ", ".join([str(radParaGraus(r)) for r in angulos])
-print("Ângulos das mudanças de estado:\n    "+str_angulos)
-
-chaveamentos = [chA, chB, chC, chD, chE, chF]
-str_chaveamentos = ", ".join([str(int(c)) for c in chaveamentos])
-print("Número de ciclos em cada intervalo (A a F):\n    "+str_chaveamentos)
-
-sum_S1Q = sum(perda_S1Q)
-sum_S1D = sum(perda_S1D)
-sum_S2Q = sum(perda_S2Q)
-sum_S2D = sum(perda_S2D)
-sum_S3Q = sum(perda_S3Q)
-sum_S3D = sum(perda_S3D)
-sum_S4Q = sum(perda_S4Q)
-sum_S4D = sum(perda_S4D)
-sum_S5pQ = sum(perda_S5pQ)
-sum_S5pDp = sum(perda_S5pDp)
-sum_S5pDn = sum(perda_S5pDn)
-sum_S6pQ = sum(perda_S6pQ)
-sum_S6pDp = sum(perda_S6pDp)
-sum_S6pDn = sum(perda_S6pDn)
-sum_S5sQp = sum(perda_S5sQp)
-sum_S5sQn = sum(perda_S5sQn)
-sum_S5sDp = sum(perda_S5sDp)
-sum_S5sDn = sum(perda_S5sDn)
-sum_S6sQp = sum(perda_S6sQp)
-sum_S6sQn = sum(perda_S6sQn)
-sum_S6sDp = sum(perda_S6sDp)
-sum_S6sDn = sum(perda_S6sDn)
-
-print("Perdas nas chaves:")
-print("    S1 Q  = "+'{0:.2f}'.format(sum_S1Q) + " W. Imed = " \
-                                                    + str(media(i_S1Q  )))
-print("       D  = "+'{0:.2f}'.format(sum_S1D) + " W. Imed = " \
-                                                    +str(media(i_S1D  )))
-print("    S2 Q  = "+'{0:.2f}'.format(sum_S2Q) + " W. Imed = " \
-                                                    +str(media(i_S2Q  )))
-print("       D  = "+'{0:.2f}'.format(sum_S2D) + " W. Imed = " \
-                                                    +str(media(i_S2D  )))
-print("    S3 Q  = "+'{0:.2f}'.format(sum_S3Q) + " W. Imed = " \
-                                                    +str(media(i_S3Q  )))
-print("       D  = "+'{0:.2f}'.format(sum_S3D) + " W. Imed = " \
-                                                    +str(media(i_S3D  )))
-print("    S4 Q  = "+'{0:.2f}'.format(sum_S4Q) + " W. Imed = " \
-                                                    +str(media(i_S4Q  )))
-print("       D  = "+'{0:.2f}'.format(sum_S4D) + " W. Imed = " \
-                                                    +str(media(i_S4D  )))
-print(" Chave bidirecional com ponte de diodos:")
-print("    S5 Q  = "+'{0:.2f}'.format(sum_S5pQ) +" W. Imed = " \
-                                                    +str(media(i_S5pQ) ))
-print("       Dp = "+'{0:.2f}'.format(sum_S5pDp)+" W. Imed = " \
-                                                    +str(media(i_S5pDp)))
-print("       Dn = "+'{0:.2f}'.format(sum_S5pDn)+" W. Imed = " \
-                                                    +str(media(i_S5pDn)))
-print("    S6 Q  = "+'{0:.2f}'.format(sum_S6pQ) +" W. Imed = " \
-                                                    +str(media(i_S6pQ )))
-print("       Dp = "+'{0:.2f}'.format(sum_S6pDp)+" W. Imed = " \
-                                                    +str(media(i_S6pDp)))
-print("       Dn = "+'{0:.2f}'.format(sum_S6pDn)+" W. Imed = " \
-                                                    +str(media(i_S6pDn)))
-print(" Chave bidirecional em anti-série:")
-print("    S5 Qp = "+'{0:.2f}'.format(sum_S5sQp)+" W. Imed = " \
-                                                    +str(media(i_S5sQp)))
-print("       Qn = "+'{0:.2f}'.format(sum_S5sQn)+" W. Imed = " \
-                                                    +str(media(i_S5sQn)))
-print("       Dp = "+'{0:.2f}'.format(sum_S5sDp)+" W. Imed = " \
-                                                    +str(media(i_S5sDp)))
-print("       Dn = "+'{0:.2f}'.format(sum_S5sDn)+" W. Imed = " \
-                                                    +str(media(i_S5sDn)))
-print("    S6 Qp = "+'{0:.2f}'.format(sum_S6sQp)+" W. Imed = " \
-                                                    +str(media(i_S6sQp)))
-print("       Qn = "+'{0:.2f}'.format(sum_S6sQn)+" W. Imed = " \
-                                                    +str(media(i_S6sQn)))
-print("       Dp = "+'{0:.2f}'.format(sum_S6sDp)+" W. Imed = " \
-                                                    +str(media(i_S6sDp)))
-print("       Dn = "+'{0:.2f}'.format(sum_S6sDn)+" W. Imed = " \
-                                                    +str(media(i_S6sDn)))
-
-print("\n")
-potencia_saida = sum(POTENCIAINST)/len(POTENCIAINST)
-perdasJ_bidir_ponte = sum_S1Q  +   sum_S1D   + sum_S2Q + sum_S2D +  \
-                      sum_S3Q  +   sum_S3D   + sum_S4Q + sum_S4D +  \
-                      sum_S5pQ + 2*sum_S5pDp + 2*sum_S5pDn       +  \
-                      sum_S6pQ + 2*sum_S6pDp + 2*sum_S6pDn
-
-perdasJ_bidir_2ch   = sum_S1Q   + sum_S1D   + sum_S2Q   + sum_S2D   +  \
-                      sum_S3Q   + sum_S3D   + sum_S4Q   + sum_S4D   +  \
-                      sum_S5sQp + sum_S5sDp + sum_S5sQn + sum_S5sDn +  \
-                      sum_S6sQp + sum_S6sDp + sum_S6sQn + sum_S6sDn
-
-#Perdas em J calculadas para 1 ciclo.
-#Perdas em W calculadas para 1 segundo = perdasJ / t_ciclo = perdasJ*fr
-perdasW_bidir_ponte = perdasJ_bidir_ponte * fr
-perdasW_bidir_2ch   = perdasJ_bidir_2ch   * fr
-
-print("perdas (ponte) = "+str(perdasW_bidir_ponte)+" W")
-print("perdas (série) = "+str(perdasW_bidir_2ch)+" W")
-                 
-rend_ponte = (potencia_saida - perdasW_bidir_ponte) / potencia_saida * 100
-rend_2ch   = (potencia_saida - perdasW_bidir_2ch  ) / potencia_saida * 100
-print("Potencia Total das fontes = "+str(potencia_saida)+" W")
-print("Potencia De saída (ponte) = " \
-                             +str(potencia_saida-perdasW_bidir_ponte)+" W")
-print("Potencia De saída (série) = " \
-                             +str(potencia_saida-perdasW_bidir_2ch)+" W")
-
-print("Topologia com chave bidirecional em ponte de diodo")
-print("    Rendimento = "+'{0:.2f}'.format(rend_ponte)+" %")
-print("Topologia com chave bidirecional em anti-série")
-print("    Rendimento = "+'{0:.2f}'.format(rend_2ch)  +" %")
+        raise ValueError("Modo de cálculo desconhecido: " + str(modo))
+    return resumeSomas(config, geo,
+                       dict(zip(nomes, numpy.array(somas))),
+                       dict(zip(nomes, numpy.array(correntes))),
+                       potencia_saida, avisos, erro,
+                       dict(zip(nomes, numpy.array(correntes_rms))), tabela)
+
+###########################################################################
+# APRESENTAÇÃO DOS RESULTADOS                                             #
+###########################################################################
+def imprimeResultados(cfg, ciclos, r):
+    """Imprime relatório do cálculo de um ponto de operação"""
+    p, im = r.perdas, r.correntes
+    print("Resultados:")
+    print("Valores de entrada:")
+    print("V1           = "+str(cfg.V1)+" V")
+    print("V2           = "+str(cfg.V1)+" V")
+    print("Vref         = "+str(cfg.Ar)+" V")
+    print("Vref eficaz  = "+str(cfg.Ar/sqrt(2))+" Vef")
+    print("Vref calc.   = "+str(rms(ciclos["TENSAOREF"]))+" Vef")
+    print("Ief          = "+str(cfg.Ief)+" Aef")
+    print("Ief calculado= "+str(rms(ciclos["CORRENTE"]))+" Aef")
+
+    print("I_def        = "+str(cfg.I_def)+" rad")
+    print("             = "+str(radParaGraus(cfg.I_def))+" graus")
+
+    print("Fator de Crista  = "+str(cfg.fat_crista))
+    print("Freq Vref        = "+str(cfg.fr)+" Hz")
+    print("Freq chaveamento = "+str(cfg.fp)+" Hz")
+    print("Índice de Modulação de Amplitude,  ma = "+str(r.ma))
+    print("Índice de Modulação de Frequência, mf = "+str(r.mf))
+
+    angulos = [r.tt0,r.tt1,r.tt2,r.tt3,r.tt4,pi,r.tt5,r.tt6,r.tt7,r.tt8]
+    str_angulos = ", ".join([str(radParaGraus(a)) for a in angulos])
+    print("Ângulos das mudanças de estado:\n    "+str_angulos)
+
+    chaveamentos = [r.chA, r.chB, r.chC, r.chD, r.chE, r.chF]
+    str_chaveamentos = ", ".join([str(int(c)) for c in chaveamentos])
+    print("Número de ciclos em cada intervalo (A a F):\n    "+str_chaveamentos)
+
+    def linha(rotulo, nome):
+        print(rotulo+" = "+'{0:.2f}'.format(p[nome])+" W. Imed = " \
+                                                    +str(im[nome]))
+    print("Perdas nas chaves:")
+    linha("    S1 Q ", "S1Q")
+    linha("       D ", "S1D")
+    linha("    S2 Q ", "S2Q")
+    linha("       D ", "S2D")
+    linha("    S3 Q ", "S3Q")
+    linha("       D ", "S3D")
+    linha("    S4 Q ", "S4Q")
+    linha("       D ", "S4D")
+    print(" Chave bidirecional com ponte de diodos:")
+    linha("    S5 Q ", "S5pQ")
+    linha("       Dp", "S5pDp")
+    linha("       Dn", "S5pDn")
+    linha("    S6 Q ", "S6pQ")
+    linha("       Dp", "S6pDp")
+    linha("       Dn", "S6pDn")
+    print(" Chave bidirecional em anti-série:")
+    linha("    S5 Qp", "S5sQp")
+    linha("       Qn", "S5sQn")
+    linha("       Dp", "S5sDp")
+    linha("       Dn", "S5sDn")
+    linha("    S6 Qp", "S6sQp")
+    linha("       Qn", "S6sQn")
+    linha("       Dp", "S6sDp")
+    linha("       Dn", "S6sDn")
+
+    print("\n")
+    print("perdas (ponte) = "+str(r.perdasW_bidir_ponte)+" W")
+    print("perdas (série) = "+str(r.perdasW_bidir_2ch)+" W")
+
+    print("Potencia Total das fontes = "+str(r.potencia_saida)+" W")
+    print("Potencia De saída (ponte) = " \
+                             +str(r.potencia_saida-r.perdasW_bidir_ponte)+" W")
+    print("Potencia De saída (série) = " \
+                             +str(r.potencia_saida-r.perdasW_bidir_2ch)+" W")
+
+    print("Topologia com chave bidirecional em ponte de diodo")
+    print("    Rendimento = "+'{0:.2f}'.format(r.rend_ponte)+" %")
+    print("Topologia com chave bidirecional em anti-série")
+    print("    Rendimento = "+'{0:.2f}'.format(r.rend_2ch)  +" %")
+
+if __name__ == "__main__":
+    cfg = Configuracao(V1=V1, V2=V2, Ar=Ar, Ief=Ief, I_def=I_def,
+                       fr=fr, fp=fp)
+    avisos = validaEntradas(cfg)
+    geo = Geometria(cfg)
+    ciclos = calculaCiclos(cfg, geo)
+    imprimeResultados(cfg, ciclos, resumeCiclos(cfg, geo, ciclos, avisos))
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+###########################################################################
+# Cálculo de perdas da topologia sete níveis (calculo_perdas.py) em       #
+# estágios memorizados, para varreduras que alteram poucas entradas.      #
+#                                                                         #
+#   geometria (V1, V2, Ar, fr, fp): Geometria, ângulos e intervalos dos   #
+#             ciclos, tensão de referência, razão cíclica d e tensão de   #
+#             bloqueio                                                    #
+#   sentido   (+ I_def, fat_crista): forma de onda da corrente, seu       #
+#             sentido, estado e tempo ativo de cada chave em cada ciclo   #
+#   corrente  (+ Ief): módulo da corrente, correntes médias e eficazes    #
+#             de cada chave e potência de saída                           #
+#   curvas    (+ cada curva do modelo dos componentes): perda somada de   #
+#             cada chave devida à curva                                   #
+#   agregação : perdas totais e rendimentos (resumeSomas), não            #
+#             memorizada por ser barata                                   #
+#                                                                         #
+# Cada estágio é guardado pelo valor das entradas de que depende: mudar   #
+# Ief reaproveita geometria e sentido, e trocar o modelo dos componentes  #
+# reaproveita também a corrente e as curvas que não mudaram. As somas     #
+# por chave são feitas como produtos de matrizes pequenas (tempo ativo x  #
+# perda de cada curva), sem montar a matriz de perdas de cada ciclo; os   #
+# resultados diferem dos de calcular_perdas (modo "ciclos") apenas por    #
+# arredondamento.                                                         #
+###########################################################################
+
+# Habilita resultado real da divisão (e não apenas parte inteira)
+from __future__ import division
+
+import collections
+
+import numpy
+
+import calculo_perdas
+
+# Entradas de que depende cada estágio (além das do estágio anterior).
+ENTRADAS_GEOMETRIA = ("V1", "V2", "Ar", "fr", "fp")
+ENTRADAS_SENTIDO = ("I_def", "fat_crista")
+ENTRADAS_CORRENTE = ("Ief",)
+
+class _Memoria(object):
+    """Memória de tamanho limitado que descarta o item usado há mais tempo"""
+    def __init__(self, tamanho):
+        self.tamanho = tamanho
+        self.itens = collections.OrderedDict()
+        self.acertos = 0
+        self.faltas = 0
+
+    def obtem(self, chave, calcula):
+        """Retorna o item de "chave", calculando-o com calcula() se ausente"""
+        if chave in self.itens:
+            self.acertos += 1
+            # Reinsere o item para marcá-lo como usado mais recentemente.
+            item = self.itens[chave] = self.itens.pop(chave)
+            return item
+        self.faltas += 1
+        item = self.itens[chave] = calcula()
+        while len(self.itens) > self.tamanho:
+            self.itens.popitem(last=False)
+        return item
+
+class GrafoCalculo(object):
+    """
+    Estágios do cálculo de perdas com resultados intermediários
+    memorizados, para a TabelaEstados "tabela". "tamanhos" é o número de
+    itens guardados de cada estágio (geometria, sentido, corrente,
+    curvas); os três primeiros guardam vetores com um elemento por
+    ciclo de chaveamento.
+    Sem modelo dos componentes, é usado ModeloPerdas(), com as curvas
+    definidas em calculo_perdas.
+    """
+    def __init__(self, tabela=None, tamanhos=(4, 8, 64, 4096)):
+        self.tabela = calculo_perdas.TABELA_7NIVEIS if tabela is None \
+                      else tabela
+        self._memorias = collections.OrderedDict(
+            (nome, _Memoria(t)) for nome, t in
+            zip(("geometria", "sentido", "corrente", "curvas"), tamanhos))
+        self._padrao = calculo_perdas.ModeloPerdas()
+        # Curvas já usadas, mantidas para que seus ids não sejam reusados.
+        self._curvas = {}
+        self._linhas = numpy.arange(len(self.tabela.dispositivos))
+
+    def _chave(self, cfg, *entradas):
+        return tuple(getattr(cfg, n) for grupo in entradas for n in grupo)
+
+    def geometria(self, cfg):
+        """
+        Estágio de geometria: dicionário com "geo" (Geometria), "angulo",
+        "vref", "d", "vblock" e "estado_positivo" (estado de cada ciclo
+        com corrente positiva).
+        """
+        def calcula():
+            geo = calculo_perdas.Geometria(cfg)
+            angulo = calculo_perdas.angulosCiclos(geo.mf)
+            intervalo = calculo_perdas.classificaIntervalo(angulo, geo.theta)
+            vref, d, vblock = calculo_perdas.modulacao(cfg, angulo, intervalo)
+            positivo = numpy.ones(len(angulo), dtype=bool)
+            return {"geo": geo, "angulo": angulo, "vref": vref, "d": d,
+                    "vblock": abs(vblock),
+                    "estado_positivo": self.tabela.estado(intervalo,
+                                                          positivo)}
+        return self._memorias["geometria"].obtem(
+            self._chave(cfg, ENTRADAS_GEOMETRIA), calcula)
+
+    def sentido(self, cfg):
+        """
+        Estágio de sentido da corrente: dicionário com "forma" (corrente
+        de 1 A eficaz), "ativo" e "comuta" (tempo ativo e comutação de
+        cada chave em cada ciclo), "ativo2" (ativo**2) e "comuta_vblock"
+        (soma de comuta*vblock de cada chave), que não dependem de Ief
+        (para Ief > 0).
+        """
+        def calcula():
+            g = self.geometria(cfg)
+            forma = calculo_perdas.formaDeOndaCorrente(
+                g["angulo"], cfg.I_def, cfg.fat_crista)
+            i = cfg.Ief * forma
+            # Coluna de corrente negativa é a seguinte à de corrente
+            # positiva (ver TabelaEstados.coluna).
+            estado = g["estado_positivo"] + (i < 0)
+            ativo = self.tabela.tempoAtivo(estado, g["d"])
+            comuta = numpy.take(self.tabela.comuta, estado, axis=1)
+            return {"forma": forma, "ativo": ativo, "ativo2": ativo**2,
+                    "comuta": comuta,
+                    "comuta_vblock": numpy.dot(comuta, g["vblock"])}
+        return self._memorias["sentido"].obtem(
+            self._chave(cfg, ENTRADAS_GEOMETRIA, ENTRADAS_SENTIDO) +
+            (cfg.Ief > 0,), calcula)
+
+    def corrente(self, cfg):
+        """
+        Estágio de corrente: dicionário com "iabs", correntes médias e
+        eficazes de cada chave e potência de saída.
+        """
+        def calcula():
+            g = self.geometria(cfg)
+            s = self.sentido(cfg)
+            i = cfg.Ief * s["forma"]
+            iabs = abs(i)
+            N = len(i)
+            return {"iabs": iabs,
+                    "correntes": numpy.dot(s["ativo"], iabs) / N,
+                    "correntes_rms": numpy.sqrt(numpy.dot(s["ativo2"],
+                                                          iabs**2) / N),
+                    "potencia_saida": calculo_perdas.media(g["vref"]*i)}
+        return self._memorias["corrente"].obtem(
+            self._chave(cfg, ENTRADAS_GEOMETRIA, ENTRADAS_SENTIDO,
+                        ENTRADAS_CORRENTE), calcula)
+
+    def curva(self, cfg, curva, matriz, *argumentos):
+        """
+        Estágio de curvas: vetor com a soma, em cada chave, de "matriz"
+        ("ativo" ou "comuta", ver sentido) vezes a perda de cada ciclo
+        dada por curva(iabs, *argumentos).
+        """
+        self._curvas.setdefault(id(curva), curva)
+        def calcula():
+            perda = curva(self.corrente(cfg)["iabs"], *argumentos)
+            return numpy.dot(self.sentido(cfg)[matriz], perda)
+        return self._memorias["curvas"].obtem(
+            self._chave(cfg, ENTRADAS_GEOMETRIA, ENTRADAS_SENTIDO,
+                        ENTRADAS_CORRENTE) + (id(curva), matriz), calcula)
+
+    def perdas(self, cfg, modelo=None):
+        """
+        Vetor com a perda somada (J por ciclo da referência) de cada
+        chave, para o ModeloPerdas "modelo".
+        """
+        m = self._padrao if modelo is None else modelo
+        s = self.sentido(cfg)
+        # Uma linha por tipo de TIPOS_PERDA, como em ModeloPerdas.perdas;
+        # as perdas de comutação dos diodos são proporcionais a vblock.
+        conducao = numpy.array(
+            [self.curva(cfg, m.conducaoQ, "ativo", cfg.fp),
+             self.curva(cfg, m.conducaoD, "ativo", cfg.fp),
+             self.curva(cfg, m.conducaoDPonte, "ativo", cfg.fp)])
+        comutacao = numpy.array(
+            [self.curva(cfg, m.chaveamentoQ, "comuta"),
+             s["comuta_vblock"] * m.Qrr,
+             s["comuta_vblock"] * m.trr * m.irr / 2])
+        tipo = self.tabela.tipo
+        return conducao[tipo, self._linhas] + comutacao[tipo, self._linhas]
+
+    def calcular(self, config=None, modelo=None):
+        """Como calcular_perdas no modo "ciclos", reaproveitando estágios"""
+        cfg = calculo_perdas.Configuracao() if config is None else config
+        avisos = calculo_perdas.validaEntradas(cfg, [])
+        somas = self.perdas(cfg, modelo)
+        c = self.corrente(cfg)
+        d = self.tabela.dispositivos
+        return calculo_perdas.resumeSomas(
+            cfg, self.geometria(cfg)["geo"], dict(zip(d, somas)),
+            dict(zip(d, c["correntes"])), c["potencia_saida"], avisos,
+            correntes_rms=dict(zip(d, c["correntes_rms"])),
+            tabela=self.tabela)
+
+    def estatisticas(self):
+        """Acertos e faltas de cada estágio"""
+        return dict((nome, {"acertos": m.acertos, "faltas": m.faltas})
+                    for nome, m in self._memorias.items())
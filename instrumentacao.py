@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+###########################################################################
+# Instrumentação dos estágios do cálculo de perdas da topologia sete      #
+# níveis (calculo_perdas.py).                                             #
+#                                                                         #
+# Dentro de um bloco "with Instrumentacao() as inst:", as funções de      #
+# cada estágio (ESTAGIOS) são substituídas, em calculo_perdas, por        #
+# versões que registram número de chamadas, tempo, vetores alocados nos   #
+# resultados e chamadas de interpolação. Ao sair do bloco, as funções     #
+# originais são restauradas; fora dele não há custo algum.                #
+#                                                                         #
+# O relatório (inst.relatorio()) é um objeto com os totais por estágio;   #
+# opcionalmente, cada chamada é gravada em um arquivo de rastro no        #
+# formato "Trace Event" (JSON), aberto por chrome://tracing ou Perfetto.  #
+# Apenas o processo atual é instrumentado (ex.: varrer com processos=1).  #
+###########################################################################
+
+# Habilita resultado real da divisão (e não apenas parte inteira)
+from __future__ import division
+
+import collections
+import json
+import os
+import threading
+import timeit
+
+import numpy
+
+import calculo_perdas
+
+# Estágios instrumentados: (nome, objeto, atributo). Os tempos são
+# inclusivos (um estágio inclui os que ele chama); o tempo próprio
+# desconta os estágios chamados.
+ESTAGIOS = (
+    ("validacao",        calculo_perdas, "validaEntradas"),
+    ("geometria",        calculo_perdas, "Geometria"),
+    ("arredondamento",   calculo_perdas, "arredondaAngulo"),
+    ("angulos",          calculo_perdas, "angulosCiclos"),
+    ("intervalos",       calculo_perdas, "classificaIntervalo"),
+    ("modulacao",        calculo_perdas, "modulacao"),
+    ("corrente",         calculo_perdas, "corrente"),
+    ("perdas_componentes", calculo_perdas, "perdasDispositivos"),
+    ("perdaConducaoQ",   calculo_perdas, "perdaConducaoQ"),
+    ("perdaChaveamentoQ", calculo_perdas, "perdaChaveamentoQ"),
+    ("perdaConducaoD",   calculo_perdas, "perdaConducaoD"),
+    ("perdaChaveamentoD", calculo_perdas, "perdaChaveamentoD"),
+    ("perdaConducaoDPonte", calculo_perdas, "perdaConducaoDPonte"),
+    ("perdaChaveamentoDPonte", calculo_perdas, "perdaChaveamentoDPonte"),
+    ("estados",          calculo_perdas.TabelaEstados, "estado"),
+    ("acumulacao",       calculo_perdas.TabelaEstados, "aplica"),
+    ("trechos",          calculo_perdas, "trechosCiclos"),
+    ("analitico",        calculo_perdas, "calculaAnalitico"),
+    ("resumo",           calculo_perdas, "resumeCiclos"),
+    ("totais",           calculo_perdas, "resumeSomas"),
+    ("relatorio",        calculo_perdas, "imprimeResultados"),
+)
+
+# Funções de interpolação contadas: (nome, objeto, atributo, posição do
+# argumento com os pontos interpolados).
+INTERPOLACOES = (
+    ("interpolar",       calculo_perdas, "interpolar", 0),
+    ("chaveamentoTabela", calculo_perdas.ChaveamentoTabela, "energia", 1),
+)
+
+# Instrumentação ativa (apenas uma por vez).
+_ativa = None
+_trava = threading.Lock()
+
+def _vetores(valor):
+    """
+    Retorna (número, bytes) dos vetores numpy com memória própria (não
+    vistas de outros vetores) contidos em "valor"
+    """
+    if isinstance(valor, numpy.ndarray):
+        return (1, valor.nbytes) if valor.base is None else (0, 0)
+    if isinstance(valor, dict):
+        valor = list(valor.values())
+    if isinstance(valor, (tuple, list)):
+        n = b = 0
+        for item in valor:
+            ni, bi = _vetores(item)
+            n += ni
+            b += bi
+        return n, b
+    return 0, 0
+
+class RelatorioInstrumentacao(object):
+    """
+    Resultado da instrumentação.
+    tempo_s     : tempo total (s) dentro do bloco "with"
+    estagios    : {estágio: {"chamadas", "tempo_s", "tempo_proprio_s",
+                  "vetores", "bytes"}}, apenas dos estágios chamados;
+                  "vetores" e "bytes" contam os vetores com memória
+                  própria retornados pelo estágio
+    interpolacoes : {função: {"chamadas", "pontos"}}
+    """
+    __slots__ = ("tempo_s", "estagios", "interpolacoes")
+
+    def __init__(self, tempo_s, estagios, interpolacoes):
+        self.tempo_s = tempo_s
+        self.estagios = estagios
+        self.interpolacoes = interpolacoes
+
+    def comoDicionario(self):
+        return {"tempo_s": self.tempo_s, "estagios": self.estagios,
+                "interpolacoes": self.interpolacoes}
+
+    def tabela(self):
+        """Texto com uma linha por estágio, em ordem decrescente de tempo"""
+        linhas = ["%-24s %9s %12s %12s %9s %12s" % (
+            "estágio", "chamadas", "tempo (ms)", "próprio (ms)", "vetores",
+            "kB")]
+        for nome, e in sorted(self.estagios.items(),
+                              key=lambda item: -item[1]["tempo_s"]):
+            linhas.append("%-24s %9d %12.3f %12.3f %9d %12.1f" % (
+                nome, e["chamadas"], e["tempo_s"]*1e3,
+                e["tempo_proprio_s"]*1e3, e["vetores"], e["bytes"]/1024))
+        for nome, c in sorted(self.interpolacoes.items()):
+            linhas.append("interpolação %-11s %9d chamadas, %d pontos" % (
+                nome, c["chamadas"], c["pontos"]))
+        linhas.append("total: %.3f ms" % (self.tempo_s*1e3))
+        return "\n".join(linhas)
+
+    def __repr__(self):
+        return "RelatorioInstrumentacao(tempo_s=%g, %d estágios)" % (
+            self.tempo_s, len(self.estagios))
+
+class Instrumentacao(object):
+    """
+    Contexto que instrumenta os ESTAGIOS de calculo_perdas. Se
+    "arquivo" for fornecido, cada chamada é registrada e gravada nele,
+    ao sair do bloco, como rastro "Trace Event".
+    """
+    def __init__(self, arquivo=None, estagios=ESTAGIOS,
+                 interpolacoes=INTERPOLACOES):
+        self.arquivo = arquivo
+        self.estagios = estagios
+        self.interpolacoes = interpolacoes
+        self._relogio = timeit.default_timer
+        self._originais = []
+        self._totais = collections.OrderedDict()
+        self._contagens = collections.OrderedDict()
+        self._eventos = [] if arquivo is not None else None
+        # Tempo dos estágios chamados por cada estágio em execução.
+        self._pilha = []
+        self._inicio = self._fim = None
+
+    def _estagio(self, nome, funcao):
+        totais = self._totais.setdefault(nome, {
+            "chamadas": 0, "tempo_s": 0.0, "tempo_proprio_s": 0.0,
+            "vetores": 0, "bytes": 0})
+        relogio, pilha, eventos = self._relogio, self._pilha, self._eventos
+        inicio_bloco = self._inicio
+
+        def instrumentada(*args, **kwargs):
+            pilha.append(0.0)
+            inicio = relogio()
+            try:
+                resultado = funcao(*args, **kwargs)
+            finally:
+                tempo = relogio() - inicio
+                filhos = pilha.pop()
+                if pilha:
+                    pilha[-1] += tempo
+                totais["chamadas"] += 1
+                totais["tempo_s"] += tempo
+                totais["tempo_proprio_s"] += tempo - filhos
+                if eventos is not None:
+                    eventos.append({"name": nome, "ph": "X",
+                                    "pid": os.getpid(), "tid": 0,
+                                    "ts": (inicio - inicio_bloco)*1e6,
+                                    "dur": tempo*1e6})
+            n, b = _vetores(resultado)
+            totais["vetores"] += n
+            totais["bytes"] += b
+            return resultado
+        instrumentada.__name__ = getattr(funcao, "__name__", nome)
+        instrumentada.__doc__ = funcao.__doc__
+        return instrumentada
+
+    def _interpolacao(self, nome, funcao, posicao):
+        contagem = self._contagens.setdefault(nome, {"chamadas": 0,
+                                                     "pontos": 0})
+        def contada(*args, **kwargs):
+            contagem["chamadas"] += 1
+            contagem["pontos"] += numpy.size(args[posicao])
+            return funcao(*args, **kwargs)
+        contada.__name__ = getattr(funcao, "__name__", nome)
+        contada.__doc__ = funcao.__doc__
+        return contada
+
+    def __enter__(self):
+        global _ativa
+        with _trava:
+            if _ativa is not None:
+                raise RuntimeError("Já existe instrumentação ativa")
+            _ativa = self
+        self._inicio = self._relogio()
+        try:
+            for nome, objeto, atributo, posicao in self.interpolacoes:
+                original = vars(objeto)[atributo]
+                self._originais.append((objeto, atributo, original))
+                setattr(objeto, atributo,
+                        self._interpolacao(nome, original, posicao))
+            for nome, objeto, atributo in self.estagios:
+                original = vars(objeto)[atributo]
+                self._originais.append((objeto, atributo, original))
+                setattr(objeto, atributo, self._estagio(nome, original))
+        except Exception:
+            self._restaura()
+            raise
+        return self
+
+    def _restaura(self):
+        global _ativa
+        while self._originais:
+            objeto, atributo, original = self._originais.pop()
+            setattr(objeto, atributo, original)
+        _ativa = None
+
+    def __exit__(self, tipo, valor, rastro):
+        self._fim = self._relogio()
+        self._restaura()
+        if self.arquivo is not None:
+            with open(self.arquivo, "w") as arquivo:
+                json.dump({"traceEvents": self._eventos,
+                           "displayTimeUnit": "ms",
+                           "otherData": self.relatorio().comoDicionario()},
+                          arquivo)
+
+    def relatorio(self):
+        """Retorna RelatorioInstrumentacao com os totais até o momento"""
+        fim = self._relogio() if self._fim is None else self._fim
+        return RelatorioInstrumentacao(
+            fim - self._inicio,
+            dict((n, dict(t)) for n, t in self._totais.items()
+                 if t["chamadas"]),
+            dict((n, dict(c)) for n, c in self._contagens.items()))
+
+def perfil(config=None, modo="ciclos", arquivo=None, imprime=False):
+    """
+    Calcula um ponto de operação (como calcular_perdas) com
+    instrumentação. Com "imprime", também imprime o relatório do
+    cálculo (imprimeResultados, modo "ciclos"). Retorna (Resultado,
+    RelatorioInstrumentacao).
+    """
+    cfg = calculo_perdas.Configuracao() if config is None else config
+    with Instrumentacao(arquivo) as inst:
+        if imprime and modo == "ciclos":
+            c = calculo_perdas
+            avisos = c.validaEntradas(cfg)
+            geo = c.Geometria(cfg)
+            ciclos = c.calculaCiclos(cfg, geo)
+            r = c.resumeCiclos(cfg, geo, ciclos, avisos)
+            c.imprimeResultados(cfg, ciclos, r)
+        else:
+            r = calculo_perdas.calcular_perdas(cfg, modo)
+    return r, inst.relatorio()
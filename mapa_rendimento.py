@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+###########################################################################
+# Mapa pré-calculado de rendimento e perdas da topologia sete níveis      #
+# (calculo_perdas.py) em função de Ief, I_def e Ar.                       #
+#                                                                         #
+# O mapa é calculado uma vez sobre uma grade densa (com varredura.py) e   #
+# gravado como um arquivo .npy, que pode ser mapeado em memória, e um     #
+# cabeçalho .json com os eixos. Consultas interpolam linearmente lotes    #
+# de pontos em todos os eixos de uma só vez.                              #
+###########################################################################
+
+# Habilita resultado real da divisão (e não apenas parte inteira)
+from __future__ import division
+
+import json
+import os
+
+import numpy
+
+import calculo_perdas
+import varredura
+
+###########################################################################
+# DEFINIÇÃO DOS EIXOS E SAÍDAS                                            #
+###########################################################################
+# Eixos do mapa, na ordem das dimensões do arquivo .npy (mesma ordem de
+# Configuracao, usada pela varredura).
+EIXOS = ("Ar", "Ief", "I_def")
+
+# Saídas guardadas para cada ponto da grade; perdas em W, rendimentos em
+# % e potência de saída em W.
+SAIDAS = (("rend_ponte", "rend_2ch", "perdasW_bidir_ponte",
+           "perdasW_bidir_2ch", "potencia_saida") +
+          tuple("perdaW_" + n for n in calculo_perdas.DISPOSITIVOS))
+
+# Rendimentos e as perdas totais a partir das quais são recalculados.
+RENDIMENTOS = {"rend_ponte": "perdasW_bidir_ponte",
+               "rend_2ch":   "perdasW_bidir_2ch"}
+
+###########################################################################
+# GERAÇÃO DO MAPA                                                         #
+###########################################################################
+def geraMapa(destino, Ar, Ief, I_def, base=None, modo="ciclos",
+             processos=None, n_verificacao=64, semente=0):
+    """
+    Calcula o mapa sobre a grade Ar x Ief x I_def e grava em "destino"
+    (diretório) os arquivos mapa.npy e mapa.json. Demais entradas vêm da
+    Configuracao "base". O cálculo é feito por varredura.varrer, e pode
+    ser retomado se interrompido; se "destino" tiver uma varredura de
+    outra grade, base ou modo, ela é descartada e recalculada.
+    Ao final, "n_verificacao" pontos sorteados fora dos nós da grade são
+    calculados exatamente e o erro de interpolação é gravado no
+    cabeçalho. Retorna o MapaRendimento gerado.
+    """
+    base = calculo_perdas.Configuracao() if base is None else base
+    eixos = dict((n, [getattr(base, n)])
+                 for n in ("V1", "V2", "fr", "fp", "fat_crista"))
+    valores = [numpy.asarray(v, dtype=float) for v in (Ar, Ief, I_def)]
+    for nome, v in zip(EIXOS, valores):
+        if len(v) > 1 and numpy.any(numpy.diff(v) <= 0):
+            raise ValueError("Eixo " + nome + " deve ser crescente")
+        eixos[nome] = list(v)
+
+    pasta = os.path.join(destino, "varredura")
+    try:
+        varredura.varrer(eixos, pasta, processos=processos, modo=modo)
+    except varredura.VarreduraDiferente:
+        varredura.descartaVarredura(pasta)
+        varredura.varrer(eixos, pasta, processos=processos, modo=modo)
+    colunas = varredura.carregaVarredura(pasta)
+
+    forma = tuple(len(v) for v in valores)
+    dados = numpy.empty(forma + (len(SAIDAS),))
+    for k, nome in enumerate(SAIDAS):
+        dados[..., k] = colunas[nome].reshape(forma)
+    numpy.save(os.path.join(destino, "mapa.npy"), dados)
+
+    cabecalho = {"eixos": dict((n, list(v)) for n, v in zip(EIXOS, valores)),
+                 "saidas": list(SAIDAS), "modo": modo,
+                 "base": dict((n, getattr(base, n))
+                              for n in calculo_perdas.ENTRADAS)}
+    # A forma de onda é guardada por seus parâmetros (ver formaDeParametros).
+    cabecalho["base"]["forma"] = calculo_perdas.parametrosForma(
+        base.fat_crista)
+    with open(os.path.join(destino, "mapa.json"), "w") as arquivo:
+        json.dump(cabecalho, arquivo, indent=1)
+
+    mapa = MapaRendimento(destino)
+    if n_verificacao:
+        cabecalho["erro_interpolacao"] = mapa.verifica(n_verificacao, semente)
+        with open(os.path.join(destino, "mapa.json"), "w") as arquivo:
+            json.dump(cabecalho, arquivo, indent=1)
+        mapa.erro_interpolacao = cabecalho["erro_interpolacao"]
+    return mapa
+
+###########################################################################
+# CONSULTA AO MAPA                                                        #
+###########################################################################
+class MapaRendimento(object):
+    """
+    Mapa gravado por geraMapa, com os dados mapeados em memória.
+    """
+    def __init__(self, destino):
+        with open(os.path.join(destino, "mapa.json")) as arquivo:
+            cabecalho = json.load(arquivo)
+        self.eixos = [numpy.array(cabecalho["eixos"][n]) for n in EIXOS]
+        self.saidas = tuple(cabecalho["saidas"])
+        self.modo = cabecalho["modo"]
+        base = dict(cabecalho["base"])
+        forma = calculo_perdas.formaDeParametros(
+            base.pop("forma", {"senoide": True}))
+        self.base = calculo_perdas.Configuracao(fat_crista=forma, **base)
+        self.erro_interpolacao = cabecalho.get("erro_interpolacao")
+        self.dados = numpy.load(os.path.join(destino, "mapa.npy"),
+                                mmap_mode="r")
+        # Deslocamentos dos 2**n vértices da célula de interpolação, nos
+        # eixos com mais de um valor.
+        n = len(EIXOS)
+        self._vertices = [[(v >> e) & 1 if len(self.eixos[e]) > 1 else 0
+                           for e in range(n)] for v in range(2**n)]
+        self._vertices = [list(v) for v in
+                          sorted(set(tuple(v) for v in self._vertices))]
+
+    def consulta(self, Ar, Ief, I_def, saidas=None):
+        """
+        Interpola o mapa nos pontos (Ar, Ief, I_def), escalares ou vetores
+        de mesmo tamanho. Pontos fora da grade são limitados às bordas.
+        Retorna dicionário de vetores indexado pelas "saidas" pedidas
+        (padrão: todas).
+        Os rendimentos não são interpolados diretamente, pois variam
+        bruscamente quando a potência de saída tende a zero (I_def perto
+        de +-pi/2); são recalculados a partir da potência de saída e das
+        perdas interpoladas.
+        """
+        nomes = self.saidas if saidas is None else tuple(saidas)
+        pedidas = [n for n in nomes if n not in RENDIMENTOS]
+        for n in nomes:
+            if n in RENDIMENTOS:
+                pedidas += ["potencia_saida", RENDIMENTOS[n]]
+        pontos = numpy.broadcast_arrays(*[numpy.atleast_1d(
+            numpy.asarray(v, dtype=float)) for v in (Ar, Ief, I_def)])
+        # Célula da grade (índice do vértice inferior) e posição relativa
+        # dentro da célula, em cada eixo.
+        indices, frac = [], []
+        for eixo, x in zip(self.eixos, pontos):
+            if len(eixo) == 1:
+                indices.append(numpy.zeros(x.shape, dtype=int))
+                frac.append(numpy.zeros(x.shape))
+                continue
+            x = numpy.clip(x, eixo[0], eixo[-1])
+            k = numpy.clip(numpy.searchsorted(eixo, x, side="right") - 1,
+                           0, len(eixo) - 2)
+            indices.append(k)
+            frac.append((x - eixo[k]) / (eixo[k+1] - eixo[k]))
+
+        pedidas = sorted(set(pedidas), key=self.saidas.index)
+        colunas = [self.saidas.index(n) for n in pedidas]
+        resultado = 0
+        for desloc in self._vertices:
+            peso = numpy.ones(pontos[0].shape)
+            for f, e in zip(frac, desloc):
+                peso *= f if e else 1 - f
+            valores = self.dados[tuple(k + e for k, e in zip(indices, desloc))]
+            resultado = resultado + peso[:, None] * valores[:, colunas]
+        valores = dict((n, resultado[:, j]) for j, n in enumerate(pedidas))
+        for n in nomes:
+            if n in RENDIMENTOS:
+                p = valores["potencia_saida"]
+                valores[n] = (p - valores[RENDIMENTOS[n]]) / p * 100
+        return dict((n, valores[n]) for n in nomes)
+
+    def verifica(self, n=64, semente=0):
+        """
+        Compara a interpolação com o cálculo exato em "n" pontos sorteados
+        dentro da grade. Retorna, para cada saída, o erro absoluto máximo
+        e médio entre os pontos válidos.
+        """
+        sorteio = numpy.random.RandomState(semente)
+        pontos = [sorteio.uniform(e[0], e[-1], n) for e in self.eixos]
+        interpolado = self.consulta(*pontos)
+        exato = dict((s, numpy.full(n, numpy.nan)) for s in self.saidas)
+        for j in range(n):
+            cfg = self.base.substitui(**dict((nome, float(p[j]))
+                                             for nome, p in zip(EIXOS, pontos)))
+            if calculo_perdas.validaEntradas(cfg, []):
+                continue
+            r = calculo_perdas.calcular_perdas(cfg, self.modo)
+            for s in self.saidas:
+                exato[s][j] = (r.perdas[s[7:]] * cfg.fr
+                               if s.startswith("perdaW_") else getattr(r, s))
+        erro = {}
+        for s in self.saidas:
+            diferenca = numpy.abs(interpolado[s] - exato[s])
+            diferenca = diferenca[numpy.isfinite(diferenca)]
+            erro[s] = {"maximo": float(diferenca.max()) if len(diferenca)
+                                 else None,
+                       "medio": float(diferenca.mean()) if len(diferenca)
+                                else None}
+        return erro
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+###########################################################################
+# Análise de Monte Carlo das perdas e rendimentos da topologia sete       #
+# níveis (calculo_perdas.py) frente à dispersão dos componentes.          #
+#                                                                         #
+# Parâmetros sorteados: queda de tensão em condução (Vce(on)/Vf) de cada  #
+# tipo de dispositivo, Qrr dos diodos rápidos, trr e irr dos diodos da    #
+# ponte e tensões das fontes V1 e V2. As perdas de condução e de          #
+# chaveamento são proporcionais aos quatro primeiros, e são calculadas    #
+# uma única vez por amostra de V1 e V2; os ciclos de chaveamento de um    #
+# lote de amostras são concatenados em um único vetor. Os lotes são       #
+# distribuídos entre processos. Todas as amostras são sorteadas antes do  #
+# cálculo, a partir da semente, de forma que o resultado não depende do   #
+# número de processos.                                                    #
+###########################################################################
+
+# Habilita resultado real da divisão (e não apenas parte inteira)
+from __future__ import division
+
+import multiprocessing
+
+import numpy
+
+import calculo_perdas
+
+###########################################################################
+# PARÂMETROS SORTEADOS                                                    #
+###########################################################################
+# Desvio padrão relativo de cada parâmetro (distribuição normal).
+PARAMETROS = ("Vce_Q", "Vce_D", "Vce_DP", "Qrr", "trr", "irr", "V1", "V2")
+DESVIOS = {"Vce_Q":  0.05,  # Vce(on) das chaves
+           "Vce_D":  0.05,  # Vf dos diodos em antiparalelo
+           "Vce_DP": 0.05,  # Vf dos diodos da ponte
+           "Qrr":    0.15,  # perdaChaveamentoD
+           "trr":    0.10,  # perdaChaveamentoDPonte
+           "irr":    0.10,  # perdaChaveamentoDPonte
+           "V1":     0.02,
+           "V2":     0.02}
+
+# Percentis apresentados.
+PERCENTIS = (1, 5, 50, 95, 99)
+
+def sorteia(n, semente=0, desvios=None, distribuicao="normal"):
+    """
+    Sorteia "n" amostras dos PARAMETROS, como fatores relativos ao
+    valor nominal (1 = nominal). "desvios" substitui valores de DESVIOS;
+    na distribuição "uniforme", o desvio é a meia largura da faixa.
+    Retorna matriz (n, len(PARAMETROS)).
+    """
+    d = dict(DESVIOS)
+    d.update(desvios or {})
+    sorteio = numpy.random.RandomState(semente)
+    desvio = numpy.array([d[p] for p in PARAMETROS])
+    if distribuicao == "normal":
+        amostra = sorteio.standard_normal((n, len(PARAMETROS)))
+    elif distribuicao == "uniforme":
+        amostra = sorteio.uniform(-1, 1, (n, len(PARAMETROS)))
+    else:
+        raise ValueError("Distribuição desconhecida: " + str(distribuicao))
+    return 1 + amostra*desvio
+
+###########################################################################
+# CÁLCULO DE UM LOTE DE AMOSTRAS (EXECUTADO NOS PROCESSOS DE TRABALHO)    #
+###########################################################################
+def _partesLote(base, V1, V2, Ar, tabela, tabela_conducao):
+    """
+    Perdas de condução e de chaveamento (J por ciclo da referência) de
+    cada item de DISPOSITIVOS e potência de saída para vetores de V1,
+    V2 e Ar, com as demais entradas de "base". Retorna matrizes
+    (itens, amostras) e vetor de potências.
+    """
+    mf = base.fp/base.fr
+    angulo = calculo_perdas.angulosCiclos(mf)
+    n, N = len(V1), len(angulo)
+    V1, V2, Ar = [numpy.repeat(v, N) for v in (V1, V2, Ar)]
+    # Ângulos teóricos de mudança de estado de cada amostra (ver Geometria)
+    theta1 = numpy.arcsin(V1/Ar)
+    theta2 = numpy.arcsin(V2/Ar)
+    theta = (0, theta1, theta2, numpy.pi - theta2, numpy.pi - theta1,
+             numpy.pi + theta1, numpy.pi + theta2,
+             2*numpy.pi - theta2, 2*numpy.pi - theta1)
+    angulo = numpy.tile(angulo, n)
+    intervalo = calculo_perdas.classificaIntervalo(angulo, theta)
+    lote = base.substitui(V1=V1, V2=V2, Ar=Ar)
+    total = calculo_perdas.calculaPontos(lote, angulo, intervalo,
+                                         tabela=tabela)
+    conducao = calculo_perdas.calculaPontos(lote, angulo, intervalo,
+                                            tabela=tabela_conducao)
+    forma = (len(total["perdas"]), n, N)
+    soma_total = numpy.sum(total["perdas"].reshape(forma), axis=-1)
+    soma_conducao = numpy.sum(conducao["perdas"].reshape(forma), axis=-1)
+    potencia = calculo_perdas.media(total["POTENCIAINST"].reshape(n, N))
+    return soma_conducao, soma_total - soma_conducao, potencia
+
+def _calculaLote(tarefa):
+    """
+    Calcula um lote de amostras. Recebe (início do lote, Configuracao
+    base, matriz de amostras, TabelaEstados, Ar proporcional) e retorna
+    (início, perdas em W com uma linha por amostra e uma coluna por item
+    de DISPOSITIVOS, potência de saída, válido).
+    """
+    inicio, base, amostras, tabela, proporcional = tarefa
+    p = dict(zip(PARAMETROS, amostras.T))
+    V1, V2 = base.V1*p["V1"], base.V2*p["V2"]
+    Ar = base.Ar*(V1 + V2)/(base.V1 + base.V2) if proporcional \
+         else numpy.full(len(V1), float(base.Ar))
+    # Mesmos limites de validaEntradas.
+    valido = (V1 < V2) & (Ar <= V1 + V2) & (Ar > V2)
+
+    perdas = numpy.full((len(V1), len(tabela.dispositivos)), numpy.nan)
+    potencia = numpy.full(len(V1), numpy.nan)
+    if numpy.any(valido):
+        conducao, chaveamento, potencia[valido] = _partesLote(
+            base, V1[valido], V2[valido], Ar[valido], tabela,
+            tabela.semComutacao())
+        # Fatores de cada tipo de perda (ver TIPOS_PERDA): condução
+        # proporcional a Vce(on)/Vf; chaveamento dos diodos proporcional
+        # a Qrr e a trr*irr.
+        um = numpy.ones(int(valido.sum()))
+        fc = numpy.array([p["Vce_Q"], p["Vce_D"], p["Vce_DP"]])[:, valido]
+        fs = numpy.array([um, p["Qrr"][valido],
+                          (p["trr"]*p["irr"])[valido]])
+        perdas[valido] = ((fc[tabela.tipo]*conducao +
+                           fs[tabela.tipo]*chaveamento) * base.fr).T
+    return inicio, perdas, potencia, valido
+
+###########################################################################
+# ANÁLISE                                                                 #
+###########################################################################
+def _postos(x):
+    """Postos (ranks) ao longo do primeiro eixo, para correlação de Spearman"""
+    return numpy.argsort(numpy.argsort(x, axis=0, kind="mergesort"),
+                         axis=0).astype(float)
+
+def sensibilidades(amostras, saidas):
+    """
+    Correlação de postos (Spearman) entre cada parâmetro (colunas de
+    "amostras") e cada saída (colunas de "saidas"). Retorna matriz
+    (parâmetros, saídas).
+    """
+    a = _postos(amostras)
+    s = _postos(saidas)
+    a = (a - a.mean(axis=0)) / a.std(axis=0)
+    s = (s - s.mean(axis=0)) / s.std(axis=0)
+    return numpy.dot(a.T, s) / len(a)
+
+def monteCarlo(n=10000, config=None, semente=0, desvios=None,
+               distribuicao="normal", processos=None, tamanho_lote=64,
+               proporcional=True, tabela=None, percentis=PERCENTIS):
+    """
+    Sorteia "n" conjuntos de parâmetros (ver sorteia) em torno da
+    Configuracao "config" e calcula as perdas de cada um.
+    "processos" como em varredura.varrer. Com "proporcional", a
+    amplitude da referência Ar acompanha V1 + V2 (razão nominal
+    mantida); caso contrário Ar é fixo e amostras com V1 + V2 < Ar são
+    inválidas. Amostras inválidas têm resultados NaN.
+
+    Retorna dicionário com:
+    amostras      : matriz (n, PARAMETROS) de fatores sorteados
+    perdas        : matriz (n, itens da tabela) de perdas em W
+    potencia_saida, perdasW_bidir_ponte, perdasW_bidir_2ch, rend_ponte,
+    rend_2ch, pior_perda_ponte, pior_perda_2ch (maior perda entre os
+    dispositivos de cada variante): vetores
+    percentis     : {saída: {percentil: valor}}
+    sensibilidade : {saída: [(parâmetro, correlação), ...]}, em ordem
+                    decrescente de |correlação|; saídas incluem
+                    "perda_" + cada item da tabela
+    invalidas     : número de amostras inválidas
+    """
+    base = calculo_perdas.Configuracao() if config is None else config
+    tabela = calculo_perdas.TABELA_7NIVEIS if tabela is None else tabela
+    amostras = sorteia(n, semente, desvios, distribuicao)
+    tarefas = [(inicio, base, amostras[inicio:inicio + tamanho_lote],
+                tabela, proporcional)
+               for inicio in range(0, n, tamanho_lote)]
+
+    perdas = numpy.empty((n, len(tabela.dispositivos)))
+    potencia = numpy.empty(n)
+    valido = numpy.empty(n, dtype=bool)
+    def guarda(inicio, p, w, v):
+        perdas[inicio:inicio + len(w)] = p
+        potencia[inicio:inicio + len(w)] = w
+        valido[inicio:inicio + len(w)] = v
+
+    if processos == 1:
+        for tarefa in tarefas:
+            guarda(*_calculaLote(tarefa))
+    else:
+        pool = multiprocessing.Pool(processos)
+        try:
+            for resultado in pool.imap_unordered(_calculaLote, tarefas):
+                guarda(*resultado)
+        finally:
+            pool.close()
+            pool.join()
+
+    # Perdas totais, rendimentos e maior perda entre os itens da tabela
+    # usados em cada variante (ver multiplicidades).
+    saidas = {"potencia_saida": potencia}
+    for variante, m in calculo_perdas.multiplicidades(
+            tabela.dispositivos).items():
+        total = numpy.dot(perdas, m)
+        saidas["perdasW_bidir_" + variante] = total
+        with numpy.errstate(invalid="ignore"):
+            saidas["rend_" + variante] = (potencia - total) / potencia * 100
+        saidas["pior_perda_" + variante] = numpy.max(perdas[:, m > 0],
+                                                     axis=1)
+    for k, nome in enumerate(tabela.dispositivos):
+        saidas["perda_" + nome] = perdas[:, k]
+
+    nomes = sorted(saidas)
+    matriz = numpy.array([saidas[s][valido] for s in nomes]).T
+    percentil = numpy.percentile(matriz, percentis, axis=0) \
+                if len(matriz) else numpy.full((len(percentis),
+                                                len(nomes)), numpy.nan)
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        correlacao = sensibilidades(amostras[valido], matriz)
+    resultado = dict((s, v) for s, v in saidas.items()
+                     if not s.startswith("perda_"))
+    resultado.update({"amostras": amostras, "perdas": perdas,
+                      "invalidas": int(n - valido.sum()),
+                      "percentis": {}, "sensibilidade": {}})
+    for j, s in enumerate(nomes):
+        resultado["percentis"][s] = dict(zip(percentis, percentil[:, j]))
+        ordem = numpy.argsort(-numpy.nan_to_num(numpy.abs(correlacao[:, j])),
+                              kind="mergesort")
+        resultado["sensibilidade"][s] = [(PARAMETROS[k], correlacao[k, j])
+                                         for k in ordem]
+    return resultado
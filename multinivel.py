@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+###########################################################################
+# Cálculo de perdas da família de topologias de calculo_perdas.py com     #
+# qualquer número de fontes em série (5, 7, 9 ou mais níveis).            #
+#                                                                         #
+# Topologia: ponte H (S1 a S4) sobre a associação em série das fontes,    #
+# da inferior (nó 0) à superior (nó k), e uma chave bidirecional por nó   #
+# intermediário j em cada braço: S(3+2j) no braço esquerdo e S(4+2j) no   #
+# direito (com duas fontes, S5 e S6). Cada chave bidirecional existe nas  #
+# variantes em ponte de diodos ("p": Q, Dp, Dn) e em anti-série ("s": Qp, #
+# Qn, Dp, Dn), como em calculo_perdas.                                    #
+#                                                                         #
+# Os níveis de saída são as diferenças entre as tensões dos nós a que os  #
+# braços se conectam. A partir da lista de fontes são obtidos os níveis,  #
+# o par de nós de cada nível, a tabela de estados (TabelaEstados), os     #
+# ângulos de mudança de intervalo, a razão cíclica e a tensão de bloqueio #
+# de cada faixa entre níveis. A classificação dos ciclos em intervalos é  #
+# uma busca nos ângulos ordenados (numpy.searchsorted).                   #
+#                                                                         #
+# Com as fontes (V1, V2), os resultados são idênticos (bit a bit) aos de  #
+# calcular_perdas no modo "ciclos".                                       #
+###########################################################################
+
+# Habilita resultado real da divisão (e não apenas parte inteira)
+from __future__ import division
+
+import string
+from math import pi, asin
+
+import numpy
+
+import calculo_perdas
+
+###########################################################################
+# TOPOLOGIA                                                               #
+###########################################################################
+class TopologiaN(object):
+    """
+    Topologia com as fontes "fontes" (V), em série, da inferior para a
+    superior. Atributos principais:
+    niveis       : níveis positivos de saída, em ordem crescente
+    dispositivos : nomes das chaves e diodos
+    estados      : tabela de estados no formato de ESTADOS_7NIVEIS
+    tabela       : TabelaEstados correspondente
+    """
+    def __init__(self, fontes):
+        self.fontes = tuple(fontes)
+        k = len(self.fontes)
+        if k < 1 or min(self.fontes) <= 0:
+            raise ValueError("Fontes devem ter tensões positivas")
+
+        # Par de nós (esquerdo, direito) de cada nível positivo; entre
+        # pares de mesmo nível, o de nó direito mais baixo.
+        pares = {}
+        for b in range(k + 1):
+            for a in range(b + 1, k + 1):
+                nivel = sum(self.fontes[b:a])
+                if nivel not in pares:
+                    pares[nivel] = (a, b)
+        self.niveis = tuple(sorted(pares))
+        self.pares = tuple(pares[n] for n in self.niveis)
+
+        # Base e largura de cada faixa entre níveis consecutivos. A
+        # largura é a soma das fontes que entram menos a das que saem,
+        # de forma que, por exemplo, a faixa de V2 a V1 + V2 tem largura
+        # exatamente V1.
+        self.base = (0,) + self.niveis[:-1]
+        anterior = (0, 0)
+        larguras = []
+        for par in self.pares:
+            entra = [v for j, v in enumerate(self.fontes)
+                     if par[1] <= j < par[0] and
+                     not anterior[1] <= j < anterior[0]]
+            sai = [v for j, v in enumerate(self.fontes)
+                   if anterior[1] <= j < anterior[0] and
+                   not par[1] <= j < par[0]]
+            larguras.append(sum(entra) - sum(sai))
+            anterior = par
+        self.larguras = tuple(larguras)
+
+        # Rótulos dos intervalos: faixas positivas, depois negativas.
+        m = len(self.niveis)
+        letras = string.ascii_uppercase
+        if 2*m > len(letras):
+            raise ValueError("Número de níveis acima do suportado")
+        self.positivos = tuple(letras[:m])
+        self.negativos = tuple(letras[m:2*m])
+
+        self.dispositivos, self.tipos = self._dispositivos()
+        self.estados = self._estados()
+        self.tabela = calculo_perdas.TabelaEstados(
+            self.estados, self.tipos, self.dispositivos)
+
+    def _bidirecionais(self):
+        """Números das chaves bidirecionais (esquerda, direita) por nó"""
+        return [(3 + 2*j, 4 + 2*j) for j in range(1, len(self.fontes))]
+
+    def _dispositivos(self):
+        nomes = ["S1Q", "S1D", "S2Q", "S2D", "S3Q", "S3D", "S4Q", "S4D"]
+        tipos = dict((n, n[-1]) for n in nomes)
+        numeros = [s for par in self._bidirecionais() for s in par]
+        for s in numeros:
+            for sufixo, tipo in (("pQ", "Q"), ("pDp", "DP"), ("pDn", "DP")):
+                nomes.append("S%d%s" % (s, sufixo))
+                tipos[nomes[-1]] = tipo
+        for s in numeros:
+            for sufixo, tipo in (("sQp", "Q"), ("sQn", "Q"),
+                                 ("sDp", "D"), ("sDn", "D")):
+                nomes.append("S%d%s" % (s, sufixo))
+                tipos[nomes[-1]] = tipo
+        return tuple(nomes), tipos
+
+    def conduzem(self, par, i_positivo):
+        """
+        Dispositivos em condução com os braços nos nós "par" (esquerdo,
+        direito) e a corrente no sentido dado (positiva: sai do braço
+        esquerdo e entra no direito)
+        """
+        topo = len(self.fontes)
+        esquerdo, direito = par
+        Q, D = ("Q", "D") if i_positivo else ("D", "Q")
+        nomes = []
+        for no, lado in ((esquerdo, 0), (direito, 1)):
+            if no == topo:
+                nomes.append(("S1" + Q) if lado == 0 else ("S2" + D))
+            elif no == 0:
+                nomes.append(("S4" + D) if lado == 0 else ("S3" + Q))
+            else:
+                s = self._bidirecionais()[no - 1][lado]
+                sentido = "p" if i_positivo else "n"
+                nomes += ["S%dpQ" % s, "S%dpD%s" % (s, sentido),
+                          "S%dsQ%s" % (s, sentido), "S%dsD%s" % (s, sentido)]
+        return nomes
+
+    def _estados(self):
+        """
+        Tabela de estados: em cada faixa, o nível superior é aplicado
+        durante a fração d do período e o inferior durante 1-d.
+        """
+        estados = {}
+        zero = (0, 0)
+        pares = (zero,) + self.pares
+        for k in range(len(self.niveis)):
+            inferior, superior = pares[k], pares[k + 1]
+            # Faixa negativa: níveis simétricos, com os braços trocados;
+            # o nível superior é o de menor módulo.
+            faixas = ((self.positivos[k], inferior, superior),
+                      (self.negativos[k], superior[::-1], inferior[::-1]))
+            for rotulo, baixo, alto in faixas:
+                for i_positivo, sinal in ((True, "+"), (False, "-")):
+                    em_baixo = self.conduzem(baixo, i_positivo)
+                    em_alto = self.conduzem(alto, i_positivo)
+                    estado = {}
+                    for n in em_baixo:
+                        estado[n] = "1" if n in em_alto else "1-d+s"
+                    for n in em_alto:
+                        if n not in em_baixo:
+                            estado[n] = "d+s"
+                    estados[rotulo + sinal] = estado
+        return estados
+
+    def dispositivosPonte(self):
+        """Dispositivos da variante com chaves bidirecionais em ponte"""
+        return tuple(n for n in self.dispositivos
+                     if not n.lstrip("S0123456789").startswith("s"))
+
+    def dispositivos2ch(self):
+        """Dispositivos da variante com chaves bidirecionais em anti-série"""
+        return tuple(n for n in self.dispositivos
+                     if not n.lstrip("S0123456789").startswith("p"))
+
+    def __repr__(self):
+        return "TopologiaN(fontes=%r, %d níveis)" % (
+            list(self.fontes), 2*len(self.niveis) + 1)
+
+###########################################################################
+# GEOMETRIA E MODULAÇÃO                                                   #
+###########################################################################
+class GeometriaN(object):
+    """
+    Como calculo_perdas.Geometria, para a TopologiaN "topologia" e a
+    amplitude cfg.Ar. São usadas apenas as faixas até o nível que contém
+    Ar.
+    theta   : ângulos teóricos de mudança de intervalo, em ordem
+    rotulos : intervalo antes de cada ângulo de theta e após o último
+    tt      : ângulos reais (arredondados), incluindo 0, pi e 2*pi
+    ch      : {intervalo: número de ciclos de chaveamento}
+    """
+    def __init__(self, topologia, cfg):
+        self.topologia = topologia
+        Ar = cfg.Ar
+        # Portadoras (2 por faixa) com amplitude da primeira fonte, como
+        # em Geometria (Ap = V1, np = 6 com duas fontes).
+        n_portadoras = 2*len(topologia.niveis)
+        self.ma = 2*Ar/(n_portadoras*topologia.fontes[0])
+        self.mf = mf = cfg.fp/cfg.fr
+
+        # Níveis internos atravessados pela referência e ângulos em que
+        # ela os cruza, nos quatro quadrantes.
+        limiares = [n for n in topologia.niveis[:-1] if n < Ar]
+        theta = [asin(n/Ar) for n in limiares]
+        m = len(theta)
+        P, N = topologia.positivos, topologia.negativos
+        self.theta = tuple(theta + [pi - t for t in theta[::-1]] + [pi] +
+                           [pi + t for t in theta] +
+                           [2*pi - t for t in theta[::-1]])
+        self.rotulos = tuple(list(P[:m + 1]) + list(P[:m][::-1]) +
+                             list(N[:m + 1]) + list(N[:m][::-1]))
+
+        # Ângulos reais e ciclos em cada intervalo, somando os trechos na
+        # ordem em que aparecem (como em Geometria).
+        arredonda = calculo_perdas.arredondaAngulo
+        self.tt = tuple([arredonda(0, mf)] +
+                        [arredonda(t, mf) for t in self.theta] +
+                        [arredonda(2*pi, mf)])
+        soma = {}
+        for rotulo, a, b in zip(self.rotulos, self.tt[:-1], self.tt[1:]):
+            soma[rotulo] = soma[rotulo] + (b - a) if rotulo in soma \
+                           else (b - a)
+        self.ch = dict((r, mf * s / (2*pi)) for r, s in soma.items())
+
+    def classifica(self, angulo):
+        """
+        Intervalo de cada ângulo do vetor "angulo" (como
+        classificaIntervalo): busca nos ângulos ordenados, com o limite
+        pertencendo ao intervalo anterior.
+        """
+        indice = numpy.searchsorted(self.theta, angulo, side="left")
+        return numpy.array(self.rotulos)[indice]
+
+def modulacaoN(topologia, cfg, angulo, intervalo):
+    """
+    Como calculo_perdas.modulacao: retorna (tensão de referência, razão
+    cíclica, tensão de bloqueio). Na faixa de base b e largura w, d =
+    (vref - b)/w se positiva e 1 - (-vref - b)/w se negativa; a tensão
+    de bloqueio é o nível superior (em módulo) da faixa.
+    """
+    vref = cfg.Ar*numpy.sin(angulo)
+    rotulos = numpy.array(topologia.positivos + topologia.negativos)
+    ordem = numpy.argsort(rotulos)
+    faixa = ordem[numpy.searchsorted(rotulos[ordem], intervalo)]
+    m = len(topologia.niveis)
+    negativa = faixa >= m
+    faixa = faixa % m
+    base = numpy.array(topologia.base, dtype=float)[faixa]
+    largura = numpy.array(topologia.larguras, dtype=float)[faixa]
+    d = numpy.where(negativa, 1-(-vref-base)/largura, (vref-base)/largura)
+    vblock = numpy.array(topologia.niveis, dtype=float)[faixa]
+    return vref, d, vblock
+
+###########################################################################
+# CÁLCULO                                                                 #
+###########################################################################
+class ResultadoN(object):
+    """
+    Resumo do cálculo de um ponto de operação de uma TopologiaN; campos
+    como em calculo_perdas.Resultado, com tt (tupla) e ch (dicionário)
+    no lugar de tt0..tt8 e chA..chF.
+    """
+    __slots__ = ("config", "topologia", "avisos", "perdas", "correntes",
+                 "correntes_rms", "ma", "mf", "tt", "ch", "potencia_saida",
+                 "perdasW_bidir_ponte", "perdasW_bidir_2ch", "rend_ponte",
+                 "rend_2ch")
+
+    def __init__(self, **valores):
+        for nome in self.__slots__:
+            setattr(self, nome, valores[nome])
+
+    def __repr__(self):
+        return ("ResultadoN(%d níveis, rend_ponte=%.4f %%, rend_2ch=%.4f %%,"
+                " mf=%s)" % (2*len(self.topologia.niveis) + 1,
+                             self.rend_ponte, self.rend_2ch, self.mf))
+
+def validaEntradasN(topologia, cfg):
+    """Como validaEntradas: lista das variáveis fora de limite"""
+    invalidas = []
+    if not cfg.Ar <= topologia.niveis[-1]:
+        invalidas.append("Ar")
+    if not cfg.fp > cfg.fr:
+        invalidas.append("fp")
+    if not -pi/2 <= cfg.I_def <= pi/2:
+        invalidas.append("I_def")
+    return invalidas
+
+def _totais(topologia, s):
+    """
+    Perdas somadas (J) das variantes em ponte e em anti-série, na ordem
+    de soma de resumeSomas; diodos da ponte contam duas vezes.
+    """
+    comum = ["S1Q", "S1D", "S2Q", "S2D", "S3Q", "S3D", "S4Q", "S4D"]
+    ponte = [(n, 1) for n in comum]
+    serie = [(n, 1) for n in comum]
+    for par in topologia._bidirecionais():
+        for numero in par:
+            ponte += [("S%dpQ" % numero, 1), ("S%dpDp" % numero, 2),
+                      ("S%dpDn" % numero, 2)]
+            serie += [("S%ds%s" % (numero, n), 1)
+                      for n in ("Qp", "Dp", "Qn", "Dn")]
+    def soma(lista):
+        total = 0
+        for n, peso in lista:
+            total = total + (s[n] if peso == 1 else peso*s[n])
+        return total
+    return soma(ponte), soma(serie)
+
+def calcularN(topologia, config=None, modelo=None):
+    """
+    Calcula as perdas de um ponto de operação da TopologiaN "topologia"
+    somando as perdas de cada ciclo de chaveamento (como calcular_perdas
+    no modo "ciclos"). De "config" são usados Ar, Ief, I_def, fr e fp
+    (padrão: Configuracao com Ar igual ao maior nível). "modelo" como em
+    calcular_perdas. Retorna ResultadoN.
+    """
+    cfg = calculo_perdas.Configuracao(Ar=topologia.niveis[-1]) \
+          if config is None else config
+    avisos = validaEntradasN(topologia, cfg)
+    geo = GeometriaN(topologia, cfg)
+    angulo = calculo_perdas.angulosCiclos(geo.mf)
+    intervalo = geo.classifica(angulo)
+
+    # Mesmos passos de calculo_perdas.calculaPontos.
+    vref, d, vblock = modulacaoN(topologia, cfg, angulo, intervalo)
+    i = calculo_perdas.corrente(cfg, angulo)
+    iabs = abs(i)
+    conducao, comutacao = calculo_perdas.perdasDispositivos(
+        iabs, abs(vblock), cfg.fp, modelo)
+    tabela = topologia.tabela
+    estado = tabela.estado(intervalo, i >= 0)
+    perdas, imed = tabela.aplica(estado, d, iabs, conducao, comutacao)
+
+    nomes = topologia.dispositivos
+    s = dict(zip(nomes, numpy.sum(perdas, axis=1)))
+    correntes = dict(zip(nomes, calculo_perdas.media(imed)))
+    correntes_rms = dict(zip(nomes, calculo_perdas.rms(imed)))
+    potencia_saida = calculo_perdas.media(vref*i)
+
+    perdasJ_ponte, perdasJ_2ch = _totais(topologia, s)
+    perdasW_bidir_ponte = perdasJ_ponte * cfg.fr
+    perdasW_bidir_2ch = perdasJ_2ch * cfg.fr
+    return ResultadoN(
+        config=cfg, topologia=topologia, avisos=avisos, perdas=s,
+        correntes=correntes, correntes_rms=correntes_rms, ma=geo.ma,
+        mf=geo.mf, tt=geo.tt, ch=geo.ch, potencia_saida=potencia_saida,
+        perdasW_bidir_ponte=perdasW_bidir_ponte,
+        perdasW_bidir_2ch=perdasW_bidir_2ch,
+        rend_ponte=(potencia_saida - perdasW_bidir_ponte) /
+                   potencia_saida * 100,
+        rend_2ch=(potencia_saida - perdasW_bidir_2ch) /
+                 potencia_saida * 100)
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+###########################################################################
+# Núcleo escalar do cálculo por ciclos de chaveamento (modo "ciclos" de   #
+# calculo_perdas.py), para obter os valores de cada ciclo na ordem do     #
+# laço original: um ciclo por vez e, em cada ciclo, classificação do      #
+# intervalo, razão cíclica, tensão de bloqueio, perdas dos componentes    #
+# (inclusive os desvios abaixo de i_min das curvas de condução, ex.:      #
+# i < 0.2 A e i < 1.3 A) e atribuição às chaves e diodos pela tabela de   #
+# estados, gravando em vetores pré-alocados.                              #
+#                                                                         #
+# Se o pacote numba estiver instalado, o núcleo é compilado (modo         #
+# "nopython") na primeira chamada, com o resultado guardado em disco      #
+# (cache=True, em __pycache__ ou em NUMBA_CACHE_DIR) para que as          #
+# execuções seguintes não compilem novamente. Sem numba, a mesma função   #
+# é executada pelo interpretador.                                         #
+#                                                                         #
+# Resultados idênticos (bit a bit) aos de calculo_perdas: as funções      #
+# transcendentes (seno da referência, forma de onda da corrente e         #
+# log10 da curva de condução do diodo da ponte) são calculadas antes,     #
+# com numpy, pois suas versões escalares podem diferir na última casa;    #
+# as demais operações (+, -, *, /, raiz, comparações) são exatas e        #
+# seguem a mesma ordem do cálculo vetorial.                               #
+###########################################################################
+
+# Habilita resultado real da divisão (e não apenas parte inteira)
+from __future__ import division
+
+from math import sqrt
+
+import numpy
+
+import calculo_perdas
+
+# Intervalos na ordem dos códigos usados pelo núcleo.
+INTERVALOS = ("A", "B", "C", "D", "E", "F")
+
+# Intervalo de cada teste "angulo <= limite" de classificaIntervalo, na
+# ordem dos limites (theta1 a theta4, pi, theta5 a theta8); acima do
+# último, "D".
+_ROTULOS_LIMITES = numpy.array([0, 1, 2, 1, 0, 3, 4, 5, 4], dtype=numpy.intp)
+_ROTULO_FINAL = 3
+
+# Núcleos já preparados, por backend.
+_nucleos = {}
+
+def _nucleoCiclos(angulo, seno, i, vDPonte, limites, rotulos, final,
+                  coluna_intervalo, V1, V2, V1V2, Ar, t,
+                  quadQ, quadD, sw_x, sw_y, sw_correcao, Qrr, trr_irr_2,
+                  constante, coef_d, comuta, tipo,
+                  intervalo, d, vref, vblock, perdas, imed):
+    """
+    Calcula cada ciclo "k" a partir de angulo[k], seno[k] (seno do
+    ângulo), i[k] (corrente) e vDPonte[k] (queda de tensão do diodo da
+    ponte), gravando intervalo (código de INTERVALOS), d, vref, vblock,
+    perdas e imed (matrizes dispositivo x ciclo). quadQ e quadD trazem
+    os termos de ConducaoQuadratica (-b, b**2, 4a, c, 2a, i_min, v_min).
+    """
+    n_limites = limites.shape[0]
+    n_disp = constante.shape[0]
+    for k in range(angulo.shape[0]):
+        # Intervalo: primeiro limite não ultrapassado pelo ângulo.
+        r = final
+        for m in range(n_limites):
+            if angulo[k] <= limites[m]:
+                r = rotulos[m]
+                break
+        intervalo[k] = r
+
+        # Razão cíclica e tensão de bloqueio (como em modulacao).
+        v = Ar*seno[k]
+        vref[k] = v
+        if r == 0:
+            dk = v/V1
+            vb = V1
+        elif r == 1:
+            dk = (v-V1)/(V2-V1)
+            vb = V2
+        elif r == 2:
+            dk = (v-V2)/(V1)
+            vb = V1V2
+        elif r == 3:
+            dk = 1-(-v)/V1
+            vb = V1
+        elif r == 4:
+            dk = 1-(-v-V1)/(V2-V1)
+            vb = V2
+        else:
+            dk = 1-(-v-V2)/(V1)
+            vb = V1V2
+        d[k] = dk
+        vb = abs(vb)
+        vblock[k] = vb
+
+        # Perdas dos componentes (como em ModeloPerdas.perdas).
+        ik = abs(i[k])
+        if ik < quadQ[5]:
+            vQ = quadQ[6]
+        else:
+            delta = quadQ[1] - quadQ[2]*(quadQ[3]-ik)
+            if delta < 0:
+                delta = 0.0
+            vQ = (quadQ[0]+sqrt(delta))/quadQ[4]
+        if ik < quadD[5]:
+            vD = quadD[6]
+        else:
+            delta = quadD[1] - quadD[2]*(quadD[3]-ik)
+            if delta < 0:
+                delta = 0.0
+            vD = (quadD[0]+sqrt(delta))/quadD[4]
+        conducao0 = vQ*ik*t
+        conducao1 = vD*ik*t
+        conducao2 = vDPonte[k]*ik*t
+
+        # Interpolação linear como numpy.interp (faixa já verificada).
+        n_x = sw_x.shape[0]
+        if ik == sw_x[n_x-1]:
+            energia = sw_y[n_x-1]
+        else:
+            j = 0
+            while sw_x[j+1] <= ik:
+                j += 1
+            if sw_x[j] == ik:
+                energia = sw_y[j]
+            else:
+                inclinacao = (sw_y[j+1]-sw_y[j])/(sw_x[j+1]-sw_x[j])
+                energia = inclinacao*(ik-sw_x[j]) + sw_y[j]
+                if energia != energia:
+                    energia = inclinacao*(ik-sw_x[j+1]) + sw_y[j+1]
+        comutacao0 = energia/1000 * sw_correcao
+        comutacao1 = vb*Qrr
+        comutacao2 = vb*trr_irr_2[0]*trr_irr_2[1]/2
+
+        # Atribuição às chaves e diodos (como em TabelaEstados.aplica).
+        e = 2*coluna_intervalo[r]
+        if not i[k] >= 0:
+            e += 1
+        for n in range(n_disp):
+            ativo = coef_d[n, e]*dk + constante[n, e]
+            imed[n, k] = ativo*ik
+            if tipo[n] == 0:
+                perdas[n, k] = ativo*conducao0 + comuta[n, e]*comutacao0
+            elif tipo[n] == 1:
+                perdas[n, k] = ativo*conducao1 + comuta[n, e]*comutacao1
+            else:
+                perdas[n, k] = ativo*conducao2 + comuta[n, e]*comutacao2
+
+def nucleo(backend="auto"):
+    """
+    Retorna a função do núcleo. "backend": "numba" (compilado; erro se
+    numba não estiver instalado), "python" (interpretado) ou "auto"
+    (numba, se disponível).
+    """
+    if backend not in ("auto", "numba", "python"):
+        raise ValueError("Backend desconhecido: " + str(backend))
+    if backend in _nucleos:
+        return _nucleos[backend]
+    if backend == "python":
+        funcao = _nucleoCiclos
+    else:
+        try:
+            import numba
+        except ImportError:
+            if backend == "numba":
+                raise
+            funcao = _nucleoCiclos
+        else:
+            funcao = numba.njit(cache=True, nogil=True)(_nucleoCiclos)
+    _nucleos[backend] = funcao
+    return funcao
+
+def backendAtivo(backend="auto"):
+    """Nome do backend efetivamente usado por nucleo(backend)"""
+    return "python" if nucleo(backend) is _nucleoCiclos else "numba"
+
+def _quadratica(curva, nome):
+    """Termos de uma ConducaoQuadratica, na ordem usada pelo núcleo"""
+    if not isinstance(curva, calculo_perdas.ConducaoQuadratica):
+        raise TypeError("Curva " + nome + " não suportada pelo núcleo "
+                        "escalar (apenas ConducaoQuadratica)")
+    return numpy.array([curva._menos_b, curva._b2, curva._4a, curva.c,
+                        curva._2a, curva.i_min, curva.v_min], dtype=float)
+
+def calculaCiclos(cfg, geo=None, tabela=None, modelo=None, backend="auto"):
+    """
+    Como calculo_perdas.calculaCiclos, calculado pelo núcleo escalar.
+    Sem "modelo", usa as curvas definidas em calculo_perdas (as mesmas
+    das funções de perda do usuário); as curvas de condução da chave e
+    do diodo devem ser ConducaoQuadratica e a de chaveamento da chave,
+    ChaveamentoTabela.
+    """
+    if geo is None:
+        geo = calculo_perdas.Geometria(cfg)
+    if tabela is None:
+        tabela = calculo_perdas.TABELA_7NIVEIS
+    if modelo is None:
+        modelo = calculo_perdas.ModeloPerdas()
+    chaveamento = modelo.chaveamentoQ
+    if not isinstance(chaveamento, calculo_perdas.ChaveamentoTabela):
+        raise TypeError("Curva chaveamentoQ não suportada pelo núcleo "
+                        "escalar (apenas ChaveamentoTabela)")
+
+    # Funções transcendentes, calculadas com numpy (ver cabeçalho).
+    angulo = calculo_perdas.angulosCiclos(geo.mf)
+    seno = numpy.sin(angulo)
+    i = calculo_perdas.corrente(cfg, angulo)
+    iabs = abs(i)
+    vDPonte = numpy.asarray(modelo.conducaoDPonte.tensao(iabs), dtype=float)
+    vDPonte = numpy.broadcast_to(vDPonte, iabs.shape)
+    if numpy.any(iabs < chaveamento.x[0]) or \
+       numpy.any(iabs > chaveamento.x[-1]):
+        raise ValueError("Corrente fora da faixa da tabela de "
+                         "chaveamento: %s a %s A" % (chaveamento.x[0],
+                                                     chaveamento.x[-1]))
+
+    theta = geo.theta
+    limites = numpy.array(theta[1:5] + (calculo_perdas.pi,) + theta[5:],
+                          dtype=float)
+    coluna_intervalo = numpy.array([tabela.intervalos.index(r)
+                                    for r in INTERVALOS], dtype=numpy.intp)
+    V1, V2 = cfg.V1, cfg.V2
+
+    N = len(angulo)
+    n_disp = len(tabela.dispositivos)
+    codigo = numpy.empty(N, dtype=numpy.intp)
+    d = numpy.empty(N)
+    vref = numpy.empty(N)
+    vblock = numpy.empty(N)
+    perdas = numpy.empty((n_disp, N))
+    imed = numpy.empty((n_disp, N))
+    nucleo(backend)(
+        angulo, seno, i, numpy.ascontiguousarray(vDPonte), limites,
+        _ROTULOS_LIMITES, _ROTULO_FINAL, coluna_intervalo,
+        float(V1), float(V2), float(V1 + V2), float(cfg.Ar), 1/cfg.fp,
+        _quadratica(modelo.conducaoQ, "conducaoQ"),
+        _quadratica(modelo.conducaoD, "conducaoD"),
+        chaveamento.x, chaveamento.y, float(chaveamento.correcao),
+        float(modelo.Qrr), numpy.array([modelo.trr, modelo.irr], dtype=float),
+        tabela.constante, tabela.coef_d, tabela.comuta,
+        numpy.ascontiguousarray(tabela.tipo, dtype=numpy.intp),
+        codigo, d, vref, vblock, perdas, imed)
+
+    return {"ANGULO":       angulo,
+            "INTERVALO":    numpy.array(INTERVALOS)[codigo],
+            "RAZAOCICLICA": d * 100, # Transforma em porcentagem
+            "CORRENTE":     i,
+            "TENSAOREF":    vref,
+            "POTENCIAINST": vref*i,
+            "VBLOCK":       vblock.astype(numpy.asarray([V1, V2]).dtype),
+            "perdas":       perdas,
+            "correntes":    imed}
+
+def calcular_perdas(config=None, tabela=None, modelo=None, backend="auto"):
+    """
+    Como calculo_perdas.calcular_perdas no modo "ciclos", calculado pelo
+    núcleo escalar. Retorna Resultado.
+    """
+    cfg = calculo_perdas.Configuracao() if config is None else config
+    avisos = calculo_perdas.validaEntradas(cfg, [])
+    geo = calculo_perdas.Geometria(cfg)
+    return calculo_perdas.resumeCiclos(
+        cfg, geo, calculaCiclos(cfg, geo, tabela, modelo, backend), avisos,
+        tabela)
+
+def compara(config=None, tabela=None, modelo=None, backend="auto"):
+    """
+    Compara os vetores de cada ciclo do núcleo escalar com os de
+    calculo_perdas.calculaCiclos. Retorna lista com as chaves que não
+    são idênticas (vazia se todos os valores forem iguais bit a bit).
+    """
+    cfg = calculo_perdas.Configuracao() if config is None else config
+    geo = calculo_perdas.Geometria(cfg)
+    esperado = calculo_perdas.calculaCiclos(cfg, geo, tabela, modelo)
+    obtido = calculaCiclos(cfg, geo, tabela, modelo, backend)
+    return sorted(chave for chave in esperado
+                  if esperado[chave].dtype != obtido[chave].dtype or
+                  esperado[chave].tobytes() != obtido[chave].tobytes())
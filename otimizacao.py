@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+###########################################################################
+# Otimização da frequência de chaveamento fp e da divisão V1/V2 das       #
+# fontes para máximo rendimento da topologia sete níveis                  #
+# (calculo_perdas.py).                                                    #
+#                                                                         #
+# Busca sem derivadas por evolução diferencial com variáveis limitadas.   #
+# A população de cada geração é calculada em paralelo, e todo ponto       #
+# calculado é memorizado: fp é arredondada para mf inteiro (o cálculo     #
+# usa int(mf) ciclos) e V1 para a resolução "resolucao_V", de forma que   #
+# candidatos repetidos não são recalculados.                              #
+###########################################################################
+
+# Habilita resultado real da divisão (e não apenas parte inteira)
+from __future__ import division
+
+import multiprocessing
+
+import numpy
+
+import calculo_perdas
+
+# Itens de DISPOSITIVOS de cada topologia, para o limite de perda por
+# dispositivo (ver resumeSomas).
+DISPOSITIVOS_PONTE = tuple(n for n in calculo_perdas.DISPOSITIVOS
+                           if not n.startswith(("S5s", "S6s")))
+DISPOSITIVOS_2CH   = tuple(n for n in calculo_perdas.DISPOSITIVOS
+                           if not n.startswith(("S5p", "S6p")))
+TOPOLOGIAS = {"rend_ponte": DISPOSITIVOS_PONTE,
+              "rend_2ch":   DISPOSITIVOS_2CH}
+
+###########################################################################
+# AVALIAÇÃO DOS CANDIDATOS                                                #
+###########################################################################
+def _avalia(tarefa):
+    """Calcula um candidato: recebe (Configuracao, modo), retorna Resultado"""
+    cfg, modo = tarefa
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return calculo_perdas.calcular_perdas(cfg, modo)
+
+class Avaliador(object):
+    """
+    Calcula e memoriza pontos (fp, V1) com V1 + V2 e demais entradas de
+    "base". "consultas" conta os pedidos e "avaliacoes" os cálculos
+    efetivamente feitos.
+    """
+    def __init__(self, base, modo="ciclos", resolucao_V=0.01, processos=None):
+        self.base = base
+        self.modo = modo
+        self.resolucao_V = resolucao_V
+        self.processos = processos
+        self.memoria = {}
+        self.consultas = 0
+        self.pool = None
+
+    def chave(self, fp, V1):
+        """Ponto arredondado: (mf inteiro, V1 em passos de resolucao_V)"""
+        return (max(int(round(fp/self.base.fr)), 1),
+                int(round(V1/self.resolucao_V)))
+
+    def configuracao(self, chave):
+        mf, passos_V1 = chave
+        V1 = round(passos_V1*self.resolucao_V, 9)
+        return self.base.substitui(fp=mf*self.base.fr, V1=V1,
+                                   V2=self.base.V1 + self.base.V2 - V1)
+
+    def avalia(self, chaves):
+        """Retorna Resultados das chaves, calculando em paralelo as novas"""
+        self.consultas += len(chaves)
+        novas = sorted(set(k for k in chaves if k not in self.memoria))
+        tarefas = [(self.configuracao(k), self.modo) for k in novas]
+        if self.processos == 1 or len(tarefas) < 2:
+            resultados = [_avalia(t) for t in tarefas]
+        else:
+            if self.pool is None:
+                self.pool = multiprocessing.Pool(self.processos)
+            resultados = self.pool.map(_avalia, tarefas)
+        self.memoria.update(zip(novas, resultados))
+        return [self.memoria[k] for k in chaves]
+
+    def fecha(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    @property
+    def avaliacoes(self):
+        return len(self.memoria)
+
+def violacao(r, objetivo, perda_maxima):
+    """
+    Medida de violação das restrições (0 = ponto viável): uma unidade
+    por variável reprovada em validaEntradas, mais o excesso relativo da
+    maior perda por dispositivo sobre "perda_maxima" (W).
+    """
+    total = len(r.avisos)
+    if perda_maxima is not None:
+        pior = max(r.perdas[n] for n in TOPOLOGIAS[objetivo]) * r.config.fr
+        total += max(pior - perda_maxima, 0) / perda_maxima
+    if not numpy.isfinite(getattr(r, objetivo)):
+        total += 1
+    return total
+
+###########################################################################
+# OTIMIZAÇÃO                                                              #
+###########################################################################
+def otimiza(objetivo="rend_ponte", base=None, fp=(5e3, 200e3),
+            razao_V1=None, perda_maxima=None, modo="ciclos", populacao=12,
+            geracoes=30, F=0.7, CR=0.9, tolerancia=1e-4, semente=0,
+            processos=None, resolucao_V=0.01):
+    """
+    Maximiza "objetivo" ("rend_ponte" ou "rend_2ch") variando fp na
+    faixa "fp" (Hz, busca em escala logarítmica) e a razão
+    V1/(V1 + V2) na faixa "razao_V1", mantida a soma V1 + V2 e as demais
+    entradas de "base". Por padrão, "razao_V1" cobre toda a faixa
+    permitida por validaEntradas (V1 < V2 e Ar > V2).
+    Restrições: testes de validaEntradas e perda de cada dispositivo da
+    topologia menor ou igual a "perda_maxima" (W), se fornecida. Pontos
+    inviáveis são sempre piores que pontos viáveis, e comparados entre
+    si pela violação (ver violacao).
+    Para quando a diferença de "objetivo" na população fica abaixo de
+    "tolerancia" (pontos percentuais) ou após "geracoes".
+
+    Retorna dicionário com:
+    otimo       : Resultado do melhor ponto viável (None se não houver)
+    pareto      : Resultados viáveis não dominados em rendimento e fp
+                  (nenhum outro ponto tem rendimento e fp maiores),
+                  em ordem crescente de fp
+    avaliacoes  : número de pontos calculados
+    consultas   : número de candidatos pedidos (inclui repetidos)
+    geracoes    : número de gerações executadas
+    """
+    if objetivo not in TOPOLOGIAS:
+        raise ValueError("Objetivo desconhecido: " + str(objetivo))
+    base = calculo_perdas.Configuracao() if base is None else base
+    soma = base.V1 + base.V2
+    if razao_V1 is None:
+        # V1 < V2 e V2 < Ar, com margem de um passo de resolucao_V.
+        margem = resolucao_V/soma
+        razao_V1 = (max(1 - base.Ar/soma, 0) + margem, 0.5 - margem)
+    limites = numpy.array([numpy.log10(fp), razao_V1], dtype=float)
+    sorteio = numpy.random.RandomState(semente)
+    avaliador = Avaliador(base, modo, resolucao_V, processos)
+
+    # mf inteiro dentro da faixa de fp.
+    mf_min = int(numpy.ceil(fp[0]/base.fr))
+    mf_max = max(int(numpy.floor(fp[1]/base.fr)), mf_min)
+
+    def chaves(x):
+        """Converte candidatos normalizados (0 a 1) em pontos"""
+        reais = limites[:, 0] + x*(limites[:, 1] - limites[:, 0])
+        pontos = [avaliador.chave(10**lf, r*soma) for lf, r in reais]
+        return [(min(max(mf, mf_min), mf_max), v1) for mf, v1 in pontos]
+
+    def classifica(resultados):
+        """Chaves de ordenação: (violação, -objetivo)"""
+        notas = []
+        for r in resultados:
+            v = violacao(r, objetivo, perda_maxima)
+            notas.append((v, -getattr(r, objetivo) if v == 0 else 0))
+        return notas
+
+    geracao = 0
+    try:
+        # População inicial em hipercubo latino, para cobrir a faixa de fp
+        # (e a fronteira de Pareto) desde o início.
+        x = (numpy.array([sorteio.permutation(populacao)
+                          for _ in limites]).T +
+             sorteio.uniform(size=(populacao, len(limites)))) / populacao
+        nota = classifica(avaliador.avalia(chaves(x)))
+        for geracao in range(1, geracoes + 1):
+            # Evolução diferencial DE/rand/1/bin.
+            indices = numpy.array([sorteio.choice(
+                [j for j in range(populacao) if j != k], 3, replace=False)
+                for k in range(populacao)])
+            mutante = x[indices[:, 0]] + F*(x[indices[:, 1]] -
+                                            x[indices[:, 2]])
+            cruza = sorteio.uniform(size=x.shape) < CR
+            cruza[numpy.arange(populacao),
+                  sorteio.randint(len(limites), size=populacao)] = True
+            tentativa = numpy.clip(numpy.where(cruza, mutante, x), 0, 1)
+            nova = classifica(avaliador.avalia(chaves(tentativa)))
+            melhor = [n < a for n, a in zip(nova, nota)]
+            x[melhor] = tentativa[melhor]
+            nota = [n if m else a for n, a, m in zip(nova, nota, melhor)]
+            viaveis = [-o for v, o in nota if v == 0]
+            if len(viaveis) == populacao and \
+               max(viaveis) - min(viaveis) < tolerancia:
+                break
+    finally:
+        avaliador.fecha()
+
+    viaveis = [r for r in avaliador.memoria.values()
+               if violacao(r, objetivo, perda_maxima) == 0]
+    otimo = max(viaveis, key=lambda r: getattr(r, objetivo)) \
+            if viaveis else None
+    pareto = []
+    for r in sorted(viaveis, key=lambda r: (-r.config.fp,
+                                            -getattr(r, objetivo))):
+        if not pareto or getattr(r, objetivo) > getattr(pareto[-1],
+                                                        objetivo):
+            pareto.append(r)
+    return {"otimo": otimo, "pareto": pareto[::-1],
+            "avaliacoes": avaliador.avaliacoes,
+            "consultas": avaliador.consultas, "geracoes": geracao}
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+###########################################################################
+# Cálculo de perdas da topologia sete níveis (calculo_perdas.py) para     #
+# pontos de operação lidos de arquivo, pela linha de comando.             #
+#                                                                         #
+# Uso: python processa_arquivo.py entrada.csv saida.csv [opções]          #
+#                                                                         #
+# A entrada (CSV com cabeçalho ou Parquet) tem uma coluna por variável    #
+# de Configuracao (V1, V2, Ar, Ief, I_def, fr, fp, fat_crista; o fator de #
+# crista é numérico, ver FormaFatorDeCrista); colunas ausentes assumem os #
+# valores definidos pelo usuário em calculo_perdas ("Ar" assume V1 + V2)  #
+# e as demais colunas são ignoradas.                                      #
+#                                                                         #
+# A saída (CSV ou Parquet, pela extensão) repete as entradas e traz, por  #
+# linha: "valido" (1 se o ponto passou nos testes de validação; pontos    #
+# inválidos não são calculados e têm resultados vazios/NaN), a perda em W #
+# de cada chave e diodo ("S1 Q" ... "S6s Dn"), a corrente média de cada   #
+# um ("Imed S1 Q" ...), a potência de saída, as perdas totais e os        #
+# rendimentos das duas topologias.                                        #
+#                                                                         #
+# O arquivo é lido e gravado em blocos de linhas, de forma que a memória  #
+# usada não depende do número de linhas. Em cada bloco, os pontos com a   #
+# mesma geometria e forma de onda (V1, V2, Ar, fr, fp, fat_crista) são    #
+# calculados juntos por calcular_lote; os blocos podem ser distribuídos   #
+# entre processos.                                                        #
+###########################################################################
+
+# Habilita resultado real da divisão (e não apenas parte inteira)
+from __future__ import division
+
+import argparse
+import collections
+import csv
+import io
+import itertools
+import multiprocessing
+import re
+import sys
+import timeit
+
+import numpy
+
+import calculo_perdas
+
+###########################################################################
+# DEFINIÇÃO DAS COLUNAS                                                   #
+###########################################################################
+# Variáveis de entrada, na ordem usada por Configuracao.
+ENTRADAS = calculo_perdas.Configuracao.__slots__
+GEOMETRIA = ("V1", "V2", "Ar", "fr", "fp", "fat_crista")
+
+def rotulo(nome):
+    """Rótulo de um item de DISPOSITIVOS (ex.: "S5pDp" -> "S5p Dp")"""
+    return re.sub(r"^(S\d[ps]?)", r"\1 ", nome)
+
+ROTULOS = tuple(rotulo(n) for n in calculo_perdas.DISPOSITIVOS)
+
+# Colunas de resultado, calculadas apenas para pontos válidos.
+RESULTADOS = (ROTULOS + tuple("Imed " + r for r in ROTULOS) +
+              ("potencia_saida", "perdasW_bidir_ponte", "perdasW_bidir_2ch",
+               "rend_ponte", "rend_2ch"))
+COLUNAS = ENTRADAS + ("valido",) + RESULTADOS
+
+###########################################################################
+# CÁLCULO DE UM BLOCO (EXECUTADO NOS PROCESSOS DE TRABALHO)               #
+###########################################################################
+def validos(entradas):
+    """
+    Vetor indicando as linhas de "entradas" (uma coluna por ENTRADAS)
+    que passam nos testes de validaEntradas (ver entradasValidas) e têm
+    fator de crista válido (ver FormaFatorDeCrista).
+    """
+    cfg = calculo_perdas.Configuracao(**dict(zip(ENTRADAS, entradas.T)))
+    return calculo_perdas.entradasValidas(cfg) & (cfg.fat_crista >= 1)
+
+def _calculaBloco(tarefa):
+    """
+    Calcula um bloco de linhas. Recebe (matriz de entradas com uma
+    coluna por ENTRADAS, modo de cálculo, máximo de ciclos de
+    chaveamento por chamada de calcular_lote) e retorna (vetor "valido",
+    matriz com uma coluna por RESULTADOS).
+    """
+    entradas, modo, ciclos_por_lote = tarefa
+    valido = validos(entradas)
+    saida = numpy.full((len(entradas), len(RESULTADOS)), numpy.nan)
+    colunas = [ENTRADAS.index(n) for n in GEOMETRIA]
+    linhas = numpy.flatnonzero(valido)
+    if not len(linhas):
+        return valido, saida
+    geometrias, grupo = numpy.unique(entradas[linhas][:, colunas], axis=0,
+                                     return_inverse=True)
+    grupo = grupo.ravel()
+    for g, valores in enumerate(geometrias):
+        cfg = calculo_perdas.Configuracao(**dict(zip(GEOMETRIA, valores)))
+        membros = linhas[grupo == g]
+        # Limita o número de ciclos calculados de uma vez (memória).
+        passo = max(int(ciclos_por_lote // max(int(cfg.fp/cfg.fr), 1)), 1)
+        for inicio in range(0, len(membros), passo):
+            parte = membros[inicio:inicio + passo]
+            with numpy.errstate(divide="ignore", invalid="ignore"):
+                r = calculo_perdas.calcular_lote(
+                    cfg, entradas[parte, ENTRADAS.index("Ief")],
+                    entradas[parte, ENTRADAS.index("I_def")], modo)
+            saida[parte] = numpy.column_stack(
+                [r.perdas[n] * cfg.fr for n in calculo_perdas.DISPOSITIVOS] +
+                [r.correntes[n] for n in calculo_perdas.DISPOSITIVOS] +
+                [r.potencia_saida, r.perdasW_bidir_ponte,
+                 r.perdasW_bidir_2ch, r.rend_ponte, r.rend_2ch])
+    return valido, saida
+
+###########################################################################
+# LEITURA                                                                 #
+###########################################################################
+def _completa(nomes, valores):
+    """
+    Monta matriz com uma coluna por ENTRADAS a partir das colunas lidas
+    "nomes" (matriz "valores"), preenchendo as ausentes.
+    """
+    padrao = calculo_perdas.Configuracao()
+    entradas = numpy.empty((len(valores), len(ENTRADAS)))
+    for j, n in enumerate(ENTRADAS):
+        if n in nomes:
+            entradas[:, j] = valores[:, nomes.index(n)]
+        elif n != "Ar":
+            entradas[:, j] = getattr(padrao, n)
+    if "Ar" not in nomes:
+        entradas[:, ENTRADAS.index("Ar")] = \
+            entradas[:, ENTRADAS.index("V1")] + \
+            entradas[:, ENTRADAS.index("V2")]
+    return entradas
+
+def blocosCSV(caminho, tamanho_bloco, delimitador=","):
+    """Gera matrizes de entradas (ver _completa) lidas de um CSV"""
+    with io.open(caminho, newline="") as arquivo:
+        cabecalho = next(csv.reader(arquivo, delimiter=delimitador))
+        nomes = [c.strip() for c in cabecalho]
+        usadas = [j for j, n in enumerate(nomes) if n in ENTRADAS]
+        while True:
+            linhas = list(itertools.islice(arquivo, tamanho_bloco))
+            if not linhas:
+                return
+            valores = numpy.loadtxt(linhas, delimiter=delimitador,
+                                    usecols=usadas, ndmin=2) if usadas \
+                      else numpy.empty((len(linhas), 0))
+            yield _completa([nomes[j] for j in usadas], valores)
+
+def blocosParquet(caminho, tamanho_bloco):
+    """Gera matrizes de entradas (ver _completa) lidas de um Parquet"""
+    import pyarrow.parquet
+    arquivo = pyarrow.parquet.ParquetFile(caminho)
+    nomes = [n for n in arquivo.schema_arrow.names if n in ENTRADAS]
+    for lote in arquivo.iter_batches(batch_size=tamanho_bloco,
+                                     columns=nomes):
+        valores = numpy.column_stack(
+            [lote.column(n).to_numpy(zero_copy_only=False).astype(float)
+             for n in nomes]) if nomes else numpy.empty((lote.num_rows, 0))
+        yield _completa(nomes, valores)
+
+###########################################################################
+# GRAVAÇÃO                                                                #
+###########################################################################
+class SaidaCSV(object):
+    """
+    Grava blocos de colunas em CSV com "digitos" algarismos
+    significativos; pontos inválidos ficam vazios. O padrão (17)
+    reproduz exatamente os valores float64, de forma que uma linha
+    gravada, lida de novo, gera o mesmo ponto de operação.
+    """
+    def __init__(self, caminho, digitos=17):
+        self.arquivo = io.open(caminho, "w", newline="")
+        self.formato = "%%.%dg" % digitos
+        self.arquivo.write(u",".join(COLUNAS) + u"\n")
+
+    def grava(self, entradas, valido, saida):
+        texto = io.StringIO()
+        numpy.savetxt(texto, numpy.column_stack([entradas, valido, saida]),
+                      fmt=self.formato, delimiter=",")
+        self.arquivo.write(texto.getvalue().replace(u"nan", u""))
+
+    def fecha(self):
+        self.arquivo.close()
+
+class SaidaParquet(object):
+    """Grava blocos de colunas em Parquet, um grupo de linhas por bloco"""
+    def __init__(self, caminho):
+        import pyarrow
+        import pyarrow.parquet
+        self.pyarrow = pyarrow
+        self.esquema = pyarrow.schema(
+            [(n, pyarrow.bool_() if n == "valido" else pyarrow.float64())
+             for n in COLUNAS])
+        self.escritor = pyarrow.parquet.ParquetWriter(caminho, self.esquema)
+
+    def grava(self, entradas, valido, saida):
+        colunas = list(entradas.T) + [valido] + list(saida.T)
+        self.escritor.write_table(self.pyarrow.Table.from_arrays(
+            [self.pyarrow.array(c) for c in colunas], schema=self.esquema))
+
+    def fecha(self):
+        self.escritor.close()
+
+def _parquet(caminho):
+    return caminho.lower().endswith((".parquet", ".pq"))
+
+###########################################################################
+# PROCESSAMENTO                                                           #
+###########################################################################
+def processa(entrada, saida, tamanho_bloco=4096, processos=1,
+             modo="ciclos", ciclos_por_lote=2**16, progresso=None):
+    """
+    Calcula todos os pontos do arquivo "entrada" e grava em "saida" (ver
+    início do arquivo). "processos" como em varredura.varrer (padrão:
+    calcula no próprio processo); no máximo 2 blocos por processo ficam
+    pendentes de uma vez. "progresso", se fornecida, é chamada com o
+    número de linhas gravadas após cada bloco.
+    Retorna dicionário com o número de linhas e de linhas inválidas.
+    """
+    blocos = blocosParquet(entrada, tamanho_bloco) if _parquet(entrada) \
+             else blocosCSV(entrada, tamanho_bloco)
+    gravador = SaidaParquet(saida) if _parquet(saida) else SaidaCSV(saida)
+    estatisticas = {"linhas": 0, "invalidas": 0}
+
+    def grava(entradas, resultado):
+        valido, colunas = resultado
+        gravador.grava(entradas, valido, colunas)
+        estatisticas["linhas"] += len(entradas)
+        estatisticas["invalidas"] += int(len(valido) - valido.sum())
+        if progresso is not None:
+            progresso(estatisticas["linhas"])
+
+    try:
+        if processos == 1:
+            for entradas in blocos:
+                grava(entradas, _calculaBloco((entradas, modo,
+                                               ciclos_por_lote)))
+        else:
+            pool = multiprocessing.Pool(processos)
+            try:
+                # Blocos pendentes, em ordem; a leitura para enquanto
+                # houver 2 blocos por processo, mantendo a memória fixa.
+                pendentes = collections.deque()
+                limite = 2 * (processos or multiprocessing.cpu_count())
+                for entradas in blocos:
+                    pendentes.append((entradas, pool.apply_async(
+                        _calculaBloco, ((entradas, modo, ciclos_por_lote),))))
+                    if len(pendentes) >= limite:
+                        entradas, tarefa = pendentes.popleft()
+                        grava(entradas, tarefa.get())
+                while pendentes:
+                    entradas, tarefa = pendentes.popleft()
+                    grava(entradas, tarefa.get())
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        gravador.fecha()
+    return estatisticas
+
+class Progresso(object):
+    """
+    Imprime em "fluxo" as linhas processadas e a taxa em linhas/s, no
+    máximo a cada "intervalo" segundos
+    """
+    def __init__(self, fluxo=sys.stderr, intervalo=1.0):
+        self.fluxo = fluxo
+        self.intervalo = intervalo
+        self.inicio = self.ultimo = timeit.default_timer()
+
+    def __call__(self, linhas, final=False):
+        agora = timeit.default_timer()
+        if final or agora - self.ultimo >= self.intervalo:
+            self.ultimo = agora
+            self.fluxo.write("\r%d linhas, %.0f linhas/s" % (
+                linhas, linhas / max(agora - self.inicio, 1e-9)))
+            if final:
+                self.fluxo.write("\n")
+            self.fluxo.flush()
+
+def principal(argumentos=None):
+    parser = argparse.ArgumentParser(
+        description="Calcula as perdas dos pontos de operação de um "
+                    "arquivo CSV ou Parquet")
+    parser.add_argument("entrada", help="arquivo de pontos (.csv/.parquet)")
+    parser.add_argument("saida", help="arquivo de resultados "
+                                      "(.csv/.parquet)")
+    parser.add_argument("-b", "--tamanho-bloco", type=int, default=4096,
+                        help="linhas lidas e calculadas de uma vez")
+    parser.add_argument("-p", "--processos", type=int, default=1,
+                        help="número de processos (0 = todos os núcleos)")
+    parser.add_argument("-m", "--modo", default="ciclos",
+                        choices=("ciclos", "analitico"),
+                        help="modo de cálculo de calcular_perdas")
+    parser.add_argument("-q", "--silencioso", action="store_true",
+                        help="não mostra o progresso")
+    args = parser.parse_args(argumentos)
+
+    progresso = None if args.silencioso else Progresso()
+    estatisticas = processa(args.entrada, args.saida, args.tamanho_bloco,
+                            args.processos or None, args.modo,
+                            progresso=progresso)
+    if progresso is not None:
+        progresso(estatisticas["linhas"], final=True)
+    if estatisticas["invalidas"]:
+        sys.stderr.write("%d linhas inválidas (resultados vazios)\n"
+                         % estatisticas["invalidas"])
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(principal())
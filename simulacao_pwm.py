@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+###########################################################################
+# Simulação no tempo da modulação PWM da topologia sete níveis, para      #
+# validar o modelo de razão cíclica média de calculo_perdas.py.           #
+#                                                                         #
+# A referência Ar*sin é comparada, a cada passo de tempo, com 6           #
+# portadoras triangulares em fase (disposição de fase, "phase             #
+# disposition"), uma em cada faixa entre níveis de tensão consecutivos    #
+# (0, V1, V2, V1 + V2 e os simétricos); com V2 = 2*V1, todas têm          #
+# amplitude Ap = V1. A faixa da referência define o intervalo (A a F) e a #
+# comparação define se a saída está no nível superior (fração "d" do     #
+# período) ou no inferior. O estado de cada chave e diodo vem da          #
+# TabelaEstados; cada mudança de estado com a corrente no mesmo sentido   #
+# é uma comutação.                                                        #
+#                                                                         #
+# Perdas: condução = potência de condução (perda por período de           #
+# portadora * fp) integrada nos passos em que o dispositivo conduz;       #
+# chaveamento = metade da energia de comutação por período (liga +        #
+# desliga) em cada mudança de estado, com a corrente do instante. As      #
+# mudanças causadas apenas pela inversão da corrente não têm perda.       #
+#                                                                         #
+# Os passos são processados em blocos de tamanho fixo; as somas por       #
+# dispositivo são feitas por combinação de estado (np.bincount), sem      #
+# matrizes de dispositivos por passo, de forma que a memória não depende  #
+# do número de passos.                                                    #
+###########################################################################
+
+# Habilita resultado real da divisão (e não apenas parte inteira)
+from __future__ import division
+
+import numpy
+
+import calculo_perdas
+
+# Intervalo de cada faixa da referência, da mais negativa à mais positiva.
+INTERVALOS_FAIXAS = ("F", "E", "D", "A", "B", "C")
+
+def niveis(cfg):
+    """Níveis de tensão de saída, em ordem crescente"""
+    V1, V2 = cfg.V1, cfg.V2
+    return numpy.array([-(V1 + V2), -V2, -V1, 0, V1, V2, V1 + V2],
+                       dtype=float)
+
+class _Padroes(object):
+    """
+    Dispositivos em condução para cada combinação (estado da tabela,
+    saída no nível superior), e dispositivos que mudam de estado para
+    cada par de combinações.
+    """
+    def __init__(self, tabela):
+        n_estados = tabela.constante.shape[1]
+        # Combinação = 2*estado + posição (1 = nível superior).
+        conduz = numpy.empty((len(tabela.dispositivos), 2*n_estados))
+        conduz[:, 0::2] = tabela.constante
+        conduz[:, 1::2] = tabela.constante + tabela.coef_d
+        self.conduz = conduz > 0.5
+        self.n = 2*n_estados
+        # Par = combinação anterior * n + combinação atual.
+        self.muda = (self.conduz[:, :, None] !=
+                     self.conduz[:, None, :]).reshape(len(conduz), -1)
+
+def _somaPorTipo(padrao, tipo, indice, pesos, n):
+    """
+    Soma, para cada dispositivo, os "pesos" (uma linha por tipo de
+    TIPOS_PERDA) dos passos cujo "indice" (combinação ou par) ativa o
+    dispositivo em "padrao"
+    """
+    soma = numpy.zeros(len(tipo))
+    for t in range(len(pesos)):
+        linhas = tipo == t
+        por_indice = numpy.bincount(indice, weights=pesos[t], minlength=n)
+        soma[linhas] = numpy.dot(padrao[linhas], por_indice)
+    return soma
+
+def simula(config=None, passos_por_periodo=1000, ciclos=1,
+           tamanho_bloco=2**16, tabela=None, modelo=None):
+    """
+    Simula "ciclos" ciclos da referência com "passos_por_periodo" passos
+    por período da portadora, em blocos de "tamanho_bloco" passos.
+    "tabela" e "modelo" como em calcular_perdas.
+
+    Retorna dicionário com:
+    passos              : número de passos simulados
+    comutacoes          : {dispositivo: comutações (ligar ou desligar)
+                          por ciclo da referência}
+    perdas_conducao, perdas_chaveamento, perdas : {dispositivo: W}
+    correntes           : {dispositivo: corrente média (A)}
+    perdasW_bidir_ponte, perdasW_bidir_2ch : perdas totais (W)
+    """
+    cfg = calculo_perdas.Configuracao() if config is None else config
+    tabela = calculo_perdas.TABELA_7NIVEIS if tabela is None else tabela
+    padroes = _Padroes(tabela)
+    tipo = tabela.tipo
+    nivel = niveis(cfg)
+    largura = numpy.diff(nivel)
+    # Tensão de bloqueio de cada faixa (como em calculo_perdas.modulacao).
+    vblock_faixa = numpy.array([cfg.V1 + cfg.V2, cfg.V2, cfg.V1,
+                                cfg.V1, cfg.V2, cfg.V1 + cfg.V2])
+    # Estado da tabela de cada faixa, para corrente positiva; o estado
+    # de corrente negativa é o seguinte (ver TabelaEstados.coluna).
+    estado_faixa = numpy.array([tabela.coluna(f, True)
+                                for f in INTERVALOS_FAIXAS])
+
+    P = int(passos_por_periodo)
+    dt = 1 / (cfg.fp * P)
+    total = int(round(ciclos / cfg.fr / dt))
+    n_disp = len(tabela.dispositivos)
+    conducao = numpy.zeros(n_disp)
+    chaveamento = numpy.zeros(n_disp)
+    comutacoes = numpy.zeros(n_disp)
+    carga = numpy.zeros(n_disp)
+    n_pares = padroes.n**2
+    anterior = None
+
+    for inicio in range(0, total, tamanho_bloco):
+        k = numpy.arange(inicio, min(inicio + tamanho_bloco, total))
+        # Instante no meio de cada passo; fase da portadora exata.
+        t = (k + 0.5) * dt
+        fase = ((k % P) + 0.5) / P
+        portadora = 1 - numpy.abs(2*fase - 1)
+        angulo = 2*numpy.pi*cfg.fr*t
+        vref = cfg.Ar*numpy.sin(angulo)
+        i = cfg.Ief*calculo_perdas.formaDeOndaCorrente(
+            angulo, cfg.I_def, cfg.fat_crista)
+        iabs = abs(i)
+        # Faixa da referência por busca ordenada nos níveis.
+        faixa = numpy.clip(numpy.searchsorted(nivel, vref) - 1, 0, 5)
+        d = (vref - nivel[faixa]) / largura[faixa]
+        superior = d > portadora
+        negativo = i < 0
+        combinacao = 2*(estado_faixa[faixa] + negativo) + superior
+
+        p_cond, p_chav = calculo_perdas.perdasDispositivos(
+            iabs, vblock_faixa[faixa], cfg.fp, modelo)
+        # Energia de condução do passo: perda por período * fp * dt.
+        conducao += _somaPorTipo(padroes.conduz, tipo, combinacao,
+                                 p_cond * (cfg.fp*dt), padroes.n)
+        carga += numpy.dot(padroes.conduz,
+                           numpy.bincount(combinacao, weights=iabs*dt,
+                                          minlength=padroes.n))
+
+        # Mudanças de estado em relação ao passo anterior (inclusive o
+        # último passo do bloco anterior).
+        if anterior is None:
+            previa = numpy.concatenate([combinacao[:1], combinacao[:-1]])
+            previo_neg = numpy.concatenate([negativo[:1], negativo[:-1]])
+        else:
+            previa = numpy.concatenate([[anterior[0]], combinacao[:-1]])
+            previo_neg = numpy.concatenate([[anterior[1]], negativo[:-1]])
+        anterior = (combinacao[-1], negativo[-1])
+        troca = (combinacao != previa) & (negativo == previo_neg)
+        par = previa[troca]*padroes.n + combinacao[troca]
+        comutacoes += numpy.dot(padroes.muda,
+                                numpy.bincount(par, minlength=n_pares))
+        chaveamento += _somaPorTipo(padroes.muda, tipo, par,
+                                    p_chav[:, troca] / 2, n_pares)
+
+    duracao = total * dt
+    d = tabela.dispositivos
+    perdas = (conducao + chaveamento) / duracao
+    r = calculo_perdas.resumeSomas(cfg, calculo_perdas.Geometria(cfg),
+                                   dict(zip(d, perdas / cfg.fr)), {}, 1.0,
+                                   tabela=tabela)
+    return {"passos": total,
+            "comutacoes": dict(zip(d, comutacoes / ciclos)),
+            "perdas_conducao": dict(zip(d, conducao / duracao)),
+            "perdas_chaveamento": dict(zip(d, chaveamento / duracao)),
+            "perdas": dict(zip(d, perdas)),
+            "correntes": dict(zip(d, carga / duracao)),
+            "perdasW_bidir_ponte": r.perdasW_bidir_ponte,
+            "perdasW_bidir_2ch": r.perdasW_bidir_2ch}
+
+def modeloMedio(config=None, tabela=None, modelo=None):
+    """
+    Valores do modelo de razão cíclica média (calcular_perdas) no
+    formato de simula; "comutacoes" conta duas comutações (ligar e
+    desligar) por período da portadora em que a tabela indica
+    comutação.
+    """
+    cfg = calculo_perdas.Configuracao() if config is None else config
+    tabela = calculo_perdas.TABELA_7NIVEIS if tabela is None else tabela
+    r = calculo_perdas.calcular_perdas(cfg, tabela=tabela, modelo=modelo)
+    rc = calculo_perdas.calcular_perdas(cfg, tabela=tabela.semComutacao(),
+                                        modelo=modelo)
+    geo = calculo_perdas.Geometria(cfg)
+    angulo = calculo_perdas.angulosCiclos(geo.mf)
+    intervalo = calculo_perdas.classificaIntervalo(angulo, geo.theta)
+    i = calculo_perdas.corrente(cfg, angulo)
+    estado = tabela.estado(intervalo, i >= 0)
+    comuta = 2*numpy.sum(numpy.take(tabela.comuta, estado, axis=1), axis=1)
+    d = tabela.dispositivos
+    return {"passos": len(angulo),
+            "comutacoes": dict(zip(d, comuta)),
+            "perdas_conducao": dict((n, rc.perdas[n]*cfg.fr) for n in d),
+            "perdas_chaveamento": dict((n, (r.perdas[n] - rc.perdas[n]) *
+                                        cfg.fr) for n in d),
+            "perdas": dict((n, r.perdas[n]*cfg.fr) for n in d),
+            "correntes": dict(r.correntes),
+            "perdasW_bidir_ponte": r.perdasW_bidir_ponte,
+            "perdasW_bidir_2ch": r.perdasW_bidir_2ch}
+
+def compara(config=None, passos_por_periodo=1000, ciclos=1,
+            tamanho_bloco=2**16, tabela=None, modelo=None):
+    """Retorna (simula(...), modeloMedio(...)) para o mesmo ponto"""
+    return (simula(config, passos_por_periodo, ciclos, tamanho_bloco,
+                   tabela, modelo),
+            modeloMedio(config, tabela, modelo))
+
+def imprimeComparacao(simulado, medio):
+    """Imprime, por dispositivo, comutações e perdas simuladas e médias"""
+    print("%-7s %21s %21s %21s" % ("", "comutações/ciclo",
+                                   "chaveamento (W)", "condução (W)"))
+    print("%-7s %10s %10s %10s %10s %10s %10s" % (
+        "", "simulação", "modelo", "simulação", "modelo", "simulação",
+        "modelo"))
+    for n in calculo_perdas.DISPOSITIVOS:
+        if n not in simulado["perdas"]:
+            continue
+        print("%-7s %10.0f %10.0f %10.4f %10.4f %10.4f %10.4f" % (
+            n, simulado["comutacoes"][n], medio["comutacoes"][n],
+            simulado["perdas_chaveamento"][n], medio["perdas_chaveamento"][n],
+            simulado["perdas_conducao"][n], medio["perdas_conducao"][n]))
+    for total in ("perdasW_bidir_ponte", "perdasW_bidir_2ch"):
+        print("%-20s simulação %.4f W, modelo %.4f W" % (
+            total, simulado[total], medio[total]))
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+###########################################################################
+# Cálculo eletrotérmico das perdas da topologia sete níveis               #
+# (calculo_perdas.py).                                                    #
+#                                                                         #
+# As curvas de perda de calculo_perdas.py valem para uma única            #
+# temperatura de junção (T_REFERENCIA). Aqui as perdas de condução e de   #
+# chaveamento de cada chave e diodo são corrigidas por fatores tabelados  #
+# em função da temperatura de junção, que por sua vez depende das perdas  #
+# através da rede térmica (Foster ou Cauer) de cada dispositivo. O par    #
+# perdas/temperatura é resolvido por iteração de ponto fixo, para todos   #
+# os dispositivos e pontos de operação de uma só vez.                     #
+###########################################################################
+
+# Habilita resultado real da divisão (e não apenas parte inteira)
+from __future__ import division
+
+import numpy
+
+import calculo_perdas
+
+###########################################################################
+# REDE TÉRMICA                                                            #
+###########################################################################
+class RedeTermica(object):
+    """
+    Rede térmica de Foster da junção ao ambiente: impedância
+    Zth(s) = soma de R[k]/(1 + s*tau[k]). R em K/W e tau em s.
+    """
+    def __init__(self, R, tau):
+        self.R = numpy.array(R, dtype=float)
+        self.tau = numpy.array(tau, dtype=float)
+        if self.R.shape != self.tau.shape:
+            raise ValueError("R e tau devem ter o mesmo tamanho")
+
+    @classmethod
+    def deCauer(cls, R, C):
+        """
+        Converte rede de Cauer (capacitâncias C[k] em J/K para a
+        referência no nó k e resistências R[k] em série entre os nós k e
+        k+1, do nó da junção ao ambiente) na rede de Foster equivalente.
+        """
+        # Impedância vista da junção como razão de polinômios em s,
+        # montada do último nó para o primeiro:
+        # Z[k] = (R[k] + Z[k+1]) / (s*C[k]*(R[k] + Z[k+1]) + 1)
+        num, den = numpy.poly1d([0.0]), numpy.poly1d([1.0])
+        for r, c in reversed(list(zip(R, C))):
+            serie = r*den + num
+            num, den = serie, numpy.poly1d([c, 0])*serie + den
+        # Frações parciais: polos reais negativos p, R = resíduo*tau.
+        polos = numpy.real(den.roots)
+        derivada = den.deriv()
+        tau = -1/polos
+        return cls(num(polos)/derivada(polos)*tau, tau)
+
+    @property
+    def resistencia(self):
+        """Resistência térmica total (K/W), usada em regime permanente"""
+        return float(numpy.sum(self.R))
+
+    def impedancia(self, t):
+        """Resposta ao degrau Zth(t) em K/W para um vetor de tempos"""
+        t = numpy.asarray(t, dtype=float)[..., None]
+        return numpy.sum(self.R*(1 - numpy.exp(-t/self.tau)), axis=-1)
+
+    def periodica(self, potencia, passo):
+        """
+        Elevação de temperatura (K) em regime periódico para uma potência
+        constante por partes, com "passo" (s) de duração em cada
+        elemento do último eixo de "potencia" (W), que cobre um período.
+        Retorna a elevação ao fim de cada passo, no formato de "potencia".
+        """
+        potencia = numpy.asarray(potencia, dtype=float)
+        N = potencia.shape[-1]
+        total = 0
+        for R, tau in zip(self.R, self.tau):
+            a = numpy.exp(-passo/tau)
+            # Resposta partindo de zero; o estado inicial periódico é o
+            # que se repete após um período.
+            resposta = _filtroExponencial(potencia*(1 - a)*R, a)
+            inicial = resposta[..., -1:] / (1 - a**N)
+            total = total + resposta + inicial*a**numpy.arange(1, N + 1)
+        return total
+
+def _filtroExponencial(b, a):
+    """
+    Retorna y[k] = a*y[k-1] + b[k] ao longo do último eixo, com y[-1] = 0.
+    Calculado em blocos por somas acumuladas de b[j]/a**j, com blocos
+    curtos o bastante para que a**-j não estoure.
+    """
+    N = b.shape[-1]
+    bloco = N if a == 1 else max(1, int(50/-numpy.log(a)))
+    y = numpy.empty(b.shape)
+    anterior = numpy.zeros(b.shape[:-1] + (1,))
+    for inicio in range(0, N, bloco):
+        j = numpy.arange(min(bloco, N - inicio))
+        fim = inicio + len(j)
+        y[..., inicio:fim] = a**j * (a*anterior + numpy.cumsum(
+            b[..., inicio:fim] * a**-j, axis=-1))
+        anterior = y[..., fim-1:fim]
+    return y
+
+###########################################################################
+# FATORES DE PERDA EM FUNÇÃO DA TEMPERATURA                               #
+###########################################################################
+# Temperatura de junção (°C) em que valem as curvas de calculo_perdas.py.
+T_REFERENCIA = 25.0
+
+class TabelaTemperatura(object):
+    """
+    Fatores multiplicativos das perdas de condução e de chaveamento em
+    função da temperatura de junção (°C), interpolados linearmente e
+    mantidos constantes fora da tabela.
+    """
+    def __init__(self, temperaturas, fator_conducao, fator_chaveamento):
+        self.temperaturas = numpy.array(temperaturas, dtype=float)
+        self.fator_conducao = numpy.array(fator_conducao, dtype=float)
+        self.fator_chaveamento = numpy.array(fator_chaveamento, dtype=float)
+
+    def fatores(self, T):
+        """retorna (fator de condução, fator de chaveamento) em T"""
+        return (numpy.interp(T, self.temperaturas, self.fator_conducao),
+                numpy.interp(T, self.temperaturas, self.fator_chaveamento))
+
+###########################################################################
+# DADOS TÉRMICOS DOS COMPONENTES                                          #
+# Usuário deve inserir as redes térmicas e a variação das perdas com a    #
+# temperatura dos componentes e dissipadores utilizados. Os valores       #
+# abaixo são tendências típicas, não dados de datasheet.                  #
+###########################################################################
+# IRG4PC50UD: IGBT (RthJC = 0.64 K/W) e diodo (RthJC = 0.83 K/W), com
+# pasta térmica e parcela de dissipador por dispositivo.
+REDE_Q  = RedeTermica(R=[0.06, 0.22, 0.36, 0.24, 1.5],
+                      tau=[1e-4, 2e-3, 2e-2, 1.0, 120.0])
+REDE_D  = RedeTermica(R=[0.08, 0.30, 0.45, 0.24, 1.5],
+                      tau=[1e-4, 2e-3, 2e-2, 1.0, 120.0])
+# UF5408: encapsulamento axial, sem dissipador.
+REDE_DP = RedeTermica(R=[1.0, 4.0, 20.0],
+                      tau=[1e-3, 5e-2, 20.0])
+
+TABELAS_TEMPERATURA = {
+    # IGBT: Vce(on) pouco varia; Eon + Eoff cresce com a temperatura.
+    "Q":  TabelaTemperatura([25, 125, 150], [1.0, 1.02, 1.03],
+                            [1.0, 1.45, 1.60]),
+    # Diodo rápido: Vf cai; carga de recuperação Qrr cresce bastante.
+    "D":  TabelaTemperatura([25, 125, 150], [1.0, 0.90, 0.87],
+                            [1.0, 2.20, 2.60]),
+    # Diodo da ponte: Vf cai; trr e irr crescem.
+    "DP": TabelaTemperatura([25, 125, 150], [1.0, 0.88, 0.85],
+                            [1.0, 1.80, 2.00])}
+
+REDES = {"Q": REDE_Q, "D": REDE_D, "DP": REDE_DP}
+
+class ModeloTermico(object):
+    """
+    Redes térmicas e tabelas de temperatura de cada item da tabela de
+    estados "tabela" (por padrão, escolhidas pelo tipo de perda de cada
+    um) e temperatura ambiente (°C).
+    """
+    def __init__(self, T_ambiente=40.0, redes=None, tabelas=None,
+                 tabela=None):
+        self.tabela = calculo_perdas.TABELA_7NIVEIS if tabela is None \
+                      else tabela
+        tipos = [calculo_perdas.TIPOS_PERDA[t] for t in self.tabela.tipo]
+        redes = {} if redes is None else redes
+        tabelas = {} if tabelas is None else tabelas
+        self.T_ambiente = T_ambiente
+        self.redes = [redes.get(n, REDES[t])
+                      for n, t in zip(self.tabela.dispositivos, tipos)]
+        self.tabelas = [tabelas.get(n, TABELAS_TEMPERATURA[t])
+                        for n, t in zip(self.tabela.dispositivos, tipos)]
+        self.resistencia = numpy.array([r.resistencia
+                                        for r in self.redes])[:, None]
+        # Tabela de estados sem perdas de comutação, para separar as
+        # parcelas de condução e de chaveamento.
+        self.tabela_conducao = self.tabela.semComutacao()
+
+    def fatores(self, T):
+        """
+        Fatores de condução e de chaveamento de cada item para a matriz
+        de temperaturas T (uma linha por item da tabela).
+        """
+        fc, fs = zip(*[t.fatores(Tk) for t, Tk in zip(self.tabelas, T)])
+        return numpy.array(fc), numpy.array(fs)
+
+###########################################################################
+# SOLUÇÃO ELETROTÉRMICA                                                   #
+###########################################################################
+class ResultadoTermico(object):
+    """
+    Resultado do cálculo eletrotérmico.
+    resultado     : Resultado com as perdas corrigidas pela temperatura
+    temperaturas  : temperatura média de junção (°C) de cada item da
+                    tabela do ModeloTermico
+    temperaturas_max : temperatura máxima de junção (°C) ao longo do
+                    ciclo da referência; None se não calculada
+    iteracoes     : número de iterações de ponto fixo
+    convergiu     : se a iteração convergiu (False indica disparo
+                    térmico ou tolerância não atingida)
+    """
+    __slots__ = ("resultado", "temperaturas", "temperaturas_max",
+                 "iteracoes", "convergiu")
+
+    def __init__(self, **valores):
+        for nome in self.__slots__:
+            setattr(self, nome, valores[nome])
+
+def resolveTemperaturas(conducao, chaveamento, modelo, tolerancia=1e-3,
+                        max_iteracoes=50):
+    """
+    Itera T = T_ambiente + Rth*P(T) para as potências (W) de condução e
+    de chaveamento na temperatura de referência, matrizes com uma linha
+    por item da tabela e uma coluna por ponto de operação.
+    Retorna (temperaturas, fatores de condução, fatores de chaveamento,
+    iterações, convergiu por ponto).
+    """
+    T = numpy.full(conducao.shape, float(modelo.T_ambiente))
+    for iteracao in range(1, max_iteracoes + 1):
+        fc, fs = modelo.fatores(T)
+        novo = modelo.T_ambiente + modelo.resistencia*(fc*conducao +
+                                                        fs*chaveamento)
+        variacao = numpy.max(numpy.abs(novo - T), axis=0)
+        T = novo
+        if numpy.all(variacao < tolerancia):
+            break
+    fc, fs = modelo.fatores(T)
+    return T, fc, fs, iteracao, variacao < tolerancia
+
+def _corrige(r, fc, fs, partes, avisos, tabela):
+    """Monta o Resultado com as somas de perdas corrigidas"""
+    somas = fc*partes[0] + fs*partes[1]
+    if numpy.ndim(r.potencia_saida) == 0:
+        somas = somas[:, 0]
+    somas = dict(zip(tabela.dispositivos, somas))
+    geo = calculo_perdas.Geometria(r.config)
+    return calculo_perdas.resumeSomas(r.config, geo, somas, r.correntes,
+                                      r.potencia_saida, avisos,
+                                      r.erro_estimado, r.correntes_rms,
+                                      tabela)
+
+def _partes(r, rc, tabela):
+    """Somas (J) de condução e de chaveamento, uma linha por item"""
+    total = numpy.array([numpy.atleast_1d(r.perdas[n])
+                         for n in tabela.dispositivos])
+    conducao = numpy.array([numpy.atleast_1d(rc.perdas[n])
+                            for n in tabela.dispositivos])
+    return conducao, total - conducao
+
+def calcular_termico(config=None, modelo=None, modo="ciclos",
+                     ondulacao=False, tolerancia=1e-3, max_iteracoes=50):
+    """
+    Calcula as perdas de um ponto de operação com a temperatura de
+    junção de cada dispositivo em equilíbrio com suas perdas.
+    Com "ondulacao" (apenas no modo "ciclos"), calcula também a
+    temperatura máxima ao longo do ciclo da referência, pela resposta
+    da rede térmica às perdas de cada ciclo de chaveamento.
+    Retorna ResultadoTermico.
+    """
+    cfg = calculo_perdas.Configuracao() if config is None else config
+    modelo = ModeloTermico() if modelo is None else modelo
+    r = calculo_perdas.calcular_perdas(cfg, modo, modelo.tabela)
+    rc = calculo_perdas.calcular_perdas(cfg, modo, modelo.tabela_conducao)
+    partes = _partes(r, rc, modelo.tabela)
+    T, fc, fs, iteracoes, convergiu = resolveTemperaturas(
+        partes[0]*cfg.fr, partes[1]*cfg.fr, modelo, tolerancia,
+        max_iteracoes)
+    avisos = list(r.avisos)
+    if not convergiu[0]:
+        avisos.append("temperatura")
+    resultado = _corrige(r, fc, fs, partes, avisos, modelo.tabela)
+
+    temperaturas_max = None
+    if ondulacao:
+        if modo != "ciclos":
+            raise ValueError("Ondulação de temperatura requer modo 'ciclos'")
+        geo = calculo_perdas.Geometria(cfg)
+        total = calculo_perdas.calculaCiclos(cfg, geo, modelo.tabela)
+        conducao = calculo_perdas.calculaCiclos(cfg, geo,
+                                                modelo.tabela_conducao)
+        # Potência média em cada ciclo de chaveamento (J por ciclo * fp).
+        potencia = (fc*conducao["perdas"] +
+                    fs*(total["perdas"] - conducao["perdas"])) * cfg.fp
+        temperaturas_max = dict(
+            (n, modelo.T_ambiente + float(numpy.max(
+                rede.periodica(p, 1/cfg.fp))))
+            for n, rede, p in zip(modelo.tabela.dispositivos,
+                                  modelo.redes, potencia))
+
+    return ResultadoTermico(
+        resultado=resultado,
+        temperaturas=dict(zip(modelo.tabela.dispositivos, T[:, 0])),
+        temperaturas_max=temperaturas_max,
+        iteracoes=iteracoes, convergiu=bool(convergiu[0]))
+
+def calcular_lote_termico(config, Ief, I_def, modelo=None, modo="ciclos",
+                          tolerancia=1e-3, max_iteracoes=50):
+    """
+    Como calcular_termico, para os pontos de operação dados pelos
+    vetores "Ief" e "I_def" (ver calculo_perdas.calcular_lote). Todos os
+    pontos são iterados juntos; "temperaturas" e "convergiu" são
+    vetores com um elemento por ponto.
+    """
+    modelo = ModeloTermico() if modelo is None else modelo
+    r = calculo_perdas.calcular_lote(config, Ief, I_def, modo, modelo.tabela)
+    rc = calculo_perdas.calcular_lote(config, Ief, I_def, modo,
+                                      modelo.tabela_conducao)
+    partes = _partes(r, rc, modelo.tabela)
+    T, fc, fs, iteracoes, convergiu = resolveTemperaturas(
+        partes[0]*config.fr, partes[1]*config.fr, modelo, tolerancia,
+        max_iteracoes)
+    avisos = list(r.avisos)
+    if not numpy.all(convergiu):
+        avisos.append("temperatura")
+    return ResultadoTermico(
+        resultado=_corrige(r, fc, fs, partes, avisos, modelo.tabela),
+        temperaturas=dict(zip(modelo.tabela.dispositivos, T)),
+        temperaturas_max=None, iteracoes=iteracoes, convergiu=convergiu)
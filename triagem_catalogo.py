@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+###########################################################################
+# Triagem de componentes da topologia sete níveis: todas as combinações   #
+# de chaves e diodos de um catálogo (ajuste_dispositivos.Catalogo) nas    #
+# posições da topologia, classificadas pelas perdas totais                #
+# (perdasW_bidir_ponte ou perdasW_bidir_2ch).                             #
+#                                                                         #
+# Posições: chaves e diodos antiparalelos de S1 a S4 e, em S5/S6, a chave #
+# e os diodos da ponte (variante "ponte") ou as chaves e diodos em        #
+# anti-série (variante "2ch"). Cada posição pode receber um componente    #
+# diferente do catálogo.                                                  #
+#                                                                         #
+# Corrente, razão cíclica e estados são calculados uma única vez, como    #
+# pesos por ciclo de cada posição (ajuste_dispositivos.pesosCiclos), e as #
+# perdas de todos os componentes em todos os ciclos em uma chamada        #
+# (Catalogo.perdas). A perda de cada componente em cada posição é um      #
+# produto matriz-vetor, e as perdas de todas as combinações são a soma,   #
+# com "broadcasting", dos vetores de cada posição.                        #
+#                                                                         #
+# Como a perda total é a soma das perdas das posições, uma combinação     #
+# entre as "melhores" primeiras só pode usar, em cada posição, um dos     #
+# "melhores" primeiros componentes dela; os demais são descartados antes  #
+# de formar as combinações, sem alterar a classificação.                  #
+#                                                                         #
+# Uso: python triagem_catalogo.py catalogo.json [--variante 2ch]          #
+#                                 [--melhores 20] [--Ief 4.25] ...        #
+###########################################################################
+
+# Habilita resultado real da divisão (e não apenas parte inteira)
+from __future__ import division
+
+import argparse
+import sys
+
+import numpy
+
+import ajuste_dispositivos
+import calculo_perdas
+
+# Posições de cada variante: (nome, tipo do componente, itens da tabela
+# de estados ocupados). As multiplicidades são as de
+# calculo_perdas.multiplicidades.
+POSICOES = {
+    "ponte": (("S1-S4 chave", "Q", ("S1Q", "S2Q", "S3Q", "S4Q")),
+              ("S1-S4 diodo", "D", ("S1D", "S2D", "S3D", "S4D")),
+              ("S5/S6 chave", "Q", ("S5pQ", "S6pQ")),
+              ("S5/S6 diodo da ponte", "D", ("S5pDp", "S5pDn",
+                                             "S6pDp", "S6pDn"))),
+    "2ch":   (("S1-S4 chave", "Q", ("S1Q", "S2Q", "S3Q", "S4Q")),
+              ("S1-S4 diodo", "D", ("S1D", "S2D", "S3D", "S4D")),
+              ("S5/S6 chave", "Q", ("S5sQp", "S5sQn", "S6sQp", "S6sQn")),
+              ("S5/S6 diodo", "D", ("S5sDp", "S5sDn", "S6sDp", "S6sDn")))}
+
+OBJETIVOS = {"perdasW_bidir_ponte": "ponte", "perdasW_bidir_2ch": "2ch"}
+
+class ResultadoTriagem(object):
+    """
+    Combinações classificadas, da menor para a maior perda.
+    objetivo       : "perdasW_bidir_ponte" ou "perdasW_bidir_2ch"
+    posicoes       : nomes das posições (ver POSICOES)
+    combinacoes    : lista de tuplas com o nome do componente de cada
+                     posição
+    perdas         : vetor com a perda total (W) de cada combinação
+    rendimentos    : vetor com o rendimento (%) de cada combinação
+    perdas_posicoes: {posição: {componente: perda (W) na posição}}
+    potencia_saida : potência de saída (W)
+    combinacoes_total : número de combinações possíveis
+    """
+    __slots__ = ("config", "objetivo", "posicoes", "combinacoes", "perdas",
+                 "rendimentos", "perdas_posicoes", "potencia_saida",
+                 "combinacoes_total")
+
+    def __init__(self, **valores):
+        for nome in self.__slots__:
+            setattr(self, nome, valores[nome])
+
+    def __repr__(self):
+        return "ResultadoTriagem(%s, %d de %d combinações)" % (
+            self.objetivo, len(self.combinacoes), self.combinacoes_total)
+
+def triagem(catalogo, config=None, objetivo="perdasW_bidir_ponte",
+            melhores=20, tabela=None, extrapola=False):
+    """
+    Classifica as combinações de componentes do "catalogo" no ponto de
+    operação "config" pelo "objetivo". Retorna as "melhores" combinações
+    (todas, se None). Sem "extrapola", chaves cujos pontos de comutação
+    não chegam à maior corrente do ponto de operação são descartadas.
+    Retorna ResultadoTriagem.
+    """
+    if objetivo not in OBJETIVOS:
+        raise ValueError("Objetivo desconhecido: " + str(objetivo))
+    variante = OBJETIVOS[objetivo]
+    posicoes = POSICOES[variante]
+    tabela = calculo_perdas.TABELA_7NIVEIS if tabela is None else tabela
+    multiplicidade = calculo_perdas.multiplicidades(
+        tabela.dispositivos)[variante]
+    grupos = dict((nome, multiplicidade *
+                   numpy.isin(tabela.dispositivos, itens))
+                  for nome, _, itens in posicoes)
+    pesos, iabs, vblock, potencia_saida, cfg = \
+        ajuste_dispositivos.pesosCiclos(grupos, config, tabela)
+    conducao, comutacao = catalogo.perdas(iabs, vblock, cfg.fp)
+
+    candidatos = {"Q": catalogo.chaves, "D": catalogo.diodos}
+    if not extrapola:
+        i_max = numpy.array([catalogo.dispositivos[k].i_max
+                             for k in catalogo.chaves], dtype=float)
+        candidatos["Q"] = catalogo.chaves[i_max >= numpy.max(iabs)]
+
+    # Perda de cada candidato em cada posição; apenas os "melhores"
+    # primeiros de cada posição podem estar nas melhores combinações.
+    indices, vetores, perdas_posicoes = [], [], {}
+    total = 1
+    for nome, tipo, _ in posicoes:
+        k = candidatos[tipo]
+        if len(k) == 0:
+            raise ValueError("Nenhum componente do catálogo para " + nome)
+        pc, ps = pesos[nome]
+        perdas = (numpy.dot(conducao[k], pc) +
+                  numpy.dot(comutacao[k], ps)) * cfg.fr
+        perdas_posicoes[nome] = dict(zip(
+            [catalogo.nomes[j] for j in k], perdas))
+        total *= len(k)
+        if melhores is not None and len(k) > melhores:
+            ordem = numpy.argsort(perdas, kind="mergesort")[:melhores]
+            k, perdas = k[ordem], perdas[ordem]
+        indices.append(k)
+        vetores.append(perdas)
+
+    # Perdas de todas as combinações: um eixo por posição.
+    n = len(vetores)
+    soma = 0
+    for eixo, perdas in enumerate(vetores):
+        forma = [1]*n
+        forma[eixo] = len(perdas)
+        soma = soma + perdas.reshape(forma)
+    soma = soma.ravel()
+    ordem = numpy.argsort(soma, kind="mergesort")
+    if melhores is not None:
+        ordem = ordem[:melhores]
+    posicao = numpy.unravel_index(ordem, [len(v) for v in vetores])
+    combinacoes = [tuple(catalogo.nomes[indices[p][j[p]]] for p in range(n))
+                   for j in zip(*posicao)]
+    perdas = soma[ordem]
+    return ResultadoTriagem(
+        config=cfg, objetivo=objetivo,
+        posicoes=tuple(nome for nome, _, _ in posicoes),
+        combinacoes=combinacoes, perdas=perdas,
+        rendimentos=(potencia_saida - perdas) / potencia_saida * 100,
+        perdas_posicoes=perdas_posicoes, potencia_saida=potencia_saida,
+        combinacoes_total=total)
+
+def imprimeTriagem(r):
+    """Imprime as combinações classificadas"""
+    print("%d combinações avaliadas; potência de saída %.4f W" % (
+        r.combinacoes_total, r.potencia_saida))
+    print("%4s %12s %10s  %s" % ("#", "perdas (W)", "rend. (%)",
+                                 " | ".join(r.posicoes)))
+    for k, (combinacao, perda, rend) in enumerate(zip(
+            r.combinacoes, r.perdas, r.rendimentos)):
+        print("%4d %12.4f %10.4f  %s" % (k + 1, perda, rend,
+                                         " | ".join(combinacao)))
+
+def principal(argumentos=None):
+    parser = argparse.ArgumentParser(
+        description="Classifica combinações de componentes de um catálogo")
+    parser.add_argument("catalogo", help="JSON gravado por "
+                                         "ajuste_dispositivos.py")
+    parser.add_argument("--variante", choices=("ponte", "2ch"),
+                        default="ponte")
+    parser.add_argument("--melhores", type=int, default=20,
+                        help="número de combinações listadas")
+    parser.add_argument("--extrapola", action="store_true",
+                        help="mantém chaves com pontos de comutação "
+                             "abaixo da corrente de pico")
+    for nome in ("Ief", "I_def", "fp", "fr", "Ar", "V1", "V2"):
+        parser.add_argument("--" + nome, type=float)
+    args = parser.parse_args(argumentos)
+    valores = dict((n, getattr(args, n)) for n in
+                   ("Ief", "I_def", "fp", "fr", "Ar", "V1", "V2")
+                   if getattr(args, n) is not None)
+    cfg = calculo_perdas.Configuracao(**valores)
+    catalogo = ajuste_dispositivos.Catalogo.carrega(args.catalogo)
+    objetivo = "perdasW_bidir_" + args.variante
+    imprimeTriagem(triagem(catalogo, cfg, objetivo, args.melhores,
+                           extrapola=args.extrapola))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(principal())
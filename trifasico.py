@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+###########################################################################
+# Conversor com várias fases (padrão: três) da topologia sete níveis,     #
+# cada fase com um ou mais módulos em paralelo, que dividem igualmente    #
+# a corrente da fase.                                                     #
+#                                                                         #
+# As fases têm referências e correntes defasadas de 2*pi/fases e uma      #
+# portadora comum. No referencial de cada fase (ângulo da própria         #
+# referência), a geometria (ângulos tt, intervalos, razão cíclica) é a    #
+# mesma da fase de referência; muda apenas a posição dos ciclos de        #
+# chaveamento, deslocados de mf*p/fases ciclos na fase p. Se o            #
+# deslocamento é inteiro (ex.: mf múltiplo de 3), os ciclos coincidem     #
+# com os de calcular_perdas.                                              #
+#                                                                         #
+# Geometria e validação são feitas uma vez. Fases com mesmo deslocamento  #
+# fracionário, Ief e I_def (ex.: conversor equilibrado) são calculadas    #
+# uma única vez; as demais são concatenadas e calculadas em uma única     #
+# chamada de calculaPontos, como em calculaLote.                          #
+###########################################################################
+
+# Habilita resultado real da divisão (e não apenas parte inteira)
+from __future__ import division
+
+from math import pi
+
+import numpy
+
+import calculo_perdas
+
+class ResultadoTrifasico(object):
+    """
+    Resumo do cálculo de um conversor com várias fases.
+    fases     : Resultado de um módulo de cada fase, no referencial da
+                fase (valores como em calcular_perdas)
+    modulos   : número de módulos em paralelo por fase
+    perdas_fases_ponte, perdas_fases_2ch : perdas (W) de cada fase,
+                somando os módulos
+    perdas    : {dispositivo: perda (W) somada em todas as fases e
+                módulos}
+    potencia_saida : potência de saída total (W)
+    perdasW_bidir_ponte, perdasW_bidir_2ch : perdas totais (W)
+    rend_ponte, rend_2ch : rendimentos do conversor (%)
+    """
+    __slots__ = ("config", "avisos", "fases", "modulos",
+                 "perdas_fases_ponte", "perdas_fases_2ch", "perdas",
+                 "potencia_saida", "perdasW_bidir_ponte",
+                 "perdasW_bidir_2ch", "rend_ponte", "rend_2ch")
+
+    def __init__(self, **valores):
+        for nome in self.__slots__:
+            setattr(self, nome, valores[nome])
+
+    def __repr__(self):
+        return ("ResultadoTrifasico(%d fases x %d módulos, "
+                "rend_ponte=%.4f %%, rend_2ch=%.4f %%)" % (
+                    len(self.fases), self.modulos, self.rend_ponte,
+                    self.rend_2ch))
+
+def deslocamentos(mf, fases=3):
+    """
+    Fração de ciclo de chaveamento (0 a 1) em que a portadora está
+    deslocada no referencial de cada fase
+    """
+    return tuple((mf*p % fases)/fases for p in range(fases))
+
+def angulosFase(mf, deslocamento):
+    """
+    Ângulos do meio de cada ciclo de chaveamento no referencial de uma
+    fase com "deslocamento" (ver deslocamentos), entre 0 e 2*pi
+    """
+    angulo = calculo_perdas.angulosCiclos(mf)
+    if deslocamento == 0:
+        return angulo
+    return numpy.mod(angulo - 2*pi*deslocamento/mf, 2*pi)
+
+def calcular_fases(config=None, fases=3, modulos=1, Ief=None, I_def=None,
+                   tabela=None, modelo=None):
+    """
+    Calcula as perdas de um conversor com "fases" fases e "modulos"
+    módulos em paralelo por fase. "Ief" e "I_def" podem ser listas com
+    o valor de cada fase (padrão: os de "config" em todas); Ief é a
+    corrente da fase, dividida entre os módulos. "tabela" e "modelo"
+    como em calcular_perdas. Cada fase é validada com seus valores de Ief
+    e I_def; os avisos do conversor reúnem os de todas as fases.
+    Retorna ResultadoTrifasico.
+    """
+    cfg = calculo_perdas.Configuracao() if config is None else config
+    tabela = calculo_perdas.TABELA_7NIVEIS if tabela is None else tabela
+    if int(modulos) != modulos or modulos < 1:
+        raise ValueError("Número de módulos deve ser inteiro positivo")
+    geo = calculo_perdas.Geometria(cfg)
+    Ief = [cfg.Ief]*fases if Ief is None else list(Ief)
+    I_def = [cfg.I_def]*fases if I_def is None else list(I_def)
+    if len(Ief) != fases or len(I_def) != fases:
+        raise ValueError("Ief e I_def devem ter um valor por fase")
+
+    # Fases distintas, na ordem em que aparecem.
+    chaves = [(desloc, i/modulos, fi) for desloc, i, fi in
+              zip(deslocamentos(geo.mf, fases), Ief, I_def)]
+    distintas = list(dict.fromkeys(chaves))
+
+    # Todas as fases distintas em uma única passagem.
+    angulos = [angulosFase(geo.mf, c[0]) for c in distintas]
+    N = len(angulos[0])
+    angulo = numpy.concatenate(angulos)
+    intervalo = calculo_perdas.classificaIntervalo(angulo, geo.theta)
+    lote = cfg.substitui(
+        Ief=numpy.repeat([c[1] for c in distintas], N),
+        I_def=numpy.repeat([c[2] for c in distintas], N))
+    pontos = calculo_perdas.calculaPontos(lote, angulo, intervalo,
+                                          tabela=tabela, modelo=modelo)
+    forma = (len(pontos["perdas"]), len(distintas), N)
+    somas = numpy.sum(pontos["perdas"].reshape(forma), axis=-1)
+    imed = pontos["correntes"].reshape(forma)
+    correntes = calculo_perdas.media(imed)
+    correntes_rms = calculo_perdas.rms(imed)
+    potencias = calculo_perdas.media(pontos["POTENCIAINST"].reshape(
+        len(distintas), N))
+
+    nomes = tabela.dispositivos
+    resultados, avisos = [], []
+    for k, c in enumerate(distintas):
+        cfg_fase = cfg.substitui(Ief=c[1], I_def=c[2])
+        avisos_fase = calculo_perdas.validaEntradas(cfg_fase, [])
+        avisos += [a for a in avisos_fase if a not in avisos]
+        resultados.append(calculo_perdas.resumeSomas(
+            cfg_fase, geo,
+            dict(zip(nomes, somas[:, k])),
+            dict(zip(nomes, correntes[:, k])), potencias[k], avisos_fase,
+            correntes_rms=dict(zip(nomes, correntes_rms[:, k])),
+            tabela=tabela))
+    por_fase = tuple(resultados[distintas.index(c)] for c in chaves)
+
+    # Totais do conversor: perdas de um módulo (J por ciclo) * fr *
+    # módulos, somadas nas fases.
+    perdas = dict((n, modulos*cfg.fr*sum(r.perdas[n] for r in por_fase))
+                  for n in nomes)
+    perdas_ponte = tuple(modulos*r.perdasW_bidir_ponte for r in por_fase)
+    perdas_2ch = tuple(modulos*r.perdasW_bidir_2ch for r in por_fase)
+    potencia_saida = modulos*sum(r.potencia_saida for r in por_fase)
+    perdasW_bidir_ponte = sum(perdas_ponte)
+    perdasW_bidir_2ch = sum(perdas_2ch)
+    return ResultadoTrifasico(
+        config=cfg, avisos=list(avisos), fases=por_fase, modulos=modulos,
+        perdas_fases_ponte=perdas_ponte, perdas_fases_2ch=perdas_2ch,
+        perdas=perdas, potencia_saida=potencia_saida,
+        perdasW_bidir_ponte=perdasW_bidir_ponte,
+        perdasW_bidir_2ch=perdasW_bidir_2ch,
+        rend_ponte=(potencia_saida - perdasW_bidir_ponte) /
+                   potencia_saida * 100,
+        rend_2ch=(potencia_saida - perdasW_bidir_2ch) /
+                 potencia_saida * 100)
+
+def imprimeFases(r):
+    """Imprime perdas por fase, por dispositivo e totais"""
+    for p, fase in enumerate(r.fases):
+        print("Fase %d: Ief = %g A, I_def = %g rad, ponte %.4f W, "
+              "2ch %.4f W" % (p + 1, fase.config.Ief*r.modulos,
+                              fase.config.I_def, r.perdas_fases_ponte[p],
+                              r.perdas_fases_2ch[p]))
+    for n in r.fases[0].perdas:
+        print("%-7s %10.4f W" % (n, r.perdas[n]))
+    print("Potência de saída: %.4f W" % r.potencia_saida)
+    print("Perdas ponte: %.4f W, rendimento %.4f %%" % (
+        r.perdasW_bidir_ponte, r.rend_ponte))
+    print("Perdas 2ch:   %.4f W, rendimento %.4f %%" % (
+        r.perdasW_bidir_2ch, r.rend_2ch))
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+###########################################################################
+# Varredura paralela de parâmetros para o cálculo de perdas da topologia  #
+# sete níveis (calculo_perdas.py).                                        #
+#                                                                         #
+# Os pontos de operação são divididos em blocos de tamanho fixo,          #
+# calculados em paralelo por um conjunto de processos e gravados em       #
+# disco, em formato colunar (um arquivo .npz por bloco), à medida que     #
+# cada bloco termina. Blocos já gravados não são recalculados, o que      #
+# permite retomar uma varredura interrompida.                             #
+#                                                                         #
+# O manifesto da varredura guarda o hash do modo de cálculo e do modelo   #
+# (curvas, tabela de estados e VERSAO_MOTOR), e cada bloco o hash de suas #
+# entradas, incluindo a forma de onda da corrente de cada ponto; uma      #
+# varredura só é retomada se ambos coincidirem.                           #
+###########################################################################
+
+# Habilita resultado real da divisão (e não apenas parte inteira)
+from __future__ import division
+
+import collections
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+
+import numpy
+
+import cache_resultados
+import calculo_perdas
+
+###########################################################################
+# DEFINIÇÃO DAS COLUNAS                                                   #
+###########################################################################
+# Variáveis numéricas de entrada, na ordem usada por Configuracao.
+ENTRADAS = calculo_perdas.ENTRADAS
+
+# Colunas gravadas em cada bloco. "indice" é a posição do ponto na
+# varredura e "valido" indica se o ponto passou nos testes de validação;
+# pontos inválidos não são calculados e têm resultados NaN. "fat_crista"
+# é o fator de crista da forma de onda da corrente de cada ponto. As
+# perdas por dispositivo ("perdaW_") estão em W, como as perdas totais.
+COLUNAS = (("indice", "valido") + ENTRADAS + ("fat_crista", "ma", "mf") +
+           tuple("perdaW_" + n for n in calculo_perdas.DISPOSITIVOS) +
+           tuple("i_" + n for n in calculo_perdas.DISPOSITIVOS) +
+           ("potencia_saida", "perdasW_bidir_ponte", "perdasW_bidir_2ch",
+            "rend_ponte", "rend_2ch"))
+
+# Colunas de resultado, calculadas apenas para pontos válidos.
+RESULTADOS = COLUNAS[3 + len(ENTRADAS):]
+
+MANIFESTO = "varredura.json"
+
+class VarreduraDiferente(ValueError):
+    """
+    Destino contém varredura calculada com outros pontos, tamanho de
+    bloco, modo ou modelo
+    """
+
+###########################################################################
+# GERAÇÃO DOS PONTOS DE OPERAÇÃO                                          #
+###########################################################################
+def grade(**eixos):
+    """
+    Retorna gerador das Configuracoes do produto cartesiano dos eixos
+    fornecidos (ex.: grade(V1=[80, 100], Ief=[1, 2, 4])). Variáveis não
+    fornecidas assumem o padrão de Configuracao; "Ar" assume V1 + V2.
+    O eixo "fat_crista" pode conter números ou FormaDeOnda.
+    """
+    for nome in eixos:
+        if nome not in calculo_perdas.Configuracao.__slots__:
+            raise ValueError("Eixo desconhecido: " + nome)
+    nomes = [n for n in calculo_perdas.Configuracao.__slots__
+             if n in eixos]
+    for valores in itertools.product(*[eixos[n] for n in nomes]):
+        yield calculo_perdas.Configuracao(**dict(zip(nomes, valores)))
+
+def tamanhoGrade(**eixos):
+    """Retorna o número de pontos de grade(**eixos)"""
+    total = 1
+    for valores in eixos.values():
+        total *= len(valores)
+    return total
+
+def _blocos(pontos, tamanho_bloco):
+    """Divide o iterável de pontos em listas de "tamanho_bloco" pontos"""
+    pontos = iter(pontos)
+    while True:
+        bloco = list(itertools.islice(pontos, tamanho_bloco))
+        if not bloco:
+            return
+        yield bloco
+
+###########################################################################
+# CÁLCULO DE UM BLOCO (EXECUTADO NOS PROCESSOS DE TRABALHO)               #
+###########################################################################
+# Caches abertos neste processo, por caminho (conexões SQLite não podem
+# ser enviadas entre processos).
+_caches = {}
+
+def _calculaBloco(tarefa):
+    """
+    Calcula os pontos válidos de um bloco. Recebe (número do bloco,
+    lista de (tupla de ENTRADAS, fat_crista), modo de cálculo, caminho
+    do cache ou None) e retorna (número do bloco, matriz de resultados
+    com uma linha por ponto e uma coluna por RESULTADOS).
+    """
+    n_bloco, entradas, modo, cache = tarefa
+    configs = [calculo_perdas.Configuracao(*valores, fat_crista=forma)
+               for valores, forma in entradas]
+    if cache is None:
+        resultados = [calculo_perdas.calcular_perdas(c, modo)
+                      for c in configs]
+    else:
+        if cache not in _caches:
+            _caches[cache] = cache_resultados.CacheResultados(cache)
+        resultados = _caches[cache].calcular_varios(configs, modo)
+    saida = numpy.empty((len(entradas), len(RESULTADOS)))
+    for linha, r in enumerate(resultados):
+        saida[linha] = ([r.ma, r.mf] +
+                        [r.perdas[n] * r.config.fr
+                         for n in calculo_perdas.DISPOSITIVOS] +
+                        [r.correntes[n] for n in calculo_perdas.DISPOSITIVOS] +
+                        [r.potencia_saida, r.perdasW_bidir_ponte,
+                         r.perdasW_bidir_2ch, r.rend_ponte, r.rend_2ch])
+    return n_bloco, saida
+
+###########################################################################
+# GRAVAÇÃO E LEITURA DOS BLOCOS                                           #
+###########################################################################
+def _arquivoBloco(destino, n_bloco):
+    return os.path.join(destino, "bloco_%06d.npz" % n_bloco)
+
+def assinaturaModelo(modo):
+    """
+    Hash do modo de cálculo e do modelo usado pelos processos de trabalho
+    (parâmetros das curvas, tabela de estados e VERSAO_MOTOR)
+    """
+    texto = modo + "|" + cache_resultados.textoModelo(
+        calculo_perdas.TABELA_7NIVEIS)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+def assinaturaBloco(modelo, entradas, formas):
+    """
+    Hash das entradas de um bloco (matriz com uma coluna por ENTRADAS e
+    lista com a representação da forma de onda de cada ponto, ver
+    cache_resultados.textoForma) e da assinatura do "modelo" (ver
+    assinaturaModelo)
+    """
+    h = hashlib.sha256(modelo.encode("utf-8"))
+    h.update(numpy.ascontiguousarray(entradas, dtype=float).tobytes())
+    h.update("\n".join(formas).encode("utf-8"))
+    return h.hexdigest()
+
+def _descreveForma(fatorDeCrista):
+    """Representação canônica e fator de crista da forma de onda"""
+    forma = calculo_perdas.formaDeOnda(fatorDeCrista)
+    fator = numpy.sqrt(2) if forma is None else forma.fatorDeCrista()
+    return cache_resultados.textoForma(fatorDeCrista), float(fator)
+
+def _assinaturaGravada(destino, n_bloco):
+    """Assinatura guardada no bloco, ou None se o bloco não a tiver"""
+    with numpy.load(_arquivoBloco(destino, n_bloco)) as bloco:
+        if "assinatura" not in bloco.files:
+            return None
+        return str(bloco["assinatura"])
+
+def _gravaBloco(destino, n_bloco, colunas):
+    """Grava bloco de forma atômica, para que a retomada seja segura"""
+    final = _arquivoBloco(destino, n_bloco)
+    temporario = final + ".tmp"
+    with open(temporario, "wb") as arquivo:
+        numpy.savez(arquivo, **colunas)
+    os.rename(temporario, final)
+
+def _preparaDestino(destino, total, tamanho_bloco, modo, modelo, retomar):
+    """Cria diretório de destino ou confere manifesto de varredura anterior"""
+    manifesto = {"pontos": total, "tamanho_bloco": tamanho_bloco,
+                 "modo": modo, "modelo": modelo, "colunas": list(COLUNAS)}
+    caminho = os.path.join(destino, MANIFESTO)
+    if not os.path.isdir(destino):
+        os.makedirs(destino)
+    if os.path.exists(caminho):
+        with open(caminho) as arquivo:
+            anterior = json.load(arquivo)
+        if not retomar:
+            raise ValueError("Já existe varredura em " + destino)
+        if anterior != manifesto:
+            raise VarreduraDiferente(
+                "Varredura em " + destino + " foi gerada com outros "
+                "pontos, tamanho de bloco, modo ou modelo")
+    else:
+        with open(caminho, "w") as arquivo:
+            json.dump(manifesto, arquivo, indent=1)
+
+def carregaVarredura(destino):
+    """
+    Lê todos os blocos gravados em "destino" e retorna dicionário de
+    vetores indexado por COLUNAS, ordenado pelo índice dos pontos.
+    """
+    arquivos = sorted(f for f in os.listdir(destino)
+                      if f.startswith("bloco_") and f.endswith(".npz"))
+    partes = [numpy.load(os.path.join(destino, f)) for f in arquivos]
+    if not partes:
+        return dict((c, numpy.empty(0)) for c in COLUNAS)
+    colunas = dict((c, numpy.concatenate([p[c] for p in partes]))
+                   for c in COLUNAS)
+    ordem = numpy.argsort(colunas["indice"], kind="mergesort")
+    return dict((c, v[ordem]) for c, v in colunas.items())
+
+def descartaVarredura(destino):
+    """Remove o manifesto e os blocos gravados em "destino", se houver"""
+    if not os.path.isdir(destino):
+        return
+    for f in os.listdir(destino):
+        if f == MANIFESTO or f.startswith("bloco_"):
+            os.remove(os.path.join(destino, f))
+
+###########################################################################
+# VARREDURA                                                               #
+###########################################################################
+def varrer(pontos, destino, tamanho_bloco=256, processos=None,
+           retomar=True, total=None, modo="ciclos", cache=None):
+    """
+    Calcula as perdas de todos os pontos e grava os resultados em
+    "destino" (diretório), um arquivo .npz por bloco.
+
+    pontos        : dicionário de eixos (ver grade) ou iterável de
+                    Configuracao
+    tamanho_bloco : número de pontos enviados de uma vez a cada processo
+    processos     : número de processos (None = todos os núcleos;
+                    1 = calcula no próprio processo)
+    retomar       : se True, blocos já gravados em "destino" são pulados;
+                    se a varredura gravada tiver outros pontos, modo ou
+                    modelo, gera VarreduraDiferente
+    total         : número de pontos, se "pontos" for um iterador sem
+                    tamanho conhecido
+    modo          : modo de cálculo de calcular_perdas ("ciclos" ou
+                    "analitico")
+    cache         : caminho de um banco de cache_resultados, de onde são
+                    lidos os pontos já calculados, nesta ou em outras
+                    varreduras, e onde são guardados os novos
+
+    Retorna dicionário com o número de pontos calculados, inválidos e
+    de blocos pulados por já estarem gravados.
+    """
+    if isinstance(pontos, dict):
+        total = tamanhoGrade(**pontos)
+        pontos = grade(**pontos)
+    elif total is None:
+        pontos = list(pontos)
+        total = len(pontos)
+    modelo = assinaturaModelo(modo)
+    _preparaDestino(destino, total, tamanho_bloco, modo, modelo, retomar)
+
+    estatisticas = {"calculados": 0, "invalidos": 0, "blocos_pulados": 0}
+    pendentes = {}
+    # Descrição das últimas formas de onda usadas (números por valor,
+    # FormaDeOnda por identidade), para não recalculá-la a cada ponto.
+    formas = collections.OrderedDict()
+
+    def descreve(c):
+        descricao = formas.pop(c.fat_crista, None)
+        if descricao is None:
+            descricao = _descreveForma(c.fat_crista)
+        formas[c.fat_crista] = descricao
+        if len(formas) > 64:
+            formas.popitem(last=False)
+        return descricao
+
+    def tarefas():
+        """Valida os pontos de cada bloco e gera apenas o que falta"""
+        for n_bloco, bloco in enumerate(_blocos(pontos, tamanho_bloco)):
+            entradas = numpy.array([[getattr(c, n) for n in ENTRADAS]
+                                    for c in bloco], dtype=float)
+            descricoes = [descreve(c) for c in bloco]
+            assinatura = assinaturaBloco(modelo, entradas,
+                                         [d[0] for d in descricoes])
+            if os.path.exists(_arquivoBloco(destino, n_bloco)):
+                if _assinaturaGravada(destino, n_bloco) != assinatura:
+                    raise VarreduraDiferente(
+                        "Bloco %d de %s foi calculado com outros pontos "
+                        "ou modelo" % (n_bloco, destino))
+                estatisticas["blocos_pulados"] += 1
+                continue
+            valido = numpy.array([not calculo_perdas.validaEntradas(c, [])
+                                  for c in bloco])
+            inicio = n_bloco * tamanho_bloco
+            pendentes[n_bloco] = (numpy.arange(inicio, inicio + len(bloco)),
+                                  valido, entradas,
+                                  numpy.array([d[1] for d in descricoes]),
+                                  assinatura)
+            validos = [(tuple(getattr(c, n) for n in ENTRADAS), c.fat_crista)
+                       for c, ok in zip(bloco, valido) if ok]
+            yield n_bloco, validos, modo, cache
+
+    def grava(n_bloco, saida):
+        indice, valido, entradas, fator, assinatura = pendentes.pop(n_bloco)
+        colunas = {"indice": indice, "valido": valido, "fat_crista": fator,
+                   "assinatura": numpy.array(assinatura)}
+        for j, nome in enumerate(ENTRADAS):
+            colunas[nome] = entradas[:, j]
+        resultados = numpy.full((len(indice), len(RESULTADOS)), numpy.nan)
+        resultados[valido] = saida
+        for j, nome in enumerate(RESULTADOS):
+            colunas[nome] = resultados[:, j]
+        _gravaBloco(destino, n_bloco, colunas)
+        estatisticas["calculados"] += int(valido.sum())
+        estatisticas["invalidos"] += int(len(valido) - valido.sum())
+
+    if processos == 1:
+        for tarefa in tarefas():
+            grava(*_calculaBloco(tarefa))
+    else:
+        pool = multiprocessing.Pool(processos)
+        try:
+            for n_bloco, saida in pool.imap_unordered(_calculaBloco,
+                                                      tarefas()):
+                grava(n_bloco, saida)
+        except BaseException:
+            # Não espera as tarefas restantes para relatar o erro.
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+    return estatisticas